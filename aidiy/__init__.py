@@ -0,0 +1 @@
+# backend/aidiy - shared infrastructure for the Flask API in app.py
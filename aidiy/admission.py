@@ -0,0 +1,103 @@
+# backend/aidiy/admission.py
+"""
+Admission control for slow upstream-bound routes (the OpenAI endpoints).
+
+Limits are per worker process: a global in-flight cap, a per-user cap and
+a short bounded wait queue. Anything beyond that is rejected right away
+so the worker's remaining threads stay free for the cheap routes.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    def __init__(self, name, max_in_flight=4, max_per_user=1, queue_size=4,
+                 queue_timeout_s=2.0, retry_after_s=5):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self.queue_timeout_s = queue_timeout_s
+        self.retry_after_s = retry_after_s
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self._per_user = defaultdict(int)  # admitted + queued, per user
+        self.admitted = 0
+        self.rejected = defaultdict(int)
+        self.max_waiting_seen = 0
+        self._wait_total_s = 0.0
+        self._waited = 0
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, self.retry_after_s)
+
+    def acquire(self, user):
+        with self._cond:
+            if self._per_user[user] >= self.max_per_user:
+                self._reject("user_limit")
+
+            if self.in_flight >= self.max_in_flight or self.waiting:
+                if self.waiting >= self.queue_size:
+                    self._reject("queue_full")
+
+                self.waiting += 1
+                self._per_user[user] += 1
+                self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+                started = time.monotonic()
+                ok = self._cond.wait_for(
+                    lambda: self.in_flight < self.max_in_flight, timeout=self.queue_timeout_s
+                )
+                self.waiting -= 1
+                self._wait_total_s += time.monotonic() - started
+                self._waited += 1
+                if not ok:
+                    self._release_user(user)
+                    self._reject("queue_timeout")
+            else:
+                self._per_user[user] += 1
+
+            self.in_flight += 1
+            self.admitted += 1
+
+    def _release_user(self, user):
+        self._per_user[user] -= 1
+        if self._per_user[user] <= 0:
+            del self._per_user[user]
+
+    def release(self, user):
+        with self._cond:
+            self.in_flight -= 1
+            self._release_user(user)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, user):
+        self.acquire(user)
+        try:
+            yield
+        finally:
+            self.release(user)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_per_user": self.max_per_user,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting_seen,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "avg_queue_wait_ms": round(self._wait_total_s / self._waited * 1000, 1) if self._waited else 0,
+            }
@@ -0,0 +1,92 @@
+# backend/aidiy/ai_cache.py
+"""
+Exact-match cache for text-only AI chat answers.
+
+Keyed by model + system prompt + normalised user message. Hot entries live
+in a per-process LRU; everything is also stored in the
+``ai_response_cache`` collection (TTL-indexed on ``expires_at``) so other
+workers and restarted processes share the answers.
+"""
+import hashlib
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+from aidiy.cache import TTLCache
+from aidiy.extensions import get_db
+from aidiy.log import get_logger
+
+log = get_logger("ai.cache")
+
+COLLECTION = "ai_response_cache"
+
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?!.]+$")
+
+def normalize_message(message):
+    """'  What IS interest??' and 'what is interest' share a cache entry."""
+    return _TRAILING.sub("", _SPACES.sub(" ", message.strip().lower()))
+
+def cache_key(model, system_prompt, message):
+    raw = "\x1f".join((model, system_prompt, normalize_message(message)))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class ResponseCache:
+    def __init__(self, name, maxsize=512, ttl=24 * 3600):
+        self.ttl = ttl
+        self.local = TTLCache(name, maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits_local = self.hits_shared = self.misses = self.stores = 0
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, key):
+        answer = self.local.get(key)
+        if answer is not None:
+            self._count("hits_local")
+            return answer
+        try:
+            doc = get_db()[COLLECTION].find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"response": 1},
+            )
+        except Exception as e:
+            log.warning("AI cache lookup failed: %s", e)
+            doc = None
+        if doc:
+            self._count("hits_shared")
+            self.local.set(key, doc["response"])
+            return doc["response"]
+        self._count("misses")
+        return None
+
+    def put(self, key, response, model):
+        self.local.set(key, response)
+        now = datetime.now(timezone.utc)
+        try:
+            get_db()[COLLECTION].update_one(
+                {"_id": key},
+                {"$set": {
+                    "response": response,
+                    "model": model,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                }},
+                upsert=True,
+            )
+            self._count("stores")
+        except Exception as e:
+            log.warning("AI cache store failed: %s", e)
+
+    def stats(self):
+        hits = self.hits_local + self.hits_shared
+        lookups = hits + self.misses
+        return {
+            "hits_local": self.hits_local,
+            "hits_shared": self.hits_shared,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
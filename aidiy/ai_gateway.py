@@ -0,0 +1,205 @@
+# backend/aidiy/ai_gateway.py
+"""
+Single entry point for OpenAI calls.
+
+Every call gets a deadline (the whole call, retries included), retries use
+full-jitter backoff and only happen when repeating the request is safe,
+and a circuit breaker fails fast while the upstream is unhealthy so
+requests don't pile up on dead sockets.
+
+The SDK's own retries are disabled (see extensions.get_ai_client) so this
+is the only retry layer. ``flask check-gateway`` (aidiy/checks.py) runs the
+timeout, retry and breaker paths against a stub transport; point
+OPENAI_BASE_URL at a local fake server to try real latency.
+"""
+import os
+import random
+import threading
+import time
+
+from aidiy.extensions import get_ai_client
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after):
+        super().__init__("AI upstream circuit is open")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """closed → open after N consecutive failures → half-open after a cool-down."""
+
+    def __init__(self, failure_threshold=5, reset_timeout_s=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout_s:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            # half-open lets exactly one probe through
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            remaining = self.reset_timeout_s - (time.monotonic() - self._opened_at)
+            raise CircuitOpen(max(1, int(remaining) + 1))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probe_in_flight:
+                    self.times_opened += 1
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def record_neutral(self):
+        """The call failed for a reason that says nothing about upstream health."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+        }
+
+def _classify(exc):
+    """
+    → (kind, retry_if_idempotent, retry_always, counts_as_upstream_failure)
+
+    "always" means the request provably wasn't processed (couldn't connect,
+    rate limited, 503), so even non-idempotent calls may repeat it.
+    """
+    import httpx
+    import openai
+
+    if isinstance(exc, openai.APITimeoutError):
+        return "timeout", True, False, True
+    if isinstance(exc, openai.APIConnectionError):
+        if isinstance(exc.__cause__, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return "connect", True, True, True
+        return "connection", True, False, True
+    if isinstance(exc, openai.RateLimitError):
+        return "rate_limited", True, True, False
+    if isinstance(exc, openai.APIStatusError):
+        if exc.status_code == 503:
+            return "unavailable", True, True, True
+        if exc.status_code >= 500:
+            return "server_error", True, False, True
+        return "client_error", False, False, False
+    return "other", False, False, False
+
+def _retry_after_header(exc):
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class AIGateway:
+    def __init__(self, client_factory=get_ai_client, breaker=None, max_attempts=3,
+                 base_delay_s=0.25, max_delay_s=4.0):
+        self.client_factory = client_factory
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "attempts": 0, "retries": 0, "successes": 0,
+                       "failures": 0, "short_circuited": 0}
+        self.failures_by_kind = {}
+
+    def _count(self, key, kind=None):
+        with self._lock:
+            self.counts[key] += 1
+            if kind:
+                self.failures_by_kind[kind] = self.failures_by_kind.get(kind, 0) + 1
+
+    def available(self):
+        return self.breaker.state != "open"
+
+    def chat(self, *, deadline_s, idempotent=False, **kwargs):
+        return self._call(lambda c: c.chat.completions.create, deadline_s, idempotent, kwargs)
+
+    def transcribe(self, *, deadline_s, idempotent=True, **kwargs):
+        return self._call(lambda c: c.audio.transcriptions.create, deadline_s, idempotent, kwargs)
+
+    def _call(self, method, deadline_s, idempotent, kwargs):
+        self._count("calls")
+        deadline = time.monotonic() + deadline_s
+        client = self.client_factory()
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpen:
+                self._count("short_circuited")
+                raise
+
+            attempt += 1
+            self._count("attempts")
+            remaining = deadline - time.monotonic()
+            try:
+                result = method(client.with_options(timeout=remaining, max_retries=0))(**kwargs)
+            except Exception as exc:
+                kind, retry_idem, retry_always, upstream = _classify(exc)
+                self._count("failures", kind)
+                if upstream:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_neutral()
+
+                retryable = retry_always or (idempotent and retry_idem)
+                if not retryable or attempt >= self.max_attempts:
+                    raise
+                delay = _retry_after_header(exc)
+                if delay is None:
+                    cap = min(self.max_delay_s, self.base_delay_s * 2 ** (attempt - 1))
+                    delay = random.uniform(0, cap)
+                # not worth sleeping if the next attempt can't finish in time
+                if time.monotonic() + delay >= deadline - 0.5:
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+                # fresh wrapper on retry: pick up a rebuilt client if any
+                client = self.client_factory()
+                continue
+
+            self.breaker.record_success()
+            self._count("successes")
+            return result
+
+    def stats(self):
+        return {
+            **self.counts,
+            "failures_by_kind": dict(self.failures_by_kind),
+            "circuit": self.breaker.stats(),
+        }
+
+gateway = AIGateway(
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("AI_BREAKER_FAILURES", 5)),
+        reset_timeout_s=int(os.getenv("AI_BREAKER_RESET_S", 30)),
+    ),
+    max_attempts=int(os.getenv("AI_MAX_ATTEMPTS", 3)),
+)
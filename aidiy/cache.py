@@ -0,0 +1,209 @@
+# backend/aidiy/cache.py
+"""
+Small in-process caches plus cross-worker invalidation.
+
+Each gunicorn worker keeps its own ``TTLCache`` instances. Caches subscribe
+to the change-stream bus in aidiy/invalidation.py, so any write to a
+watched collection - from any process - evicts the affected keys.
+
+Writers also call ``publish_invalidation(cache_name, key)``. That always
+drops the key locally; when change streams are unavailable (standalone
+server) it additionally appends the key to the capped
+``cache_invalidations`` collection, which every worker tails instead.
+With STORAGE_ENGINE=memory there is only the one process, so the local
+drop is all there is.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from aidiy.extensions import get_db, in_memory
+from aidiy.invalidation import bus
+from aidiy.log import get_logger
+
+log = get_logger("cache")
+
+INVALIDATIONS_COLLECTION = "cache_invalidations"
+INVALIDATIONS_SIZE_BYTES = 1024 * 1024
+
+_MISSING = object()
+_registry = {}
+
+class TTLCache:
+    """
+    Bounded LRU with a per-entry TTL. Values are deep-copied in and out.
+
+    ``get_or_load`` must not cache what its loader read if an invalidation
+    arrived while the loader ran. While a load is in flight its key has a
+    generation, bumped by ``pop``; ``clear`` bumps the cache-wide epoch.
+    The result is stored only if neither moved.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._loading = {}  # key → [loads in flight, generation]
+        self.hits = self.misses = self.evictions = self.invalidations = self.stale_loads = 0
+        _registry[name] = self
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] < now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            value = item[1]
+        return copy.deepcopy(value)
+
+    def _store(self, key, value):
+        # caller holds the lock
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value)
+
+    def _begin_load(self, key):
+        with self._lock:
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[0] += 1
+            return self._epoch, loading[1]
+
+    def _end_load(self, key, started):
+        """Caller holds the lock. True if nothing invalidated ``key`` since _begin_load."""
+        loading = self._loading[key]
+        fresh = started == (self._epoch, loading[1])
+        loading[0] -= 1
+        if not loading[0]:
+            del self._loading[key]
+        return fresh
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        started = self._begin_load(key)
+        stored = None
+        try:
+            value = loader()
+            if value is not None:
+                stored = copy.deepcopy(value)
+        finally:
+            with self._lock:
+                # checked and written under one lock, so no pop can slip in between
+                if self._end_load(key, started):
+                    if stored is not None:
+                        self._store(key, stored)
+                elif stored is not None:
+                    self.stale_loads += 1
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._loading:
+                self._loading[key][1] += 1
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_loads": self.stale_loads,
+        }
+
+def cache_stats():
+    return {name: c.stats() for name, c in _registry.items()}
+
+def invalidate_local(cache_name, key=None):
+    cache = _registry.get(cache_name)
+    if cache is None:
+        return
+    if key is None:
+        cache.clear()
+    else:
+        cache.pop(key)
+
+# ────────────── Capped-collection fallback feed ──────
+def _invalidations_col():
+    from pymongo import errors
+
+    db = get_db()
+    try:
+        db.create_collection(
+            INVALIDATIONS_COLLECTION, capped=True, size=INVALIDATIONS_SIZE_BYTES
+        )
+    except errors.CollectionInvalid:
+        pass  # already exists
+    return db[INVALIDATIONS_COLLECTION]
+
+def publish_invalidation(cache_name, key=None):
+    """Drop ``key`` (or everything when None) here and in every other worker."""
+    invalidate_local(cache_name, key)
+    if bus.streaming or in_memory():
+        return  # the change stream carries the write to other workers / there are none
+    try:
+        _invalidations_col().insert_one({"cache": cache_name, "key": key})
+    except Exception as e:
+        # other workers fall back to the TTL
+        log.warning("Could not publish invalidation %s:%s: %s", cache_name, key, e)
+
+def _tail_invalidations():
+    from pymongo import CursorType
+
+    last_id = None
+    while True:
+        try:
+            col = _invalidations_col()
+            if last_id is None:
+                newest = col.find_one(sort=[("$natural", -1)])
+                last_id = newest["_id"] if newest else None
+            q = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = col.find(q, cursor_type=CursorType.TAILABLE_AWAIT, max_await_time_ms=5000)
+            while cursor.alive:
+                for doc in cursor:
+                    last_id = doc["_id"]
+                    invalidate_local(doc.get("cache"), doc.get("key"))
+        except Exception as e:
+            log.warning("Invalidation feed error, retrying: %s", e)
+            time.sleep(5)
+        else:
+            time.sleep(1)
+
+def ensure_invalidation_listener():
+    """
+    Start the change-stream bus once per process (after gunicorn has forked),
+    tailing the capped feed instead if change streams are unsupported.
+    The in-memory engine is private to one process: nothing to listen for.
+    """
+    if in_memory():
+        return
+    bus.start(fallback=_tail_invalidations)
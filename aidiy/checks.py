@@ -0,0 +1,209 @@
+# backend/aidiy/checks.py
+"""
+Self-checks for behaviour that is easy to break without noticing. The
+repo has no test suite; these are CLI commands that exit non-zero on
+failure, so they can run in CI or before a deploy.
+
+* ``flask check-etags`` drives the API through Flask's test client on the
+  in-memory engine. Every write it makes must turn the next conditional
+  GET into a 200.
+* ``flask check-imports`` imports the app in a fresh interpreter and
+  fails if it goes over the cold-start budget or pulls in a module that
+  must only load on first use.
+* ``flask check-gateway`` points the AI gateway at a scripted in-process
+  transport and walks it through its timeout, retry and breaker paths.
+"""
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import click
+from flask import current_app
+
+from aidiy.extensions import get_db, in_memory
+
+# ────────────── ETags ───────────────────────────────
+class _Client:
+    """Test client for one user; fails the check on unexpected statuses."""
+
+    def __init__(self, client):
+        self.client = client
+        self.headers = {}
+
+    def call(self, method, url, expect=200, **kw):
+        resp = self.client.open(url, method=method, headers={**self.headers, **kw.pop("headers", {})}, **kw)
+        if resp.status_code != expect:
+            raise click.ClickException(
+                f"{method} {url}: expected {expect}, got {resp.status_code} {resp.get_data(as_text=True)[:200]}"
+            )
+        return resp
+
+def _sign_up(client):
+    email = f"etag-check-{uuid.uuid4().hex[:8]}@example.invalid"
+    client.call("POST", "/api/auth/register", 201,
+                json={"firstName": "Etag", "lastName": "Check", "email": email, "password": "check-pw"})
+    client.call("POST", "/api/auth/send-otp", json={"email": email})
+    otp = get_db()["otps"].find_one({"email": email})["otp"]
+    client.call("POST", "/api/auth/verify-otp", json={"email": email, "otp": otp})
+    token = client.call("POST", "/api/auth/login", json={"email": email, "password": "check-pw"}).get_json()["appToken"]
+    client.headers["Authorization"] = f"Bearer {token}"
+
+def _expect_refresh(client, url, write):
+    """``write`` (method, url, json) must invalidate the ETag of ``url``."""
+    etag = client.call("GET", url).headers["ETag"]
+    client.call("GET", url, 304, headers={"If-None-Match": etag})
+    method, write_url, body = write
+    client.call(method, write_url, json=body)
+    client.call("GET", url, 200, headers={"If-None-Match": etag})
+    click.echo(f"ok  {method} {write_url} refreshes {url}")
+
+@click.command("check-etags")
+def check_etags_command():
+    """Check that profile writes invalidate the ETagged profile reads (in-memory engine only)."""
+    if not in_memory():
+        raise click.ClickException("check-etags writes test users: run it with STORAGE_ENGINE=memory")
+    client = _Client(current_app.test_client())
+    _sign_up(client)
+    profile = "/api/dashboard/parent?sections=profile"
+    _expect_refresh(client, profile, ("PUT", "/api/users/profile", {"firstName": "Changed"}))
+    _expect_refresh(client, profile, ("POST", "/api/users/complete-assessment", None))
+    click.echo("ETag checks passed")
+
+# ────────────── Import time ─────────────────────────
+IMPORT_BUDGET_MS = 300
+# loaded on first use by aidiy/extensions.py, aidiy/images.py and the routes
+LAZY_MODULES = ("openai", "httpx", "PIL", "pymongo", "bcrypt", "google.oauth2", "flask_mail")
+
+def _import_profile(root):
+    """module → cumulative µs for one ``import app`` in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=root, env=os.environ.copy(), capture_output=True, text=True,
+    )
+    if proc.returncode:
+        raise click.ClickException(f"import app failed:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+@click.command("check-imports")
+@click.option("--budget-ms", default=IMPORT_BUDGET_MS, show_default=True)
+@click.option("--runs", default=3, show_default=True, help="Best of this many imports counts.")
+def check_imports_command(budget_ms, runs):
+    """Check that import app stays under budget and leaves the heavy modules unloaded."""
+    root = current_app.root_path
+    profiles = [_import_profile(root) for _ in range(runs)]
+    best = min(p.get("app", 0) for p in profiles) / 1000
+    loaded = sorted(m for m in LAZY_MODULES if any(m in p for p in profiles))
+    click.echo(f"import app: {best:.0f} ms (best of {runs}, budget {budget_ms} ms)")
+    slowest = sorted(profiles[0].items(), key=lambda kv: kv[1], reverse=True)[1:6]
+    for name, us in slowest:
+        click.echo(f"  {name:<32}{us / 1000:>8.1f} ms")
+    problems = []
+    if best > budget_ms:
+        problems.append(f"import app took {best:.0f} ms, budget is {budget_ms} ms")
+    if loaded:
+        problems.append(f"imported at module level: {', '.join(loaded)}")
+    if problems:
+        raise click.ClickException("; ".join(problems))
+    click.echo("Import checks passed")
+
+# ────────────── AI gateway ──────────────────────────
+_COMPLETION = {
+    "id": "check", "object": "chat.completion", "created": 0, "model": "check",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+}
+
+class _StubUpstream:
+    """
+    OpenAI client over an httpx.MockTransport that answers from a script:
+    "ok", "timeout", "connect" or an HTTP status code.
+    """
+
+    def __init__(self):
+        import httpx
+        from openai import OpenAI
+
+        self.script = []
+        self.requests = 0
+        self.client = OpenAI(
+            api_key="check", base_url="http://upstream.invalid/v1", max_retries=0,
+            http_client=httpx.Client(transport=httpx.MockTransport(self._answer)),
+        )
+
+    def _answer(self, request):
+        import httpx
+
+        self.requests += 1
+        step = self.script.pop(0) if self.script else "ok"
+        if step == "timeout":
+            raise httpx.ReadTimeout("stub timeout", request=request)
+        if step == "connect":
+            raise httpx.ConnectError("stub refused", request=request)
+        if step == "ok":
+            return httpx.Response(200, json=_COMPLETION)
+        return httpx.Response(step, json={"error": {"message": "stub"}}, headers={"retry-after": "0"})
+
+    def gateway(self, script, **kw):
+        from aidiy.ai_gateway import AIGateway, CircuitBreaker
+
+        self.script, self.requests = list(script), 0
+        breaker = CircuitBreaker(kw.pop("failure_threshold", 5), kw.pop("reset_timeout_s", 30))
+        return AIGateway(client_factory=lambda: self.client, breaker=breaker, base_delay_s=0.001, **kw)
+
+def _call(gateway, idempotent, deadline_s=5):
+    try:
+        gateway.chat(deadline_s=deadline_s, idempotent=idempotent, model="check", messages=[])
+        return "ok"
+    except Exception as e:
+        return type(e).__name__
+
+def _expect(name, got, want):
+    if got != want:
+        raise click.ClickException(f"{name}: expected {want}, got {got}")
+    click.echo(f"ok  {name}")
+
+@click.command("check-gateway")
+def check_gateway_command():
+    """Check the AI gateway's timeout, retry and circuit-breaker behaviour against a stub upstream."""
+    from aidiy.extensions import ai_available
+
+    if not ai_available():
+        raise click.ClickException("check-gateway needs the openai package")
+    upstream = _StubUpstream()
+
+    gw = upstream.gateway(["timeout", "ok"])
+    _expect("idempotent call retries a timeout", (_call(gw, True), upstream.requests), ("ok", 2))
+    gw = upstream.gateway(["timeout", "ok"])
+    _expect("non-idempotent call does not retry a timeout",
+            (_call(gw, False), upstream.requests), ("APITimeoutError", 1))
+    gw = upstream.gateway(["connect", 503, "ok"])
+    _expect("non-idempotent call retries connect errors and 503s", (_call(gw, False), upstream.requests), ("ok", 3))
+    gw = upstream.gateway([503, "ok"])
+    _expect("no retry that can't finish before the deadline",
+            (_call(gw, True, deadline_s=0.4), upstream.requests), ("InternalServerError", 1))
+    gw = upstream.gateway([400])
+    _expect("client errors are not retried", (_call(gw, True), upstream.requests), ("BadRequestError", 1))
+    gw = upstream.gateway([500, 500, 500, 500])
+    _expect("retries stop at max_attempts", (_call(gw, True), upstream.requests), ("InternalServerError", 3))
+
+    gw = upstream.gateway(["timeout", "timeout"], failure_threshold=2, reset_timeout_s=0.2, max_attempts=1)
+    _call(gw, True), _call(gw, True)
+    _expect("breaker opens after consecutive failures", gw.breaker.state, "open")
+    _expect("open breaker fails fast without a request",
+            (_call(gw, True), upstream.requests, gw.counts["short_circuited"]), ("CircuitOpen", 2, 1))
+    time.sleep(0.25)
+    upstream.script = ["timeout"]
+    _expect("failed half-open probe reopens the breaker", (_call(gw, True), gw.breaker.state), ("APITimeoutError", "open"))
+    time.sleep(0.25)
+    _expect("successful half-open probe closes the breaker", (_call(gw, True), gw.breaker.state), ("ok", "closed"))
+    click.echo("Gateway checks passed")
+
+COMMANDS = [check_etags_command, check_imports_command, check_gateway_command]
@@ -0,0 +1,390 @@
+# backend/aidiy/extensions.py
+"""
+Lazily initialised shared resources.
+
+Nothing in here touches the network (or even imports the heavy client
+libraries) until a request actually needs it, so importing ``app`` on a
+serverless cold start stays cheap.
+"""
+import os
+import threading
+from importlib.util import find_spec
+
+from aidiy.log import get_logger
+
+log = get_logger("mongo")
+
+DB_NAME = "aidiy_app"
+
+_lock = threading.Lock()
+_state = {}
+
+# ────────────── Index registry ──────────────────────
+# collection name → list of (keys, options) passed to create_index.
+# The family_id-led indexes serve family-scoped route queries (aidiy/family.py)
+# and are the shard-key candidates; the others serve FAMILY_SCOPED_QUERIES=False.
+INDEXES = {
+    "users": [
+        ("family_id", {}),
+    ],
+    "chat_sessions": [
+        ("user_email", {}),
+        ("created_at", {}),
+        ([("family_id", 1), ("user_email", 1), ("updated_at", -1)], {}),
+    ],
+    # enforce kid-username uniqueness
+    "children": [
+        ("username", {"unique": True}),
+        ([("family_id", 1), ("parent_email", 1)], {}),
+    ],
+    "goals": [
+        ([("family_id", 1), ("kid_username", 1)], {}),
+    ],
+    "chores": [
+        ([("parent_email", 1)], {}),
+        # status values are canonical (aidiy/schema.py) so equality hits this
+        ([("kid_username", 1), ("status", 1)], {}),
+        ([("family_id", 1), ("kid_username", 1), ("status", 1)], {}),
+    ],
+    # shared AI chat answers; Mongo drops them once expires_at passes
+    "ai_response_cache": [
+        ("expires_at", {"expireAfterSeconds": 0}),
+    ],
+    # speech-to-text results keyed by audio SHA-256
+    "transcripts": [
+        ("expires_at", {"expireAfterSeconds": 0}),
+    ],
+    # newest-first reads, unread counts and the per-recipient cap
+    # (aidiy/notifications.py); read rows carry expires_at
+    "notifications": [
+        ([("recipient_email", 1), ("created_at", -1)], {}),
+        ([("recipient_email", 1), ("read", 1)], {}),
+        ([("goal_id", 1)], {}),
+        ([("family_id", 1), ("recipient_email", 1), ("created_at", -1)], {}),
+        ("expires_at", {"expireAfterSeconds": 0}),
+    ],
+    "notifications_archive": [
+        ([("recipient_email", 1), ("created_at", -1)], {}),
+        ("expires_at", {"expireAfterSeconds": 0}),
+    ],
+    # notifications waiting for push / e-mail / stream consumers
+    "notification_outbox": [
+        ([("dispatched", 1), ("created_at", 1)], {}),
+        ("expires_at", {"expireAfterSeconds": 0}),
+    ],
+    # one bucket per kid / family per day (aidiy/rollups.py)
+    "savings_daily": [
+        ([("scope", 1), ("key", 1), ("day", 1)], {}),
+    ],
+    # append-only savings movements (was goals.progress_history)
+    "ledger": [
+        ([("goal_id", 1), ("date", -1)], {}),
+        ([("kid_username", 1), ("date", -1)], {}),
+        ([("family_id", 1), ("goal_id", 1), ("date", -1)], {}),
+    ],
+    # failed-login windows and lockouts, looked up by _id (aidiy/throttle.py)
+    "login_throttle": [
+        ("expires_at", {"expireAfterSeconds": 0}),
+    ],
+}
+
+def ensure_indexes(db):
+    from pymongo import errors
+
+    for name, specs in INDEXES.items():
+        for keys, opts in specs:
+            try:
+                db[name].create_index(keys, **opts)
+            except errors.OperationFailure as e:
+                # e.g. existing duplicates or an index with other options
+                log.warning("Could not create index %s.%s: %s", name, keys, e)
+
+# ────────────── Deployment target ───────────────────
+def deploy_target():
+    """
+    "serverless" (Vercel, one request per instance, frozen between calls)
+    or "server" (gunicorn workers on Railway / local dev).
+    """
+    target = os.getenv("DEPLOY_TARGET")
+    if target:
+        return target
+    return "serverless" if os.getenv("VERCEL") else "server"
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+# ────────────── MongoDB ─────────────────────────────
+# Serverless instances get a tiny pool that drops idle sockets quickly (a
+# frozen lambda can't keep them alive anyway); long-lived gunicorn workers
+# keep a couple of warm connections so the first query after idle is fast.
+MONGO_POOL_DEFAULTS = {
+    "serverless": {"maxPoolSize": 5, "minPoolSize": 0, "maxIdleTimeMS": 10_000},
+    "server": {"maxPoolSize": 20, "minPoolSize": 2, "maxIdleTimeMS": 300_000},
+}
+
+def _available_compressors():
+    wanted = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib").split(",")
+    # zstd / snappy need optional packages, zlib is always there
+    modules = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+    return [c for c in (w.strip() for w in wanted) if c in modules and find_spec(modules[c])]
+
+def mongo_client_options():
+    defaults = MONGO_POOL_DEFAULTS.get(deploy_target(), MONGO_POOL_DEFAULTS["server"])
+    return {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", defaults["maxPoolSize"]),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", defaults["minPoolSize"]),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_MS", defaults["maxIdleTimeMS"]),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5_000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5_000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS", 20_000),
+        "compressors": _available_compressors(),
+        "appname": "aidiy-api",
+    }
+
+class PoolStats:
+    """Counts pool events from pymongo's monitoring API (registered per client)."""
+
+    def __init__(self):
+        self.counts = {
+            "created": 0,
+            "closed": 0,
+            "checked_out": 0,
+            "checked_in": 0,
+            "check_out_failed": 0,
+            "pool_cleared": 0,
+        }
+
+    def listener(self):
+        from pymongo import monitoring
+
+        stats = self
+
+        class _Listener(monitoring.ConnectionPoolListener):
+            def pool_created(self, event): pass
+            def pool_ready(self, event): pass
+            def pool_closed(self, event): pass
+            def connection_ready(self, event): pass
+            def connection_check_out_started(self, event): pass
+
+            def pool_cleared(self, event):
+                stats.counts["pool_cleared"] += 1
+
+            def connection_created(self, event):
+                stats.counts["created"] += 1
+
+            def connection_closed(self, event):
+                stats.counts["closed"] += 1
+
+            def connection_checked_out(self, event):
+                stats.counts["checked_out"] += 1
+
+            def connection_checked_in(self, event):
+                stats.counts["checked_in"] += 1
+
+            def connection_check_out_failed(self, event):
+                stats.counts["check_out_failed"] += 1
+
+        return _Listener()
+
+    def snapshot(self):
+        c = dict(self.counts)
+        c["open"] = c["created"] - c["closed"]
+        c["in_use"] = c["checked_out"] - c["checked_in"]
+        return c
+
+mongo_pool_stats = PoolStats()
+
+# "mongo", or "memory" for the in-process engine in aidiy/memory.py: the
+# whole API without a database, for microbenchmarks and tests (one process)
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "mongo")
+
+def in_memory():
+    return STORAGE_ENGINE == "memory"
+
+def get_mongo_client():
+    client = _state.get("mongo_client")
+    if client is None:
+        with _lock:
+            client = _state.get("mongo_client")
+            if client is None:
+                if in_memory():
+                    from aidiy.memory import MemoryClient
+
+                    client = MemoryClient()
+                else:
+                    from pymongo import MongoClient
+
+                    client = MongoClient(
+                        os.getenv("MONGO_URI"),
+                        event_listeners=[mongo_pool_stats.listener()],
+                        **mongo_client_options(),
+                    )
+                _state["mongo_client"] = client
+    return client
+
+def get_db():
+    db = get_mongo_client()[DB_NAME]
+    if not _state.get("indexes_ready"):
+        with _lock:
+            if not _state.get("indexes_ready"):
+                try:
+                    ensure_indexes(db)
+                    _state["indexes_ready"] = True
+                except Exception as e:
+                    # retried on the next call; the query itself will surface
+                    # the real error if the database is unreachable
+                    log.warning("Index creation deferred: %s", e)
+    return db
+
+# ────────────── Transactions ────────────────────────
+# Multi-document transactions need a replica set or mongos. On a standalone
+# server (local dev) the first transactional write fails with
+# IllegalOperation; from then on callers just get session=None.
+_ILLEGAL_OPERATION = 20
+
+def run_transaction(fn):
+    """
+    Run ``fn(session)`` inside a transaction when the deployment supports
+    them, else ``fn(None)``. ``fn`` may be re-run on transient errors, so it
+    must not have side effects outside the session.
+    """
+    if _state.get("transactions") is False:
+        return fn(None)
+    from pymongo import errors
+
+    try:
+        with get_mongo_client().start_session() as session:
+            result = session.with_transaction(fn)
+        _state["transactions"] = True
+        return result
+    except errors.OperationFailure as e:
+        if e.code != _ILLEGAL_OPERATION or _state.get("transactions"):
+            raise
+        log.info("Transactions unsupported by this deployment, writing without them")
+        _state["transactions"] = False
+        return fn(None)
+
+class LazyCollection:
+    """Stand-in for a pymongo Collection that resolves on first attribute access."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+# ────────────── Flask-Mail ──────────────────────────
+def get_mail(app):
+    mail = app.extensions.get("mail")
+    if mail is None:
+        with _lock:
+            mail = app.extensions.get("mail")
+            if mail is None:
+                from flask_mail import Mail
+
+                Mail(app)
+                mail = app.extensions["mail"]
+    return mail
+
+# ────────────── OpenAI ──────────────────────────────
+def ai_available():
+    return find_spec("openai") is not None
+
+def _ai_http_client():
+    """httpx pool behind the OpenAI client, sized like the Mongo pool."""
+    import httpx
+
+    serverless = deploy_target() == "serverless"
+    return httpx.Client(
+        # HTTP/2 multiplexes concurrent calls over one kept-alive connection
+        http2=find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 4 if serverless else 20),
+            max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE", 2 if serverless else 10),
+            keepalive_expiry=_env_int("OPENAI_KEEPALIVE_EXPIRY_S", 30),
+        ),
+        timeout=httpx.Timeout(
+            _env_int("OPENAI_TIMEOUT_S", 60),
+            connect=_env_int("OPENAI_CONNECT_TIMEOUT_S", 5),
+        ),
+    )
+
+def get_ai_client():
+    if "ai_client" not in _state:
+        with _lock:
+            if "ai_client" not in _state:
+                try:
+                    from openai import OpenAI
+                except ImportError:
+                    get_logger("ai").warning("OpenAI package not installed, AI features will be disabled")
+                    _state["ai_client"] = None
+                else:
+                    http_client = _ai_http_client()
+                    _state["ai_http_client"] = http_client
+                    _state["ai_client"] = OpenAI(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        http_client=http_client,
+                        # retries are handled by aidiy/ai_gateway.py
+                        max_retries=0,
+                    )
+    client = _state["ai_client"]
+    if client is None:
+        raise RuntimeError("AI features are not available")
+    return client
+
+def ai_pool_stats():
+    http_client = _state.get("ai_http_client")
+    if http_client is None:
+        return {"initialised": False}
+    # httpx has no public pool API; read httpcore's connection list directly
+    try:
+        conns = http_client._transport._pool.connections
+    except AttributeError:
+        return {"initialised": True}
+    return {
+        "initialised": True,
+        "connections": len(conns),
+        "idle": sum(1 for c in conns if c.is_idle()),
+        "available": sum(1 for c in conns if c.is_available()),
+    }
+
+# ────────────── Query thread pool ───────────────────
+def get_query_pool():
+    """Bounded pool for running independent Mongo queries of one request concurrently."""
+    pool = _state.get("query_pool")
+    if pool is None:
+        with _lock:
+            pool = _state.get("query_pool")
+            if pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                pool = ThreadPoolExecutor(
+                    max_workers=_env_int("QUERY_POOL_THREADS", 4),
+                    thread_name_prefix="query",
+                )
+                _state["query_pool"] = pool
+    return pool
+
+# ────────────── Boot / metrics ──────────────────────
+def warm_up():
+    """Open the Mongo pool and round-trip a ping (called from gunicorn post_fork)."""
+    try:
+        get_db().command("ping")
+        log.info("Warm-up ping ok", extra={"pool": deploy_target()})
+    except Exception as e:
+        log.warning("Warm-up ping failed: %s", e)
+
+def pool_stats():
+    return {
+        "deploy_target": deploy_target(),
+        "storage_engine": STORAGE_ENGINE,
+        "mongo": {
+            "options": mongo_client_options() if "mongo_client" in _state else None,
+            **mongo_pool_stats.snapshot(),
+        },
+        "openai": ai_pool_stats(),
+    }
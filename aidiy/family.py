@@ -0,0 +1,72 @@
+# backend/aidiy/family.py
+"""
+Family ids: the partition key for family-owned data.
+
+A parent and their kids share one opaque ``family_id``. It is issued with
+the parent's account, copied onto every users / children / goals / chores /
+notifications / chat_sessions / ledger document written for the family,
+and carried in the JWT, so routes can put it in every query without a
+lookup. Queries that lead with it can be routed to one shard once those
+collections are sharded on it. ``flask migrate-family`` stamps documents
+written before family ids existed.
+
+Set FAMILY_SCOPED_QUERIES=False for the deploy that introduces family ids
+and unset it once the migration has finished; until then unstamped
+documents would drop out of family-scoped reads.
+
+Each family also has a change counter in ``change_versions``. ETagged
+reads are derived from it, so every write path that changes what a family
+sees calls ``bump_version``. Those paths are the repositories,
+commit_with_notifications and notification compaction; routes don't call
+it themselves. Within a request the bumps are collected and applied once,
+after the route has written (``flush_versions``). Outside a request
+(background threads, CLI) they are applied straight away.
+"""
+import os
+
+SCOPED_QUERIES = os.getenv("FAMILY_SCOPED_QUERIES", "True") == "True"
+VERSIONS_COLLECTION = "change_versions"
+
+def new_family_id():
+    from bson import ObjectId
+
+    return str(ObjectId())
+
+def family_scope(query, family_id):
+    """``query`` restricted to one family; unchanged when the family is unknown."""
+    if SCOPED_QUERIES and family_id:
+        return {"family_id": family_id, **query}
+    return query
+
+# ────────────── Change versions ─────────────────────
+def _version_id(family_id):
+    return f"family:{family_id}"
+
+def _bump(family_id):
+    from aidiy.extensions import get_db
+
+    get_db()[VERSIONS_COLLECTION].update_one({"_id": _version_id(family_id)}, {"$inc": {"v": 1}}, upsert=True)
+
+def bump_version(family_id):
+    """Call after a write that changes what ``family_id`` reads; no-op without a family."""
+    if not family_id:
+        return
+    from flask import g, has_request_context
+
+    if has_request_context():
+        g.setdefault("dirty_families", set()).add(family_id)
+    else:
+        _bump(family_id)
+
+def flush_versions():
+    """Apply the request's pending bumps (the app calls this after each request)."""
+    from flask import g
+
+    for family_id in g.pop("dirty_families", ()):
+        _bump(family_id)
+
+def family_version(family_id, session=None):
+    from aidiy.extensions import get_db
+
+    doc = get_db()[VERSIONS_COLLECTION].find_one({"_id": _version_id(family_id)}, session=session)
+    return doc["v"] if doc else 0
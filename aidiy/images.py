@@ -0,0 +1,143 @@
+# backend/aidiy/images.py
+"""
+Shrink chat images before they are sent to the vision model.
+
+Phone photos are often several MB and far larger than what gpt-4o actually
+looks at (it fits images into 2048x2048 and then scales the short side to
+768). We decode once, reject oversize uploads, apply the EXIF rotation,
+downscale to that effective resolution, drop all metadata and re-encode
+as a compact JPEG (or WebP). Without Pillow the image is only size-checked
+and passed through untouched. Pillow is imported by the first image, not at
+startup.
+"""
+import base64
+import binascii
+import os
+import threading
+import time
+from dataclasses import dataclass
+from importlib.util import find_spec
+from io import BytesIO
+
+MAX_UPLOAD_BYTES = int(os.getenv("AI_IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+LOW_DETAIL_SIDE = 512  # at or below this the model's "low" detail loses nothing
+OUTPUT_FORMAT = os.getenv("AI_IMAGE_FORMAT", "jpeg").lower()  # jpeg | webp
+OUTPUT_QUALITY = int(os.getenv("AI_IMAGE_QUALITY", 80))
+MAX_PIXELS = 50_000_000  # refuse decompression bombs
+
+class ImageTooLarge(ValueError):
+    pass
+
+class InvalidImage(ValueError):
+    pass
+
+@dataclass
+class PreparedImage:
+    b64: str
+    mime: str
+    detail: str
+    width: int
+    height: int
+    original_bytes: int
+    final_bytes: int
+    elapsed_ms: float
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime};base64,{self.b64}"
+
+_stats_lock = threading.Lock()
+_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0, "ms_total": 0.0, "rejected": 0}
+
+def _record(prepared):
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["bytes_in"] += prepared.original_bytes
+        _stats["bytes_out"] += prepared.final_bytes
+        _stats["ms_total"] += prepared.elapsed_ms
+
+def image_stats():
+    with _stats_lock:
+        s = dict(_stats)
+    s["saved_ratio"] = round(1 - s["bytes_out"] / s["bytes_in"], 3) if s["bytes_in"] else None
+    s["avg_ms"] = round(s["ms_total"] / s["images"], 1) if s["images"] else None
+    s["pillow"] = find_spec("PIL") is not None
+    return s
+
+def _target_size(width, height):
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height))
+    short = min(width, height) * scale
+    if short > MAX_SHORT_SIDE:
+        scale *= MAX_SHORT_SIDE / short
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def prepare_image(image_b64):
+    """base64 (optionally a data: URL) in → PreparedImage out."""
+    started = time.perf_counter()
+    if image_b64.startswith("data:"):
+        image_b64 = image_b64.split(",", 1)[-1]
+
+    # cheap size check before decoding anything
+    if len(image_b64) * 3 // 4 > MAX_UPLOAD_BYTES:
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise ImageTooLarge(f"Image exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    try:
+        raw = base64.b64decode(image_b64)
+    except (binascii.Error, ValueError):
+        raise InvalidImage("Image is not valid base64")
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # optional dependency
+        prepared = PreparedImage(image_b64, "image/jpeg", "auto", 0, 0, len(raw), len(raw),
+                                 (time.perf_counter() - started) * 1000)
+        _record(prepared)
+        return prepared
+
+    try:
+        img = Image.open(BytesIO(raw))
+        if img.width * img.height > MAX_PIXELS:
+            raise InvalidImage("Image dimensions too large")
+        target = _target_size(img.width, img.height)
+        img.draft("RGB", target)  # JPEG: let the decoder downscale for free
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        target = _target_size(img.width, img.height)
+        if target != img.size:
+            img = img.resize(target, Image.LANCZOS)
+    except InvalidImage:
+        raise
+    except Exception as e:
+        raise InvalidImage(f"Could not decode image: {e}")
+
+    out = BytesIO()
+    # a freshly saved image carries no EXIF/GPS/ICC metadata
+    if OUTPUT_FORMAT == "webp":
+        img.save(out, "WEBP", quality=OUTPUT_QUALITY, method=4)
+        mime = "image/webp"
+    else:
+        img.save(out, "JPEG", quality=OUTPUT_QUALITY, optimize=True, progressive=True)
+        mime = "image/jpeg"
+    data = out.getvalue()
+
+    detail = "low" if max(img.size) <= LOW_DETAIL_SIDE else "high"
+    prepared = PreparedImage(
+        b64=base64.b64encode(data).decode(),
+        mime=mime,
+        detail=detail,
+        width=img.width,
+        height=img.height,
+        original_bytes=len(raw),
+        final_bytes=len(data),
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+    _record(prepared)
+    return prepared
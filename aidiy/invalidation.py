@@ -0,0 +1,181 @@
+# backend/aidiy/invalidation.py
+"""
+Cache invalidation bus fed by MongoDB change streams.
+
+One watcher thread per process follows inserts/updates/deletes on the
+collections in ``WATCHED`` and hands each change to the local subscribers
+as an ``InvalidationEvent``. The stream's resume token is persisted in
+``resume_tokens`` so a restarted process carries on where it stopped
+instead of replaying or skipping changes.
+
+Change streams need a replica set (a single-node one is fine, see
+DEPLOYMENT.md). On a standalone server the bus reports ``streaming=False``
+and aidiy/cache.py falls back to its capped-collection feed.
+"""
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from aidiy.extensions import get_db
+from aidiy.log import get_logger
+
+log = get_logger("invalidation")
+
+# collection → fields copied from the changed document into event.keys
+WATCHED = {
+    "users": ("email",),
+    "children": ("username", "parent_email"),
+    "goals": ("kid_username", "parent_email"),
+    "chores": ("kid_username", "parent_email"),
+}
+
+RESUME_TOKENS_COLLECTION = "resume_tokens"
+SAVE_TOKEN_EVERY_S = 2.0
+
+# errors meaning "this deployment can't do change streams" (standalone server)
+_UNSUPPORTED_CODES = {40573, 40324}
+
+@dataclass(frozen=True)
+class InvalidationEvent:
+    collection: str
+    operation: str  # insert / update / replace / delete / invalidate
+    document_id: object = None
+    # whatever WATCHED fields the document carried; empty for deletes
+    keys: dict = field(default_factory=dict)
+    # top-level fields touched by an update (old values are not available)
+    changed_fields: tuple = ()
+
+class InvalidationBus:
+    def __init__(self, consumer=None):
+        self.consumer = consumer or os.getenv("INVALIDATION_CONSUMER") or socket.gethostname()
+        self.streaming = False
+        self.events_seen = 0
+        self._subscribers = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        self._fallback = None
+
+    # ---------- subscribers ----------
+    def subscribe(self, collection, callback):
+        """``callback(event)`` runs on the watcher thread; keep it cheap."""
+        self._subscribers.setdefault(collection, []).append(callback)
+
+    def publish(self, event):
+        for callback in self._subscribers.get(event.collection, ()):
+            try:
+                callback(event)
+            except Exception:
+                log.exception("Subscriber error for %s", event.collection)
+
+    def publish_all(self, operation="invalidate"):
+        """Tell every subscriber to drop everything (stream gap / reset)."""
+        for collection in self._subscribers:
+            self.publish(InvalidationEvent(collection, operation))
+
+    # ---------- watcher ----------
+    def start(self, fallback=None):
+        """
+        Start the watcher once per process. ``fallback`` is run on the same
+        thread if change streams turn out to be unsupported.
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._fallback = fallback
+                self._thread = threading.Thread(target=self._run, name="invalidation-bus", daemon=True)
+                self._thread.start()
+
+    def _tokens(self):
+        return get_db()[RESUME_TOKENS_COLLECTION]
+
+    def _load_token(self):
+        doc = self._tokens().find_one({"_id": self.consumer})
+        return doc["token"] if doc else None
+
+    def _save_token(self, token):
+        self._tokens().update_one(
+            {"_id": self.consumer},
+            {"$set": {"token": token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    def _pipeline(self):
+        project = {"operationType": 1, "ns": 1, "documentKey": 1, "updateDescription.updatedFields": 1}
+        for fields in WATCHED.values():
+            for f in fields:
+                project[f"fullDocument.{f}"] = 1
+        return [
+            {"$match": {"ns.coll": {"$in": list(WATCHED)}}},
+            {"$project": project},
+        ]
+
+    def _to_event(self, change):
+        coll = change["ns"]["coll"]
+        doc = change.get("fullDocument") or {}
+        keys = {f: doc[f] for f in WATCHED.get(coll, ()) if f in doc}
+        updated = (change.get("updateDescription") or {}).get("updatedFields") or {}
+        return InvalidationEvent(
+            collection=coll,
+            operation=change["operationType"],
+            document_id=(change.get("documentKey") or {}).get("_id"),
+            keys=keys,
+            changed_fields=tuple({f.split(".")[0] for f in updated}),
+        )
+
+    def _run(self):
+        from pymongo import errors
+
+        while True:
+            try:
+                self._watch()
+            except errors.OperationFailure as e:
+                if e.code in _UNSUPPORTED_CODES:
+                    log.warning("Change streams unavailable (%s), using fallback feed", e.code)
+                    self.streaming = False
+                    if self._fallback:
+                        self._fallback()
+                    return
+                if e.code == 286:  # ChangeStreamHistoryLost - token too old
+                    log.warning("Resume token expired, flushing caches")
+                    self._tokens().delete_one({"_id": self.consumer})
+                    self.publish_all()
+                else:
+                    log.warning("Stream error, retrying: %s", e)
+                    time.sleep(5)
+            except Exception as e:
+                log.warning("Stream error, retrying: %s", e)
+                self.streaming = False
+                time.sleep(5)
+
+    def _watch(self):
+        token = self._load_token()
+        db = get_db()
+        with db.watch(self._pipeline(), full_document="updateLookup", resume_after=token) as stream:
+            self.streaming = True
+            if token is None:
+                # no history to replay: anything cached before now may be stale
+                self.publish_all()
+            saved, last_save = token, time.monotonic()
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    self.events_seen += 1
+                    self.publish(self._to_event(change))
+                current = stream.resume_token
+                if current and current != saved and time.monotonic() - last_save >= SAVE_TOKEN_EVERY_S:
+                    self._save_token(current)
+                    saved, last_save = current, time.monotonic()
+
+    def stats(self):
+        return {
+            "consumer": self.consumer,
+            "streaming": self.streaming,
+            "events_seen": self.events_seen,
+            "subscriptions": {c: len(s) for c, s in self._subscribers.items()},
+        }
+
+bus = InvalidationBus()
@@ -0,0 +1,128 @@
+# backend/aidiy/json_provider.py
+"""
+Flask JSON provider that understands BSON types.
+
+Routes can hand Mongo documents straight to ``jsonify``: ObjectId becomes
+its hex string, datetime/date an ISO-8601 string and Decimal/Decimal128 a
+float. orjson is used when installed, otherwise the stdlib encoder.
+
+``flask bench-json`` times a large list response through the per-route
+conversion loops plus Flask's default provider that this replaced, and
+through this provider with and without orjson.
+"""
+import datetime as _dt
+import json
+import time
+from decimal import Decimal
+
+import click
+from bson import Decimal128, ObjectId
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+def bson_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (_dt.datetime, _dt.date)):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        o = o.to_decimal()
+    if isinstance(o, Decimal):
+        return float(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+class BSONJSONProvider(DefaultJSONProvider):
+    # orjson emits UTC-naive datetimes as-is, which matches .isoformat()
+    _orjson_opts = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def _dumps_bytes(self, obj):
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=bson_default, option=self._orjson_opts)
+            except TypeError:
+                # e.g. ints beyond 64 bits - let the stdlib have a go
+                pass
+        return json.dumps(obj, default=bson_default, ensure_ascii=False).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault("default", bson_default)
+            return json.dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype=self.mimetype)
+
+# ────────────── Benchmark ───────────────────────────
+def _bench_chores(n):
+    now = _dt.datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(), "title": f"Chore {i}", "description": "Bed, desk and floor",
+            "category": "Cleaning", "difficulty": "Easy", "reward": 5.0, "status": "assigned",
+            "parent_email": "parent@example.com", "assignedTo": "kid", "dueDate": "May 24, 2025",
+            "created_at": now, "updated_at": now,
+        }
+        for i in range(n)
+    ]
+
+def _by_hand(provider, chores):
+    # what get_chores did before this provider: convert in place, then dump
+    for c in chores:
+        c["id"] = str(c.pop("_id"))
+        c["created_at"] = c["created_at"].isoformat()
+        c["updated_at"] = c["updated_at"].isoformat()
+    return provider.dumps({"success": True, "chores": chores}).encode()
+
+def _by_provider(dumps_bytes, chores):
+    # what get_chores does now: only the _id -> id rename the client needs
+    for c in chores:
+        c["id"] = c.pop("_id")
+    return dumps_bytes({"success": True, "chores": chores})
+
+def _stdlib_bytes(obj):
+    return json.dumps(obj, default=bson_default, ensure_ascii=False).encode()
+
+def _time(fn, payloads):
+    started = time.perf_counter()
+    for payload in payloads:
+        fn(payload)
+    return (time.perf_counter() - started) / len(payloads) * 1e3
+
+@click.command("bench-json")
+@click.option("--documents", default=5000, show_default=True)
+@click.option("--iterations", default=20, show_default=True)
+def bench_json_command(documents, iterations):
+    """Time one chores list response: old conversion loop + default provider vs BSONJSONProvider."""
+    docs = _bench_chores(documents)
+    app = current_app._get_current_object()
+    old = DefaultJSONProvider(app)
+    new = BSONJSONProvider(app)
+
+    def fresh():
+        # the old path mutates the documents, so each run gets its own copies
+        return [[dict(d) for d in docs] for _ in range(iterations)]
+
+    rows = [
+        ("by hand + default", _time(lambda chores: _by_hand(old, chores), fresh())),
+        ("provider, stdlib", _time(lambda chores: _by_provider(_stdlib_bytes, chores), fresh())),
+    ]
+    if orjson is not None:
+        rows.append(("provider, orjson", _time(lambda chores: _by_provider(new._dumps_bytes, chores), fresh())))
+    click.echo(f"orjson: {orjson.__version__ if orjson else 'not installed'}, "
+               f"{documents} documents, {iterations} iterations, ms per response")
+    for name, ms in rows:
+        click.echo(f"{name:<20}{ms:>10.2f}")
+
+COMMANDS = [bench_json_command]
@@ -0,0 +1,191 @@
+# aidiy/log.py
+"""
+Structured, non-blocking logging.
+
+Request threads only put records on a bounded queue (QueueHandler); a
+single QueueListener thread renders them as JSON lines on stdout. Each
+record carries the request id, route and user type of the request that
+logged it, plus any ``extra={...}`` fields.
+
+Tuning (environment):
+  LOG_LEVEL=INFO                      root level for every category
+  LOG_LEVELS=ai=DEBUG,mail=WARNING    per-category overrides
+  LOG_SAMPLE=http=0.1,ai=0.5          keep this fraction of sub-WARNING records
+  LOG_MAX_FIELD=1000                  truncate long strings (raw AI output etc.)
+  LOG_QUEUE_SIZE=10000                records beyond this are dropped, not waited on
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT = "aidiy"
+MAX_FIELD = int(os.getenv("LOG_MAX_FIELD", 1000))
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# attributes every LogRecord has; anything else came in through extra={}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "route", "user_type",
+}
+
+_lock = threading.Lock()
+_state = {"pid": None, "listener": None}
+_counters = {"queued": 0, "dropped": 0, "sampled_out": 0}
+
+def _parse_map(raw):
+    """'ai=DEBUG, http=0.1' → {'ai': 'DEBUG', 'http': '0.1'}"""
+    out = {}
+    for part in (raw or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = value.strip()
+    return out
+
+def truncate(value, limit=None):
+    limit = MAX_FIELD if limit is None else limit
+    if isinstance(value, str) and limit and len(value) > limit:
+        return f"{value[:limit]}…(+{len(value) - limit} chars)"
+    return value
+
+def get_logger(category):
+    """Logger for one category, e.g. get_logger("ai") → "aidiy.ai"."""
+    return logging.getLogger(f"{ROOT}.{category}")
+
+def _request_context():
+    """Request id / route / user type of the current Flask request, if any."""
+    try:
+        from flask import g, has_request_context, request
+    except ImportError:
+        return {}
+    if not has_request_context():
+        return {}
+    user = getattr(request, "user", None) or {}
+    email = user.get("email", "")
+    return {
+        "request_id": g.get("request_id"),
+        "route": request.url_rule.rule if request.url_rule else request.path,
+        "user_type": ("kid" if "@kids.aidiy" in email else "parent") if email else "anonymous",
+    }
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fixed fraction of sub-WARNING records per category."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name[len(ROOT) + 1:].split(".")[0], 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        _counters["sampled_out"] += 1
+        return False
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Runs on the logging thread: stamps the request context, resolves the
+    message and traceback, and hands off. JSON rendering and the actual
+    write happen on the listener thread.
+    """
+
+    def prepare(self, record):
+        record.__dict__.update(_request_context())
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _counters["queued"] += 1
+        except queue.Full:
+            _counters["dropped"] += 1
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "category": record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        for key in ("request_id", "route", "user_type"):
+            if getattr(record, key, None):
+                out[key] = getattr(record, key)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                out[key] = truncate(value)
+        if record.exc_text:
+            out["exc"] = truncate(record.exc_text, MAX_FIELD * 4)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+def configure():
+    """
+    Install the queue handler on the "aidiy" logger and start the listener.
+    Idempotent per process: gunicorn workers call it again after fork since
+    the listener thread doesn't survive the fork.
+    """
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return
+        old = _state["listener"]
+        if old is not None and old._thread is not None and old._thread.is_alive():
+            old.stop()
+
+        root = logging.getLogger(ROOT)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for category, level in _parse_map(os.getenv("LOG_LEVELS")).items():
+            get_logger(category).setLevel(level.upper())
+
+        q = queue.Queue(QUEUE_SIZE)
+        handler = RequestQueueHandler(q)
+        rates = {k: float(v) for k, v in _parse_map(os.getenv("LOG_SAMPLE")).items()}
+        if rates:
+            handler.addFilter(SamplingFilter(rates))
+        root.addHandler(handler)
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JSONFormatter())
+        listener = QueueListener(q, stream, respect_handler_level=True)
+        listener.start()
+        if _state["pid"] is None:
+            # drain the queue on interpreter exit (the listener is a daemon thread)
+            atexit.register(_stop)
+        _state.update(pid=os.getpid(), listener=listener)
+
+def _stop():
+    listener = _state["listener"]
+    if listener is not None and listener._thread is not None:
+        listener.stop()
+
+def flush(timeout=2.0):
+    """Wait (briefly) for queued records to be written, e.g. at shutdown."""
+    listener = _state["listener"]
+    if listener is None:
+        return
+    deadline = time.monotonic() + timeout
+    while not listener.queue.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def log_stats():
+    listener = _state["listener"]
+    return {
+        **_counters,
+        "backlog": listener.queue.qsize() if listener else 0,
+        "queue_size": QUEUE_SIZE,
+    }
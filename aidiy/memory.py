@@ -0,0 +1,776 @@
+# backend/aidiy/memory.py
+"""
+In-process storage engine: the slice of pymongo the app uses, kept in dicts.
+
+With STORAGE_ENGINE=memory, ``get_mongo_client()`` returns a MemoryClient,
+so the whole API runs without a database. That covers the repositories,
+notifications, rollups and migrations, and is meant for microbenchmarks
+and tests. Every index registered with create_index (the
+extensions.INDEXES registry) becomes a hash index on its leading field.
+Equality and ``$in`` filters on an indexed field only look at the matching
+documents, and unique indexes raise DuplicateKeyError. Anything else is a
+scan.
+
+Matching, sorting and updates follow MongoDB wherever the app relies on
+it:
+* a missing field equals null and sorts first;
+* ``$ne`` matches documents without the field;
+* range operators only compare values of the same type;
+* equality against an array field matches any of its elements.
+
+There are no transactions, change streams or TTL deletes. Collections
+accept ``session=`` and ignore it, and start_session() fails the way a
+standalone server does, so run_transaction writes without a transaction.
+The store belongs to one process: run a single worker (or a test client).
+"""
+import itertools
+import re
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import errors
+
+_MISSING = object()
+
+def _copy(value):
+    # documents are plain JSON-ish trees; ObjectId / datetime are immutable
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+# ────────────── Field paths ─────────────────────────
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+def _parent(doc, path, create):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        nxt = doc.get(part)
+        if not isinstance(nxt, dict):
+            if not create:
+                return None, leaf
+            nxt = doc[part] = {}
+        doc = nxt
+    return doc, leaf
+
+def _set(doc, path, value):
+    target, leaf = _parent(doc, path, create=True)
+    target[leaf] = value
+
+def _unset(doc, path):
+    target, leaf = _parent(doc, path, create=False)
+    if target is not None:
+        target.pop(leaf, None)
+
+# ────────────── Ordering ────────────────────────────
+# BSON comparison order across types
+def _rank(value):
+    if value is None or value is _MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+class _Key:
+    __slots__ = ("rank", "value")
+
+    def __init__(self, value):
+        self.rank = _rank(value)
+        self.value = None if self.rank == 1 else value
+
+    def __lt__(self, other):
+        if self.rank != other.rank:
+            return self.rank < other.rank
+        if self.rank in (1, 4, 5):
+            return repr(self.value) < repr(other.value)
+        return self.value < other.value
+
+    def __eq__(self, other):
+        return self.rank == other.rank and self.value == other.value
+
+def _sort_spec(key, direction=None):
+    if isinstance(key, str):
+        return [(key, direction if direction is not None else 1)]
+    return [(k, d) for k, d in key]
+
+def _sorted(docs, spec):
+    docs = list(docs)
+    for field, direction in reversed(spec):
+        if field == "$natural":
+            if direction < 0:
+                docs.reverse()
+            continue
+        docs.sort(key=lambda d: _Key(_get(d, field)), reverse=direction < 0)
+    return docs
+
+# ────────────── Query matching ──────────────────────
+def _equals(value, wanted):
+    if isinstance(wanted, re.Pattern):
+        return isinstance(value, str) and wanted.search(value) is not None
+    if wanted is None:
+        return value is None or value is _MISSING
+    if value is _MISSING:
+        return False
+    if isinstance(value, list) and not isinstance(wanted, list):
+        return any(_equals(v, wanted) for v in value)
+    return _rank(value) == _rank(wanted) and value == wanted
+
+def _compare(value, op, bound):
+    values = value if isinstance(value, list) else [value]
+    for v in values:
+        if v is _MISSING or _rank(v) != _rank(bound):
+            continue
+        if ((op == "$gt" and v > bound) or (op == "$gte" and v >= bound)
+                or (op == "$lt" and v < bound) or (op == "$lte" and v <= bound)):
+            return True
+    return False
+
+def _match_operators(value, ops):
+    for op, arg in ops.items():
+        if op == "$eq":
+            ok = _equals(value, arg)
+        elif op == "$ne":
+            ok = not _equals(value, arg)
+        elif op == "$in":
+            ok = any(_equals(value, a) for a in arg)
+        elif op == "$nin":
+            ok = not any(_equals(value, a) for a in arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = _compare(value, op, arg)
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(arg)
+        elif op == "$not":
+            ok = not _match_operators(value, arg)
+        elif op == "$regex":
+            ok = isinstance(value, str) and re.search(arg, value, re.I if "i" in ops.get("$options", "") else 0)
+        elif op == "$options":
+            continue
+        elif op == "$size":
+            ok = isinstance(value, list) and len(value) == arg
+        else:
+            raise errors.OperationFailure(f"unknown operator: {op}", code=2)
+        if not ok:
+            return False
+    return True
+
+def _is_operators(value):
+    return isinstance(value, dict) and value and all(str(k).startswith("$") for k in value)
+
+def matches(doc, query):
+    """True if ``doc`` satisfies the MongoDB filter ``query``."""
+    for key, wanted in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in wanted):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in wanted):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, q) for q in wanted):
+                return False
+        elif _is_operators(wanted):
+            if not _match_operators(_get(doc, key), wanted):
+                return False
+        elif not _equals(_get(doc, key), wanted):
+            return False
+    return True
+
+def _project(doc, projection):
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = dict.fromkeys(projection, 1)
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if any(fields.values()) or (not fields and include_id):
+        out = {}
+        for path in fields:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                _set(out, path, _copy(value))
+    else:
+        out = _copy(doc)
+        for path in fields:
+            _unset(out, path)
+    if include_id and "_id" in doc:
+        out["_id"] = doc["_id"]
+    elif not include_id:
+        out.pop("_id", None)
+    return out
+
+# ────────────── Updates ─────────────────────────────
+def _apply_update(doc, update, inserting=False):
+    """Apply an update document (or replacement) to ``doc`` in place."""
+    if not any(k.startswith("$") for k in update):
+        _id = doc.get("_id")
+        doc.clear()
+        doc.update(_copy(update))
+        if _id is not None:
+            doc["_id"] = _id
+        return
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            if op == "$set":
+                _set(doc, path, _copy(arg))
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set(doc, path, _copy(arg))
+            elif op == "$unset":
+                _unset(doc, path)
+            elif op == "$inc":
+                current = _get(doc, path)
+                _set(doc, path, (0 if current is _MISSING else current) + arg)
+            elif op == "$push":
+                items = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                current = _get(doc, path)
+                _set(doc, path, (current if isinstance(current, list) else []) + _copy(items))
+            elif op == "$addToSet":
+                items = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                current = _get(doc, path)
+                current = current if isinstance(current, list) else []
+                _set(doc, path, current + [_copy(i) for i in items if i not in current])
+            elif op == "$pull":
+                current = _get(doc, path)
+                if isinstance(current, list):
+                    _set(doc, path, [v for v in current if not _equals(v, arg)])
+            elif op == "$max":
+                current = _get(doc, path)
+                if current is _MISSING or _Key(current) < _Key(arg):
+                    _set(doc, path, _copy(arg))
+            elif op == "$min":
+                current = _get(doc, path)
+                if current is _MISSING or _Key(arg) < _Key(current):
+                    _set(doc, path, _copy(arg))
+            elif op == "$currentDate":
+                _set(doc, path, datetime.utcnow())
+            else:
+                raise errors.OperationFailure(f"unknown update operator: {op}", code=9)
+
+def _seed_from_filter(query):
+    """The equality parts of an upsert's filter become fields of the new document."""
+    doc = {}
+    for key, value in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if _is_operators(value):
+            if "$eq" in value:
+                _set(doc, key, _copy(value["$eq"]))
+            continue
+        _set(doc, key, _copy(value))
+    return doc
+
+def _result(**counts):
+    base = {
+        "acknowledged": True, "inserted_id": None, "inserted_ids": [], "upserted_id": None,
+        "matched_count": 0, "modified_count": 0, "deleted_count": 0,
+        "inserted_count": 0, "upserted_count": 0,
+    }
+    return SimpleNamespace(**{**base, **counts})
+
+# ────────────── Indexes ─────────────────────────────
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+def _index_keys(value):
+    """Index entries for one field value (arrays are multikey)."""
+    if value is _MISSING:
+        return [None]
+    if isinstance(value, list):
+        return [v for v in value if _hashable(v)] or [None]
+    return [value] if _hashable(value) else []
+
+class _Index:
+    def __init__(self, fields, unique=False, options=None):
+        self.fields = fields
+        self.field = fields[0]
+        self.unique = unique
+        self.options = options or {}
+        self.entries = {}  # leading-field value → set of _ids
+        self.loose = set()  # _ids whose value can't be hashed; always candidates
+        self.owners = {}  # unique indexes: full key → _id
+
+    def _full_key(self, doc):
+        key = tuple(_get(doc, f) for f in self.fields)
+        key = tuple(None if v is _MISSING else v for v in key)
+        return key if _hashable(key) else None
+
+    def check(self, doc):
+        if self.unique:
+            key = self._full_key(doc)
+            owner = self.owners.get(key, _MISSING)
+            if key is not None and owner is not _MISSING and owner != doc["_id"]:
+                raise errors.DuplicateKeyError(
+                    f"E11000 duplicate key error index: {'_'.join(self.fields)} dup key: {key}", code=11000
+                )
+
+    def add(self, doc):
+        keys = _index_keys(_get(doc, self.field))
+        if not keys:
+            self.loose.add(doc["_id"])
+        for k in keys:
+            self.entries.setdefault(k, set()).add(doc["_id"])
+        if self.unique:
+            self.owners[self._full_key(doc)] = doc["_id"]
+
+    def remove(self, doc):
+        self.loose.discard(doc["_id"])
+        for k in _index_keys(_get(doc, self.field)):
+            ids = self.entries.get(k)
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del self.entries[k]
+        if self.unique and self.owners.get(self._full_key(doc)) == doc["_id"]:
+            del self.owners[self._full_key(doc)]
+
+    def candidates(self, wanted):
+        """_ids that may match ``wanted`` on the leading field, or None if the index can't tell."""
+        if _is_operators(wanted):
+            if set(wanted) - {"$in", "$eq"}:
+                return None
+            values = wanted["$in"] if "$in" in wanted else [wanted["$eq"]]
+        elif isinstance(wanted, (dict, list, re.Pattern)):
+            return None
+        else:
+            values = [wanted]
+        if not all(_hashable(v) for v in values):
+            return None
+        found = set(self.loose)
+        for v in values:
+            found |= self.entries.get(v, set())
+        return found
+
+# ────────────── Collections ─────────────────────────
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._docs = None
+
+    def sort(self, key, direction=None):
+        self._sort = _sort_spec(key, direction)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _results(self):
+        if self._docs is None:
+            self._docs = iter(self._collection._select(
+                self._query, self._projection, self._sort, self._skip, self._limit
+            ))
+        return self._docs
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._results())
+
+    def next(self):
+        return next(self)
+
+    @property
+    def alive(self):
+        return self._docs is None or self._docs.__length_hint__() > 0
+
+    def close(self):
+        self._docs = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._lock = database._lock
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}
+        self._seq = {}
+        self._counter = itertools.count()
+        self._indexes = {}
+        # like MongoDB: a collection exists once created or written to
+        self.exists = False
+        self.options = {}
+
+    def __repr__(self):
+        return f"MemoryCollection({self.name!r})"
+
+    @property
+    def full_name(self):
+        return f"{self.database.name}.{self.name}"
+
+    def with_options(self, **kwargs):
+        return self
+
+    # ---------- indexes ----------
+    def create_index(self, keys, unique=False, name=None, **options):
+        fields = [f for f, _ in _sort_spec(keys)]
+        name = name or "_".join(f"{f}_{d}" for f, d in _sort_spec(keys))
+        with self._lock:
+            if name in self._indexes:
+                return name
+            self.exists = True
+            index = _Index(fields, unique=unique, options=options)
+            for doc in self._docs.values():
+                index.check(doc)
+                index.add(doc)
+            self._indexes[name] = index
+        return name
+
+    def index_information(self):
+        return {"_id_": {"key": [("_id", 1)]}, **{
+            name: {"key": [(f, 1) for f in index.fields], "unique": index.unique, **index.options}
+            for name, index in self._indexes.items()
+        }}
+
+    def drop_indexes(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def _index_all(self, doc):
+        for index in self._indexes.values():
+            index.add(doc)
+
+    def _unindex_all(self, doc):
+        for index in self._indexes.values():
+            index.remove(doc)
+
+    def _check_unique(self, doc):
+        for index in self._indexes.values():
+            index.check(doc)
+
+    # ---------- reads ----------
+    def _candidates(self, query):
+        if not query:
+            return list(self._docs.values())
+        _id = query.get("_id", _MISSING)
+        if _id is not _MISSING and not _is_operators(_id):
+            doc = self._docs.get(_id) if _hashable(_id) else None
+            return [doc] if doc is not None else []
+        best = None
+        for field, wanted in query.items():
+            for index in self._indexes.values():
+                if index.field != field:
+                    continue
+                ids = index.candidates(wanted)
+                if ids is not None and (best is None or len(ids) < len(best)):
+                    best = ids
+        if best is None:
+            return list(self._docs.values())
+        # insertion order, so an unsorted read returns what a full scan would
+        return sorted((self._docs[i] for i in best if i in self._docs), key=lambda d: self._seq[d["_id"]])
+
+    def _select(self, query, projection=None, sort=None, skip=0, limit=0):
+        with self._lock:
+            docs = [d for d in self._candidates(query) if matches(d, query)]
+            if sort:
+                docs = _sorted(docs, sort)
+            if skip:
+                docs = docs[skip:]
+            if limit:
+                docs = docs[:abs(limit)]
+            return [_project(d, projection) for d in docs]
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, session=None, **kwargs):
+        cursor = MemoryCursor(self, filter or {}, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter=None, projection=None, sort=None, session=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        docs = self._select(filter or {}, projection, _sort_spec(sort) if sort else None, limit=1)
+        return docs[0] if docs else None
+
+    def count_documents(self, filter, session=None, skip=0, limit=0, **kwargs):
+        with self._lock:
+            n = sum(1 for d in self._candidates(filter) if matches(d, filter))
+        n = max(n - skip, 0)
+        return min(n, limit) if limit else n
+
+    def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    def distinct(self, key, filter=None, session=None, **kwargs):
+        out = []
+        with self._lock:
+            for doc in self._candidates(filter or {}):
+                if not matches(doc, filter or {}):
+                    continue
+                value = _get(doc, key)
+                for v in (value if isinstance(value, list) else [value]):
+                    if v is not _MISSING and v not in out:
+                        out.append(v)
+        return out
+
+    # ---------- writes ----------
+    def _insert(self, doc):
+        doc = _copy(doc)
+        doc.setdefault("_id", ObjectId())
+        if _hashable(doc["_id"]) and doc["_id"] in self._docs:
+            raise errors.DuplicateKeyError(f"E11000 duplicate key error _id: {doc['_id']}", code=11000)
+        self._check_unique(doc)
+        self.exists = True
+        self._docs[doc["_id"]] = doc
+        self._seq[doc["_id"]] = next(self._counter)
+        self._index_all(doc)
+        return doc["_id"]
+
+    def insert_one(self, document, session=None, **kwargs):
+        with self._lock:
+            _id = self._insert(document)
+        # pymongo sets the generated _id on the caller's document too
+        document.setdefault("_id", _id)
+        return _result(inserted_id=_id, inserted_count=1)
+
+    def insert_many(self, documents, ordered=True, session=None, **kwargs):
+        ids = []
+        with self._lock:
+            for document in documents:
+                _id = self._insert(document)
+                document.setdefault("_id", _id)
+                ids.append(_id)
+        return _result(inserted_ids=ids, inserted_count=len(ids))
+
+    def _replace_doc(self, old, new):
+        self._unindex_all(old)
+        try:
+            self._check_unique(new)
+        except errors.DuplicateKeyError:
+            self._index_all(old)
+            raise
+        self._docs[old["_id"]] = new
+        self._index_all(new)
+
+    def _update(self, query, update, upsert, many):
+        matched = modified = 0
+        upserted_id = None
+        with self._lock:
+            targets = [d for d in self._candidates(query) if matches(d, query)]
+            if not many:
+                targets = targets[:1]
+            for doc in targets:
+                new = _copy(doc)
+                _apply_update(new, update)
+                matched += 1
+                if new != doc:
+                    self._replace_doc(doc, new)
+                    modified += 1
+            if not targets and upsert:
+                doc = _seed_from_filter(query)
+                _apply_update(doc, update, inserting=True)
+                upserted_id = self._insert(doc)
+        return _result(
+            matched_count=matched, modified_count=modified,
+            upserted_id=upserted_id, upserted_count=int(upserted_id is not None),
+        )
+
+    def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        return self._update(filter, update, upsert, many=False)
+
+    def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        return self._update(filter, update, upsert, many=True)
+
+    def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        return self._update(filter, replacement, upsert, many=False)
+
+    def find_one_and_update(self, filter, update, projection=None, upsert=False, return_document=False,
+                            sort=None, session=None, **kwargs):
+        with self._lock:
+            before = self.find_one(filter, sort=sort)
+            query = {"_id": before["_id"]} if before else filter
+            result = self._update(query, update, upsert, many=False)
+            doc_id = before["_id"] if before else result.upserted_id
+            after = self._docs.get(doc_id) if doc_id is not None else None
+        chosen = after if return_document else before
+        return _project(chosen, projection) if chosen is not None else None
+
+    def _delete(self, query, many):
+        with self._lock:
+            targets = [d for d in self._candidates(query) if matches(d, query)]
+            if not many:
+                targets = targets[:1]
+            for doc in targets:
+                self._unindex_all(doc)
+                del self._docs[doc["_id"]]
+                del self._seq[doc["_id"]]
+        return _result(deleted_count=len(targets))
+
+    def delete_one(self, filter, session=None, **kwargs):
+        return self._delete(filter, many=False)
+
+    def delete_many(self, filter, session=None, **kwargs):
+        return self._delete(filter, many=True)
+
+    def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        totals = dict.fromkeys(("inserted_count", "matched_count", "modified_count",
+                                "deleted_count", "upserted_count"), 0)
+        upserted_ids = {}
+        for n, op in enumerate(requests):
+            kind = type(op).__name__
+            if kind == "InsertOne":
+                self.insert_one(op._doc)
+                totals["inserted_count"] += 1
+                continue
+            if kind in ("DeleteOne", "DeleteMany"):
+                totals["deleted_count"] += self._delete(op._filter, many=kind == "DeleteMany").deleted_count
+                continue
+            result = self._update(op._filter, op._doc, op._upsert, many=kind == "UpdateMany")
+            totals["matched_count"] += result.matched_count
+            totals["modified_count"] += result.modified_count
+            if result.upserted_id is not None:
+                totals["upserted_count"] += 1
+                upserted_ids[n] = result.upserted_id
+        return _result(**totals, upserted_ids=upserted_ids)
+
+    # ---------- collection management ----------
+    def drop(self, session=None, **kwargs):
+        self.database.drop_collection(self.name)
+
+    def rename(self, new_name, dropTarget=False, session=None, **kwargs):
+        self.database._rename(self.name, new_name, dropTarget)
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._lock = client._lock
+        self._collections = {}
+
+    def __getitem__(self, name):
+        col = self._collections.get(name)
+        if col is None:
+            with self._lock:
+                col = self._collections.setdefault(name, MemoryCollection(self, name))
+        return col
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def create_collection(self, name, **options):
+        col = self[name]
+        with self._lock:
+            if col.exists:
+                raise errors.CollectionInvalid(f"collection {name} already exists")
+            col.exists, col.options = True, options
+        return col
+
+    def list_collection_names(self, **kwargs):
+        return [name for name, col in self._collections.items() if col.exists]
+
+    def drop_collection(self, name, **kwargs):
+        # handles stay usable, as with pymongo: the next write recreates it
+        self[getattr(name, "name", name)]._reset()
+
+    def _rename(self, old, new, drop_target):
+        source, target = self[old], self[new]
+        with self._lock:
+            if not source.exists:
+                raise errors.OperationFailure(f"source namespace {old} does not exist", code=26)
+            if target.exists and not drop_target:
+                raise errors.OperationFailure(f"target namespace {new} exists", code=48)
+            for attr in ("_docs", "_seq", "_counter", "_indexes", "options", "exists"):
+                setattr(target, attr, getattr(source, attr))
+            source._reset()
+
+    def command(self, command, *args, session=None, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ("ping", "hello", "isMaster", "ismaster"):
+            return {"ok": 1.0}
+        raise errors.OperationFailure(f"command {name} is not supported by the in-memory engine", code=59)
+
+    def watch(self, *args, **kwargs):
+        raise errors.OperationFailure(
+            "The $changeStream stage is only supported on replica sets", code=40573
+        )
+
+class MemoryClient:
+    """Drop-in for MongoClient backed by process memory (see module docstring)."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        self._databases = {}
+        self.address = ("memory", next(self._ids))
+        self.primary = self.address
+        self.secondaries = set()
+
+    def __getitem__(self, name):
+        db = self._databases.get(name)
+        if db is None:
+            with self._lock:
+                db = self._databases.setdefault(name, MemoryDatabase(self, name))
+        return db
+
+    def get_database(self, name, **kwargs):
+        return self[name]
+
+    def drop_database(self, name):
+        with self._lock:
+            self._databases.pop(getattr(name, "name", name), None)
+
+    def start_session(self, **kwargs):
+        raise errors.OperationFailure(
+            "Transaction numbers are only allowed on a replica set member or mongos", code=20
+        )
+
+    def close(self):
+        pass
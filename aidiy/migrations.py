@@ -0,0 +1,264 @@
+# backend/aidiy/migrations.py
+"""
+One-off data migrations, exposed as Flask CLI commands:
+
+    flask --app app migrate-ledger
+    flask --app app migrate-schema [--only goals] [--restart]
+    flask --app app migrate-family
+"""
+from datetime import datetime, timezone
+
+import click
+
+from aidiy.extensions import get_db
+from aidiy.family import new_family_id
+from aidiy.schema import CHORE_SCHEMA_VERSION, GOAL_SCHEMA_VERSION, chore_fixups, goal_fixups
+
+STATE_COLLECTION = "migrations"
+CHORE_MIGRATION = "chores_v1"
+
+def migrate_progress_history(db, batch_size=500):
+    """
+    Move every goal's embedded ``progress_history`` array into the ``ledger``
+    collection and drop the array from the goal.
+
+    Safe to re-run: ledger rows are upserted on (goal_id, date, amount), so a
+    run that died between the insert and the $unset just redoes the no-op.
+    """
+    from pymongo import UpdateOne
+
+    goals = db["goals"]
+    ledger = db["ledger"]
+    moved_goals = moved_entries = 0
+
+    cursor = goals.find(
+        {"progress_history": {"$exists": True}},
+        {"progress_history": 1, "kid_username": 1, "parent_email": 1, "family_id": 1},
+        batch_size=batch_size,
+    )
+    for goal in cursor:
+        goal_id = str(goal["_id"])
+        ops = [
+            UpdateOne(
+                {"goal_id": goal_id, "date": h.get("date"), "amount": h.get("amount", 0)},
+                {"$setOnInsert": ledger_entry(goal, h)},
+                upsert=True,
+            )
+            for h in goal.get("progress_history") or []
+        ]
+        if ops:
+            ledger.bulk_write(ops, ordered=False)
+        goals.update_one({"_id": goal["_id"]}, {"$unset": {"progress_history": ""}})
+        moved_goals += 1
+        moved_entries += len(ops)
+        if moved_goals % batch_size == 0:
+            click.echo(f"{moved_goals} goals / {moved_entries} entries so far")
+
+    return moved_goals, moved_entries
+
+def ledger_entry(goal, h, entry_type="approval"):
+    """
+    Build a ledger row from a goal and a progress_history-shaped dict.
+    Approvals move savings; "decline" rows only record what was turned
+    down, for the rollups.
+    """
+    return {
+        "type": entry_type,
+        "goal_id": str(goal["_id"]),
+        "kid_username": goal.get("kid_username"),
+        "parent_email": goal.get("parent_email"),
+        "family_id": goal.get("family_id"),
+        "date": h.get("date"),
+        "amount": h.get("amount", 0),
+        "approved_by": h.get("approved_by"),
+        "chore_ids": h.get("chore_ids", []),
+    }
+
+# ────────────── Batched document migrations ─────────
+class Migration:
+    """
+    Rewrites every document in ``collection`` matching ``query`` with the
+    ``$set`` returned by ``fixups(doc)``. The query must exclude documents
+    that are already migrated, which makes every step idempotent; it is
+    repeated in each update so a document a route changed in the meantime
+    isn't overwritten.
+
+    ``resume=False`` makes every run start from the first matching
+    document instead of after the saved ``_id``. Use it when documents
+    can stay matched after a run, so they are tried again.
+    """
+
+    def __init__(self, name, collection, query, fixups, projection=None, resume=True):
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.fixups = fixups
+        self.projection = projection
+        self.resume = resume
+
+MIGRATIONS = [
+    Migration(
+        "goals_v1", "goals",
+        {"schema_version": {"$not": {"$gte": GOAL_SCHEMA_VERSION}}},
+        goal_fixups,
+        {"saved": 1, "currentAmount": 1, "progress": 1, "amount": 1},
+    ),
+    Migration(
+        CHORE_MIGRATION, "chores",
+        {"schema_version": {"$not": {"$gte": CHORE_SCHEMA_VERSION}}},
+        chore_fixups,
+        {"status": 1, "dueDate": 1},
+    ),
+]
+
+def run_migration(db, migration, batch_size=500, restart=False, report=click.echo):
+    """
+    Walk the collection in ``_id`` order, one batch per bulk_write. The last
+    ``_id`` of each finished batch is saved in the ``migrations`` collection,
+    so an interrupted run resumes where it stopped (``restart`` rescans, as
+    does every run of a migration with ``resume=False``).
+    Returns (scanned, modified).
+    """
+    from pymongo import UpdateOne
+
+    states = db[STATE_COLLECTION]
+    col = db[migration.collection]
+    state = {} if restart or not migration.resume else (states.find_one({"_id": migration.name}) or {})
+    last_id = state.get("last_id")
+    scanned, modified = state.get("scanned", 0), state.get("modified", 0)
+    remaining = col.count_documents(migration.query)
+    report(f"{migration.name}: {remaining} documents to migrate"
+           + (f" (resuming after {last_id})" if last_id is not None else ""))
+
+    while True:
+        q = dict(migration.query)
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        batch = list(col.find(q, migration.projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        ops = [
+            UpdateOne({**migration.query, "_id": doc["_id"]}, {"$set": migration.fixups(doc)})
+            for doc in batch
+        ]
+        result = col.bulk_write(ops, ordered=False)
+        last_id = batch[-1]["_id"]
+        scanned += len(batch)
+        modified += result.modified_count
+        states.update_one(
+            {"_id": migration.name},
+            {"$set": {
+                "last_id": last_id, "scanned": scanned, "modified": modified,
+                "done": False, "updated_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+        report(f"{migration.name}: {scanned} scanned / {modified} updated")
+
+    states.update_one(
+        {"_id": migration.name},
+        {"$set": {"done": True, "scanned": scanned, "modified": modified,
+                  "updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return scanned, modified
+
+# ────────────── Family ids ──────────────────────────
+class FamilyResolver:
+    """
+    E-mail / kid username → family_id for the family migrations, memoised.
+    Unknown owners resolve to None (and aren't memoised, since a later step
+    may still stamp them).
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._parents = {}
+        self._kids = {}
+
+    def parent(self, email):
+        if email and email not in self._parents:
+            doc = self.db["users"].find_one({"email": email}, {"family_id": 1}) or {}
+            if doc.get("family_id"):
+                self._parents[email] = doc["family_id"]
+        return self._parents.get(email)
+
+    def kid(self, username):
+        if username and username not in self._kids:
+            child = self.db["children"].find_one({"username": username}, {"family_id": 1, "parent_email": 1}) or {}
+            family_id = child.get("family_id") or self.parent(child.get("parent_email"))
+            if family_id:
+                self._kids[username] = family_id
+        return self._kids.get(username)
+
+    def email(self, email):
+        if email and email.endswith("@kids.aidiy"):
+            return self.kid(email.split("@")[0])
+        return self.parent(email)
+
+def family_migrations(db):
+    """
+    One step per family-owned collection. Parents are stamped first, and
+    everything else inherits the owning parent's id. Documents whose owner
+    can't be found keep ``family_id: None``. These steps don't resume from
+    the saved ``_id``: each run requeries every unstamped document, so the
+    ones skipped last time are retried.
+    """
+    resolve = FamilyResolver(db)
+    # also matches null: rows written from a not yet stamped goal carry None
+    unstamped = {"family_id": None}
+
+    def user_family(doc):
+        email = doc.get("email") or ""
+        return resolve.email(email) if email.endswith("@kids.aidiy") else new_family_id()
+
+    def step(name, collection, owner, projection):
+        return Migration(name, collection, unstamped, lambda doc: {"family_id": owner(doc)}, projection,
+                         resume=False)
+
+    return [
+        step("family_users", "users", user_family, {"email": 1}),
+        step("family_children", "children", lambda d: resolve.parent(d.get("parent_email")), {"parent_email": 1}),
+        step("family_goals", "goals",
+             lambda d: resolve.parent(d.get("parent_email")) or resolve.kid(d.get("kid_username")),
+             {"parent_email": 1, "kid_username": 1}),
+        step("family_chores", "chores", lambda d: resolve.parent(d.get("parent_email")), {"parent_email": 1}),
+        step("family_ledger", "ledger",
+             lambda d: resolve.parent(d.get("parent_email")) or resolve.kid(d.get("kid_username")),
+             {"parent_email": 1, "kid_username": 1}),
+        step("family_notifications", "notifications",
+             lambda d: resolve.email(d.get("recipient_email")), {"recipient_email": 1}),
+        step("family_chat_sessions", "chat_sessions",
+             lambda d: resolve.email(d.get("user_email")), {"user_email": 1}),
+    ]
+
+@click.command("migrate-ledger")
+@click.option("--batch-size", default=500, show_default=True)
+def migrate_ledger_command(batch_size):
+    """Move goals.progress_history arrays into the ledger collection."""
+    goals, entries = migrate_progress_history(get_db(), batch_size=batch_size)
+    click.echo(f"Moved {entries} history entries from {goals} goals into the ledger")
+
+@click.command("migrate-schema")
+@click.option("--only", type=click.Choice([m.collection for m in MIGRATIONS]), default=None)
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--restart", is_flag=True, help="Ignore saved progress and rescan from the start.")
+def migrate_schema_command(only, batch_size, restart):
+    """Normalise goals (saved/progress) and chores (status/due_at) in batches."""
+    db = get_db()
+    for migration in MIGRATIONS:
+        if only and migration.collection != only:
+            continue
+        scanned, modified = run_migration(db, migration, batch_size=batch_size, restart=restart)
+        click.echo(f"{migration.name}: done, {modified} of {scanned} scanned documents updated")
+
+@click.command("migrate-family")
+@click.option("--batch-size", default=500, show_default=True)
+def migrate_family_command(batch_size):
+    """Stamp family_id on every family-owned document (parents first); re-run to retry unresolved ones."""
+    db = get_db()
+    for migration in family_migrations(db):
+        scanned, modified = run_migration(db, migration, batch_size=batch_size)
+        click.echo(f"{migration.name}: done, {modified} of {scanned} scanned documents updated")
+
+COMMANDS = [migrate_ledger_command, migrate_schema_command, migrate_family_command]
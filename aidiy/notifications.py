@@ -0,0 +1,335 @@
+# backend/aidiy/notifications.py
+"""
+Notifications: typed templates, per-request batching, an outbox, retention.
+
+Routes queue notifications with ``notify(TEMPLATE, recipient, family_id, **fields)``
+and write them with ``commit_with_notifications(fn)``: ``fn(session)``
+makes the domain change and the whole batch goes out in one insert_many
+into ``notifications`` plus one into ``notification_outbox``, all in the
+same transaction when the deployment supports them. Push / e-mail /
+stream consumers read the outbox (``pending_outbox`` / ``mark_dispatched``)
+instead of hooking into each route.
+
+The hot ``notifications`` collection is kept small three ways:
+
+* read notifications get an ``expires_at`` NOTIFICATION_READ_TTL_DAYS out,
+  which the TTL index acts on;
+* each recipient keeps at most NOTIFICATION_CAP rows; older ones, and any
+  row past NOTIFICATION_ARCHIVE_DAYS, are moved to ``notifications_archive``
+  (itself TTL'd after NOTIFICATION_ARCHIVE_TTL_DAYS);
+* compaction runs in the background after roughly one insert in
+  NOTIFICATION_COMPACT_EVERY, and for everyone via ``flask compact-notifications``.
+
+Pending progress submissions are acted on through their notification, so
+ACTIONABLE_TYPES never expire and are never archived.
+
+Notification lists are ETagged from the family's change version
+(aidiy/family.py), so every path here that changes them bumps it:
+- the batch commit;
+- compaction.
+
+TTL deletes can't bump, so read notifications expire at a UTC midnight.
+Reads hide anything expired since the last midnight
+(``unexpired``), and the ETag includes the UTC date. The output therefore
+only changes when the date does, not whenever the TTL monitor runs.
+"""
+import os
+import random
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import click
+
+from aidiy.extensions import get_db, get_query_pool, run_transaction
+from aidiy.family import bump_version, family_scope
+from aidiy.log import get_logger
+
+log = get_logger("notifications")
+
+COLLECTION = "notifications"
+ARCHIVE_COLLECTION = "notifications_archive"
+OUTBOX_COLLECTION = "notification_outbox"
+OUTBOX_RETENTION_DAYS = int(os.getenv("NOTIFICATION_OUTBOX_RETENTION_DAYS", 7))
+ACTIONABLE_TYPES = ["progress_submission"]
+
+READ_TTL_DAYS = int(os.getenv("NOTIFICATION_READ_TTL_DAYS", 30))
+ARCHIVE_DAYS = int(os.getenv("NOTIFICATION_ARCHIVE_DAYS", 90))
+ARCHIVE_TTL_DAYS = int(os.getenv("NOTIFICATION_ARCHIVE_TTL_DAYS", 365))
+CAP = int(os.getenv("NOTIFICATION_CAP", 200))
+COMPACT_EVERY = int(os.getenv("NOTIFICATION_COMPACT_EVERY", 20))
+COMPACT_BATCH = 500
+
+_stats_lock = threading.Lock()
+_stats = {"created": 0, "batches": 0, "compactions": 0, "archived": 0, "compaction_errors": 0}
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+# ────────────── Templates ───────────────────────────
+@dataclass(frozen=True)
+class Template:
+    """
+    One notification type. ``title`` / ``message`` are str.format patterns
+    over the fields passed to notify(); ``fields`` are copied onto the
+    stored document and must all be given.
+    """
+    type: str
+    title: str
+    message: str
+    fields: tuple = ()
+    status: str = "success"
+
+    def render(self, recipient_email, family_id, now, **ctx):
+        missing = [f for f in self.fields if f not in ctx]
+        if missing:
+            raise ValueError(f"{self.type} notification is missing {', '.join(missing)}")
+        return {
+            "type": self.type,
+            "title": self.title.format(**ctx),
+            "message": self.message.format(**ctx),
+            **{f: ctx[f] for f in self.fields},
+            "status": self.status,
+            "read": False,
+            "created_at": now,
+            "recipient_email": recipient_email,
+            "family_id": family_id,
+        }
+
+GOAL_APPROVAL_REQUEST = Template(
+    "goal_approval_request",
+    "{kid_name} wants to save ${amount:.2f}",
+    "for {goal_title}",
+    ("goal_id", "kid_username", "kid_avatar"),
+    status="pending",
+)
+PROGRESS_SUBMISSION = Template(
+    "progress_submission",
+    "{kid_name} completed chores!",
+    "Your child completed {chore_count} chore(s) and earned ${earned_amount:.2f}",
+    ("kid_name", "kid_avatar", "goal_id", "earned_amount", "completed_chore_ids", "completed_chores"),
+    status="pending",
+)
+PROGRESS_APPROVED = Template(
+    "progress_approved",
+    "Progress Approved! 🎉",
+    "Your parents approved your progress! ${earned_amount:.2f} has been added to your savings.",
+    ("goal_id", "earned_amount", "archived_chores_count", "can_select_new_chores"),
+)
+PROGRESS_DECLINED = Template(
+    "progress_declined",
+    "Try Again! 💪",
+    "Your parents want you to redo {chore_count} chore(s). They're ready for another try!",
+    ("goal_id", "goal_title", "reassigned_chore_ids", "reassigned_chores", "declined_amount"),
+    status="declined",
+)
+GOAL_COMPLETED_PARENT = Template(
+    "goal_completed",
+    "{kid_name} completed their goal! 🎉",
+    "Your child has successfully saved ${goal_amount:.2f} for {goal_title}",
+    ("goal_id", "kid_name", "kid_avatar", "goal_title", "goal_amount"),
+)
+GOAL_COMPLETED_KID = Template(
+    "goal_completed",
+    "🎊 GOAL ACHIEVED! 🎊",
+    "Congratulations! You've saved ${goal_amount:.2f} for {goal_title}!",
+    ("goal_id", "goal_title", "goal_amount"),
+)
+
+# ────────────── Per-request batch + outbox ──────────
+def _batch():
+    from flask import g
+
+    if "notification_batch" not in g:
+        g.notification_batch = []
+    return g.notification_batch
+
+def notify(template, recipient_email, family_id, **ctx):
+    """Queue a notification for this request; rendered now, written on commit."""
+    _batch().append(template.render(recipient_email, family_id, datetime.utcnow(), **ctx))
+
+def _flush(session):
+    from bson import ObjectId
+
+    docs = _batch()
+    if not docs:
+        return []
+    for doc in docs:
+        doc["_id"] = ObjectId()
+    db = get_db()
+    db[COLLECTION].insert_many(docs, ordered=True, session=session)
+    db[OUTBOX_COLLECTION].insert_many(
+        [
+            {
+                "_id": doc["_id"],
+                "type": doc["type"],
+                "recipient_email": doc["recipient_email"],
+                "family_id": doc["family_id"],
+                "created_at": doc["created_at"],
+                "notification": doc,
+                "dispatched": False,
+            }
+            for doc in docs
+        ],
+        ordered=True,
+        session=session,
+    )
+    return list(docs)
+
+def commit_with_notifications(fn):
+    """
+    Run ``fn(session)`` and write the notifications it queued with notify()
+    in the same transaction (see extensions.run_transaction). Returns
+    ``fn``'s result. ``fn`` may be retried, so it must queue its
+    notifications itself rather than rely on ones queued earlier.
+    """
+    written = []
+
+    def attempt(session):
+        _batch().clear()
+        written.clear()
+        result = fn(session)
+        written.extend(_flush(session))
+        return result
+
+    try:
+        result = run_transaction(attempt)
+    finally:
+        _batch().clear()
+    if written:
+        _count("created", len(written))
+        _count("batches")
+        # after the commit, so a read can't pair the new version with old data
+        for family_id in {doc["family_id"] for doc in written}:
+            bump_version(family_id)
+        for recipient, family_id in {(doc["recipient_email"], doc["family_id"]) for doc in written}:
+            maybe_compact(recipient, family_id)
+    return result
+
+def pending_outbox(limit=100):
+    """Oldest undispatched outbox entries, for push / e-mail / stream consumers."""
+    return list(
+        get_db()[OUTBOX_COLLECTION]
+        .find({"dispatched": False})
+        .sort("created_at", 1)
+        .limit(limit)
+    )
+
+def mark_dispatched(ids):
+    """Consumers call this once delivered; the entries expire after OUTBOX_RETENTION_DAYS."""
+    now = datetime.utcnow()
+    return get_db()[OUTBOX_COLLECTION].update_many(
+        {"_id": {"$in": list(ids)}},
+        {"$set": {
+            "dispatched": True,
+            "dispatched_at": now,
+            "expires_at": now + timedelta(days=OUTBOX_RETENTION_DAYS),
+        }},
+    ).modified_count
+
+# ────────────── Read state ──────────────────────────
+def _midnight(when):
+    return datetime(when.year, when.month, when.day)
+
+def unexpired(query, now=None):
+    """``query`` minus notifications that expired by the last UTC midnight (the TTL monitor may lag)."""
+    return {**query, "expires_at": {"$not": {"$lte": _midnight(now or datetime.utcnow())}}}
+
+def mark_read(query):
+    """
+    Mark the notifications matching ``query`` read. Returns the number of
+    notifications that changed. Only non-actionable ones get an expiry, at
+    the UTC midnight after READ_TTL_DAYS.
+    """
+    col = get_db()[COLLECTION]
+    unread = {**query, "read": {"$ne": True}}
+    now = datetime.utcnow()
+    expires_at = _midnight(now + timedelta(days=READ_TTL_DAYS + 1))
+    done = col.update_many(
+        {**unread, "type": {"$nin": ACTIONABLE_TYPES}},
+        {"$set": {"read": True, "read_at": now, "expires_at": expires_at}},
+    ).modified_count
+    done += col.update_many(
+        {**unread, "type": {"$in": ACTIONABLE_TYPES}},
+        {"$set": {"read": True, "read_at": now}},
+    ).modified_count
+    return done
+
+# ────────────── Compaction ──────────────────────────
+def compact_recipient(db, recipient_email, now=None, family_id=None):
+    """Move ``recipient_email``'s over-cap and aged rows to the archive."""
+    from pymongo import ReplaceOne
+
+    hot, archive = db[COLLECTION], db[ARCHIVE_COLLECTION]
+    now = now or datetime.utcnow()
+    archived = {"archived_at": now, "expires_at": now + timedelta(days=ARCHIVE_TTL_DAYS)}
+    movable = family_scope({"recipient_email": recipient_email, "type": {"$nin": ACTIONABLE_TYPES}}, family_id)
+    moved = 0
+    families = set()
+
+    def move(docs):
+        if not docs:
+            return 0
+        families.update(d.get("family_id") for d in docs)
+        # upsert by _id so a retry after a crash between the two steps is harmless
+        archive.bulk_write(
+            [ReplaceOne({"_id": d["_id"]}, {**d, **archived}, upsert=True) for d in docs],
+            ordered=False,
+        )
+        hot.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        return len(docs)
+
+    while True:
+        aged = list(hot.find({**movable, "created_at": {"$lt": now - timedelta(days=ARCHIVE_DAYS)}})
+                    .limit(COMPACT_BATCH))
+        if not move(aged):
+            break
+        moved += len(aged)
+    while True:
+        over = list(hot.find(movable).sort("created_at", -1).skip(CAP).limit(COMPACT_BATCH))
+        if not move(over):
+            break
+        moved += len(over)
+
+    for family in families:
+        bump_version(family)
+    _count("compactions")
+    _count("archived", moved)
+    return moved
+
+def _compact_quietly(recipient_email, family_id):
+    try:
+        compact_recipient(get_db(), recipient_email, family_id=family_id)
+    except Exception as e:
+        _count("compaction_errors")
+        log.warning("Notification compaction failed: %s", e, extra={"recipient": recipient_email})
+
+def maybe_compact(recipient_email, family_id=None):
+    """Call after inserting for ``recipient_email``; compacts ~1 in COMPACT_EVERY times, off-thread."""
+    if recipient_email and COMPACT_EVERY > 0 and random.random() < 1 / COMPACT_EVERY:
+        get_query_pool().submit(_compact_quietly, recipient_email, family_id)
+
+def compact_all(db):
+    total = recipients = 0
+    for email in db[COLLECTION].distinct("recipient_email"):
+        total += compact_recipient(db, email)
+        recipients += 1
+    return recipients, total
+
+def notification_stats():
+    with _stats_lock:
+        return {
+            **_stats,
+            "cap": CAP,
+            "read_ttl_days": READ_TTL_DAYS,
+            "archive_after_days": ARCHIVE_DAYS,
+        }
+
+@click.command("compact-notifications")
+def compact_notifications_command():
+    """Archive over-cap and aged notifications for every recipient."""
+    recipients, moved = compact_all(get_db())
+    click.echo(f"Archived {moved} notifications across {recipients} recipients")
+
+COMMANDS = [compact_notifications_command]
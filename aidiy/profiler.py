@@ -0,0 +1,126 @@
+# backend/aidiy/profiler.py
+"""
+On-demand sampling profiler for single requests.
+
+A profiled request gets a sampler thread that reads the request thread's
+stack from ``sys._current_frames()`` every PROFILE_INTERVAL_MS; the request
+thread itself runs uninstrumented. The result is written in collapsed-stack
+format ("a;b;c 42" per line - feed it to flamegraph.pl or speedscope) to a
+ring of at most PROFILE_KEEP files in PROFILE_DIR.
+
+Nothing here runs unless profiling is enabled (see app.py): with
+PROFILE_ROUTES and ADMIN_TOKEN unset the request hooks aren't installed.
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "aidiy-profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+INTERVAL_S = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+# endpoint names ("approve_progress_submission,get_children_progress") or "*"
+PROFILE_ROUTES = {r.strip() for r in os.getenv("PROFILE_ROUTES", "").split(",") if r.strip()}
+MAX_DEPTH = 128
+
+_NAME_RE = re.compile(r"^[0-9]+_[A-Za-z0-9_.-]+\.folded$")
+_prune_lock = threading.Lock()
+
+def route_profiled(endpoint):
+    return "*" in PROFILE_ROUTES or (endpoint or "").rsplit(".", 1)[-1] in PROFILE_ROUTES
+
+def _frame_label(code):
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    where = "/".join(path[-2:])
+    # ';' separates frames in collapsed stacks (the count follows the last space)
+    return f"{code.co_name} ({where}:{code.co_firstlineno})".replace(";", ":")
+
+class Sampler:
+    """Samples one thread's stack until stop(); ``stacks`` maps stack → count."""
+
+    def __init__(self, thread_id=None, interval_s=INTERVAL_S):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._started = 0.0
+        self.elapsed_ms = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed_ms = (time.perf_counter() - self._started) * 1000
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            labels = []
+            while frame is not None and len(labels) < MAX_DEPTH:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+def save_profile(sampler, endpoint, request_id):
+    """Write the collapsed stacks to the ring; returns the profile name."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9_.-]", "-", f"{endpoint or 'unknown'}_{request_id}")
+    name = f"{int(time.time() * 1000)}_{slug}.folded"
+    lines = (f"{stack} {count}\n" for stack, count in sampler.stacks.most_common())
+    tmp = os.path.join(PROFILE_DIR, f".{name}.tmp")
+    with open(tmp, "w") as fh:
+        fh.writelines(lines)
+    os.replace(tmp, os.path.join(PROFILE_DIR, name))
+    _prune()
+    return name
+
+def _prune():
+    with _prune_lock:
+        names = sorted(n for n in os.listdir(PROFILE_DIR) if _NAME_RE.match(n))
+        for old in names[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else names:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old))
+            except FileNotFoundError:
+                pass  # another worker got there first
+
+def list_profiles():
+    """Newest first: [{name, created, bytes}]."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not _NAME_RE.match(name):
+            continue
+        try:
+            size = os.path.getsize(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            continue
+        out.append({
+            "name": name,
+            "created": time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(int(name.split("_", 1)[0]) / 1000)
+            ),
+            "bytes": size,
+        })
+    return out
+
+def profile_path(name):
+    """Path of a stored profile, or None (also for anything not in the ring)."""
+    if not _NAME_RE.match(name or ""):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,228 @@
+# backend/aidiy/reads.py
+"""
+Read-preference routing for tolerant reads, with causal consistency.
+
+Routes that can live with slightly old data (dashboards, lists) read
+through TolerantCollection inside ``read_session(floor)``. With
+MONGO_READ_PREFERENCE=primary (the default) that is exactly the old
+behaviour. With e.g. secondaryPreferred those reads may go to a secondary
+at most MONGO_MAX_STALENESS_S behind, in a causally consistent session
+that starts at ``floor``: the secondary waits until it has applied
+everything up to that point before answering.
+
+A floor is the primary's operation time just after a write. After every
+successful write request the app records one per family
+(``record_write``). It keeps the newest one in a small per-process map and
+also hands it to the client as a signed X-Causal-Token, so a
+read-after-write lands correctly even on another worker. Routes with an
+ETag read the family version from the primary anyway, and that read's
+operation time becomes the floor too, so a 304 never pins older data.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+import click
+
+from aidiy.extensions import DB_NAME, get_db, get_mongo_client, in_memory
+from aidiy.log import get_logger
+
+log = get_logger("mongo")
+
+READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# MongoDB rejects values below 90 seconds
+MAX_STALENESS_S = max(int(os.getenv("MONGO_MAX_STALENESS_S", 90)), 90)
+FLOOR_CACHE_SIZE = int(os.getenv("CAUSAL_FLOOR_CACHE_SIZE", 10000))
+
+_MODES = {
+    "primaryPreferred": "PrimaryPreferred",
+    "secondary": "Secondary",
+    "secondaryPreferred": "SecondaryPreferred",
+    "nearest": "Nearest",
+}
+
+Floor = namedtuple("Floor", "operation_time cluster_time")
+
+_lock = threading.Lock()
+_floors = OrderedDict()
+_collections = {}
+_stats = {
+    "sessions": 0, "writes_recorded": 0, "record_errors": 0,
+    "floors_from_map": 0, "floors_from_token": 0, "tokens_rejected": 0,
+}
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+def routing_enabled():
+    # the in-memory engine has no secondaries (or sessions)
+    return READ_PREFERENCE in _MODES and not in_memory()
+
+def read_preference():
+    from pymongo import read_preferences
+
+    return getattr(read_preferences, _MODES[READ_PREFERENCE])(max_staleness=MAX_STALENESS_S)
+
+def tolerant(name):
+    """Collection ``name`` with the tolerant read preference (plain collection when routing is off)."""
+    if not routing_enabled():
+        return get_db()[name]
+    col = _collections.get(name)
+    if col is None:
+        col = _collections[name] = get_db()[name].with_options(read_preference=read_preference())
+    return col
+
+class TolerantCollection:
+    """LazyCollection for reads that may be served by a secondary."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(tolerant(self.name), attr)
+
+    def __repr__(self):
+        return f"TolerantCollection({self.name!r})"
+
+# ────────────── Causal floors ───────────────────────
+def latest(*floors):
+    floors = [f for f in floors if f is not None]
+    return max(floors, key=lambda f: f.operation_time) if floors else None
+
+def session_floor(session):
+    if session is None or session.operation_time is None:
+        return None
+    return Floor(session.operation_time, session.cluster_time)
+
+@contextmanager
+def read_session(floor=None):
+    """
+    Causally consistent session that starts at ``floor``; pass it as
+    ``session=`` to every read of the request. Yields None when routing is
+    off. Sessions aren't thread-safe: give each pool thread its own.
+    """
+    if not routing_enabled():
+        yield None
+        return
+    with get_mongo_client().start_session(causal_consistency=True) as session:
+        if floor is not None:
+            if floor.cluster_time:
+                session.advance_cluster_time(floor.cluster_time)
+            session.advance_operation_time(floor.operation_time)
+        _count("sessions")
+        yield session
+
+def remember(key, floor):
+    if not key or floor is None:
+        return
+    with _lock:
+        known = _floors.get(key)
+        if known is None or floor.operation_time > known.operation_time:
+            _floors[key] = floor
+        _floors.move_to_end(key)
+        while len(_floors) > FLOOR_CACHE_SIZE:
+            _floors.popitem(last=False)
+
+def known_floor(key):
+    with _lock:
+        floor = _floors.get(key)
+    if floor is not None:
+        _count("floors_from_map")
+    return floor
+
+def record_write(key):
+    """
+    Call after ``key`` (a family) has written: asks the primary for its
+    current operation time, which covers every write it has acknowledged.
+    Returns the floor, or None if that fails (reads may then be stale).
+    """
+    if not routing_enabled():
+        return None
+    try:
+        client = get_mongo_client()
+        with client.start_session(causal_consistency=True) as session:
+            client[DB_NAME].command("ping", session=session)
+            floor = session_floor(session)
+    except Exception as e:
+        _count("record_errors")
+        log.warning("Could not record write floor: %s", e)
+        return None
+    remember(key, floor)
+    _count("writes_recorded")
+    return floor
+
+# ────────────── X-Causal-Token ──────────────────────
+def _sign(payload, secret):
+    return hmac.new(secret.encode(), payload, hashlib.sha256).digest()[:16]
+
+def encode_token(floor, secret):
+    import bson
+
+    payload = bson.encode({"t": floor.operation_time, "c": floor.cluster_time})
+    raw = payload + _sign(payload, secret)
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_token(token, secret):
+    """The floor in a token from encode_token(), or None if absent / tampered."""
+    if not token:
+        return None
+    import bson
+
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload, sig = raw[:-16], raw[-16:]
+        if not hmac.compare_digest(sig, _sign(payload, secret)):
+            raise ValueError("bad signature")
+        doc = bson.decode(payload)
+        floor = Floor(doc["t"], doc.get("c"))
+    except Exception:
+        _count("tokens_rejected")
+        return None
+    _count("floors_from_token")
+    return floor
+
+def read_routing_stats():
+    with _lock:
+        return {
+            **_stats,
+            "read_preference": READ_PREFERENCE,
+            "max_staleness_s": MAX_STALENESS_S if routing_enabled() else None,
+            "floors_cached": len(_floors),
+        }
+
+# ────────────── Replica-set check ───────────────────
+@click.command("check-read-routing")
+@click.option("--samples", default=20, show_default=True)
+@click.option("--without-floor", is_flag=True, help="Read back without the causal floor, to see stale reads.")
+def check_read_routing_command(samples, without_floor):
+    """Write probes on the primary and read each one straight back through the tolerant path."""
+    client, db = get_mongo_client(), get_db()
+    click.echo(f"read preference: {READ_PREFERENCE}, primary: {client.primary}, "
+               f"secondaries: {sorted(client.secondaries)}")
+    if not routing_enabled():
+        click.echo("Routing is off: set MONGO_READ_PREFERENCE (e.g. secondaryPreferred) to test it")
+        return
+    probes = db["read_routing_probes"]
+    missed, waits = 0, []
+    try:
+        for n in range(samples):
+            probe_id = probes.insert_one({"n": n}).inserted_id
+            floor = None if without_floor else record_write("read-routing-check")
+            started = time.perf_counter()
+            with read_session(floor) as session:
+                found = tolerant("read_routing_probes").find_one({"_id": probe_id}, session=session)
+            waits.append((time.perf_counter() - started) * 1000)
+            missed += found is None
+    finally:
+        probes.drop()
+    waits.sort()
+    click.echo(f"{samples} read-after-write probes, {missed} missed; read latency "
+               f"p50 {waits[len(waits) // 2]:.1f} ms, max {waits[-1]:.1f} ms")
+
+COMMANDS = [check_read_routing_command]
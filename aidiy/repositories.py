@@ -0,0 +1,476 @@
+# backend/aidiy/repositories.py
+"""
+Repositories: one object per aggregate, called by the routes instead of
+the collections.
+
+Each method is one query shape, and so one index in extensions.INDEXES.
+The rules every method follows:
+* it takes the caller's ``family_id`` and applies family_scope itself
+  (None leaves the query unscoped, as the pre-auth lookups need);
+* it accepts ``session=`` where a route runs it in a transaction or in a
+  causal read session;
+* given a read session (aidiy/reads.py) it reads through the tolerant
+  collection, otherwise from the primary;
+* every write that changes what the family sees bumps the family's change
+  version (aidiy/family.py), which the ETagged reads are derived from.
+
+Caching and batching belong here too. Child lookups are cached in the
+Children repository, and multi-chore transitions are one update_many
+instead of one round trip per chore.
+
+The repositories only use the collection interface, so they run
+unchanged on MongoDB and on the in-memory engine (STORAGE_ENGINE=memory,
+aidiy/memory.py).
+"""
+import os
+import time
+from datetime import datetime
+
+from aidiy.cache import TTLCache, ensure_invalidation_listener, publish_invalidation
+from aidiy.extensions import LazyCollection
+from aidiy.family import bump_version, family_scope, new_family_id
+from aidiy.invalidation import bus
+from aidiy.notifications import mark_read, unexpired
+from aidiy.migrations import CHORE_MIGRATION, STATE_COLLECTION
+from aidiy.reads import TolerantCollection
+from aidiy.schema import CHORE_SCHEMA_VERSION, GOAL_SCHEMA_VERSION, chore_fixups, goal_fixups, status_spellings
+
+# Goal history lives in the ledger; keep stale embedded arrays
+# (pre-migration documents) out of every goal read
+GOAL_PROJECTION = {"progress_history": 0}
+
+# how often status queries look again whether migrate-schema has finished the chores
+LEGACY_STATUS_RECHECK_S = 60
+
+CHILD_CACHE_SIZE = int(os.getenv("CHILD_CACHE_SIZE", 2048))
+CHILD_CACHE_TTL_S = int(os.getenv("CHILD_CACHE_TTL_S", 300))
+
+def object_id(value):
+    """``value`` as an ObjectId; raises bson.errors.InvalidId for malformed ids."""
+    from bson import ObjectId
+
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+def _statement_query(parent_email, family_id, kid=None, field=None, start=None, end=None):
+    q = family_scope({"parent_email": parent_email}, family_id)
+    if kid:
+        q["kid_username"] = kid
+    if field and (start or end):
+        q[field] = {**({"$gte": start} if start else {}), **({"$lt": end} if end else {})}
+    return q
+
+# decline rows are for the rollups; history and statements show savings movements
+_SAVINGS = {"type": {"$ne": "decline"}}
+
+class _Repository:
+    def __init__(self, name):
+        self.col = LazyCollection(name)
+        self.tolerant = TolerantCollection(name)
+
+    def _reader(self, session):
+        # a read session only exists when routing is on (reads.read_session)
+        return self.col if session is None else self.tolerant
+
+# ────────────── Users ───────────────────────────────
+class Users(_Repository):
+    def __init__(self):
+        super().__init__("users")
+
+    def get(self, email, family_id=None, projection=None):
+        return self.col.find_one(family_scope({"email": email}, family_id), projection)
+
+    def add(self, user):
+        self.col.insert_one(user)
+        bump_version(user.get("family_id"))
+        return user
+
+    def update(self, email, fields, family_id=None):
+        """True if the user was found."""
+        # returns the family, so the pre-auth callers (no family_id yet) still bump it
+        user = self.col.find_one_and_update(
+            family_scope({"email": email}, family_id), {"$set": fields}, projection={"family_id": 1}
+        )
+        if user is None:
+            return False
+        bump_version(user.get("family_id"))
+        return True
+
+    def ensure_family_id(self, user):
+        """``user``'s family_id, issuing one if this parent predates family ids."""
+        if not user:
+            return None
+        if user.get("family_id"):
+            return user["family_id"]
+        self.col.update_one({"_id": user["_id"], "family_id": None}, {"$set": {"family_id": new_family_id()}})
+        # re-read: a concurrent login or `flask migrate-family` may have got there first
+        return (self.col.find_one({"_id": user["_id"]}, {"family_id": 1}) or {}).get("family_id")
+
+# ────────────── Children ────────────────────────────
+class Children(_Repository):
+    """
+    Children change rarely but are read at the top of nearly every kid and
+    parent route, so lookups by username and by parent are cached. Writes
+    through this repository invalidate both caches in every worker.
+    """
+
+    def __init__(self, cache_size=CHILD_CACHE_SIZE, cache_ttl=CHILD_CACHE_TTL_S):
+        super().__init__("children")
+        self.by_username_cache = TTLCache("child_by_username", maxsize=cache_size, ttl=cache_ttl)
+        self.by_parent_cache = TTLCache("children_by_parent", maxsize=cache_size, ttl=cache_ttl)
+        bus.subscribe("children", self._on_changed)
+
+    def by_username(self, username):
+        """Unscoped (kid login has no family yet) and cached."""
+        ensure_invalidation_listener()
+        return self.by_username_cache.get_or_load(
+            username, lambda: self.col.find_one({"username": username})
+        )
+
+    def for_parent(self, parent_email, family_id=None):
+        """All of a parent's children (without _id), cached."""
+        ensure_invalidation_listener()
+        return self.by_parent_cache.get_or_load(
+            parent_email,
+            lambda: list(self.col.find(family_scope({"parent_email": parent_email}, family_id), {"_id": 0})),
+        )
+
+    def get(self, username, family_id, parent_email=None):
+        """Uncached, for read-modify-write; ``parent_email`` also checks ownership."""
+        q = {"username": username}
+        if parent_email:
+            q["parent_email"] = parent_email
+        return self.col.find_one(family_scope(q, family_id))
+
+    def username_taken(self, username):
+        # usernames are unique across families
+        return self.col.count_documents({"username": username}, limit=1) > 0
+
+    def add(self, child):
+        self.col.insert_one(child)
+        self.invalidate(child["parent_email"], child["username"])
+        bump_version(child.get("family_id"))
+        return child
+
+    def update(self, username, parent_email, family_id, fields):
+        result = self.col.update_one(
+            family_scope({"username": username, "parent_email": parent_email}, family_id),
+            {"$set": fields},
+        )
+        self.invalidate(parent_email, username, fields.get("username", username))
+        bump_version(family_id)
+        return result
+
+    def invalidate(self, parent_email, *usernames):
+        publish_invalidation("children_by_parent", parent_email)
+        for username in usernames:
+            publish_invalidation("child_by_username", username)
+
+    def _on_changed(self, event):
+        if not event.keys or "username" in event.changed_fields:
+            # deletes carry no fields and renames lose the old username -
+            # we can't tell which keys, drop everything
+            self.by_username_cache.clear()
+            self.by_parent_cache.clear()
+            return
+        if "username" in event.keys:
+            self.by_username_cache.pop(event.keys["username"])
+        if "parent_email" in event.keys:
+            self.by_parent_cache.pop(event.keys["parent_email"])
+
+# ────────────── Goals ───────────────────────────────
+class Goals(_Repository):
+    """Goals plus their append-only savings ledger."""
+
+    def __init__(self):
+        super().__init__("goals")
+        self.ledger = LazyCollection("ledger")
+
+    def get(self, goal_id, family_id, projection=None, session=None):
+        return self.col.find_one(
+            family_scope({"_id": object_id(goal_id)}, family_id), projection or GOAL_PROJECTION, session=session
+        )
+
+    def for_kid(self, kid_username, family_id, projection=None, session=None):
+        docs = self._reader(session).find(
+            family_scope({"kid_username": kid_username}, family_id), projection or GOAL_PROJECTION, session=session
+        )
+        if projection:
+            return list(docs)
+        goals = []
+        for g in docs:
+            # only goals that `flask migrate-schema` hasn't reached need fixing up
+            if g.get("schema_version", 0) < GOAL_SCHEMA_VERSION:
+                g.update(goal_fixups(g))
+            goals.append(g)
+        return goals
+
+    def for_parent(self, parent_email, family_id, session=None):
+        return list(self._reader(session).find(
+            family_scope({"parent_email": parent_email}, family_id), GOAL_PROJECTION, session=session
+        ))
+
+    def add(self, goal, session=None):
+        self.col.insert_one(goal, session=session)
+        bump_version(goal.get("family_id"))
+        return goal
+
+    def update(self, goal_id, family_id, fields, session=None):
+        result = self.col.update_one(
+            family_scope({"_id": object_id(goal_id)}, family_id), {"$set": fields}, session=session
+        )
+        bump_version(family_id)
+        return result
+
+    def titles(self, parent_email, family_id, kid=None, batch_size=500):
+        """goal id (str) → title for a family, one small projection."""
+        return {
+            str(g["_id"]): g.get("title")
+            for g in self.col.find(_statement_query(parent_email, family_id, kid), {"title": 1}, batch_size=batch_size)
+        }
+
+    def statement(self, parent_email, family_id, kid=None, start=None, end=None, batch_size=500):
+        """Cursor over a family's goals by created_at, for the statement export."""
+        q = _statement_query(parent_email, family_id, kid, "created_at", start, end)
+        return self.col.find(q, GOAL_PROJECTION, batch_size=batch_size).sort("created_at", 1)
+
+    # ---------- ledger ----------
+    def record(self, entry, session=None):
+        self.ledger.insert_one(entry, session=session)
+        bump_version(entry.get("family_id"))
+
+    def history(self, goal_id, family_id, before=None, limit=20):
+        """
+        One page of a goal's ledger, newest first. ``before`` is the
+        (date, _id) of the previous page's last entry, so equal dates page
+        correctly.
+        """
+        q = family_scope({"goal_id": str(goal_id), **_SAVINGS}, family_id)
+        if before:
+            date, last_id = before
+            q["$or"] = [{"date": {"$lt": date}}, {"date": date, "_id": {"$lt": last_id}}]
+        return list(self.ledger.find(q).sort([("date", -1), ("_id", -1)]).limit(limit))
+
+    def ledger_statement(self, parent_email, family_id, kid=None, start=None, end=None, batch_size=500):
+        q = {**_statement_query(parent_email, family_id, kid, "date", start, end), **_SAVINGS}
+        return self.ledger.find(q, batch_size=batch_size).sort("date", 1)
+
+# ────────────── Chores ──────────────────────────────
+def _fixed_chores(docs):
+    # only chores that `flask migrate-schema` hasn't reached need fixing up
+    chores = []
+    for c in docs:
+        if c.get("schema_version", 0) < CHORE_SCHEMA_VERSION:
+            c.update(chore_fixups(c))
+        chores.append(c)
+    return chores
+
+class Chores(_Repository):
+    """
+    Until ``migrate-schema`` has finished the chores, reads normalise the
+    documents it hasn't reached, and status filters also match the old
+    spellings ('Assigned', 'Pending', ...).
+    """
+
+    def __init__(self):
+        super().__init__("chores")
+        self.migrations = LazyCollection(STATE_COLLECTION)
+        self._legacy_statuses = True
+        self._checked_at = None
+
+    def _statuses(self, *statuses):
+        """Values a status filter must match: the canonical ones, plus old spellings until migrated."""
+        now = time.monotonic()
+        if self._legacy_statuses and (self._checked_at is None or now - self._checked_at > LEGACY_STATUS_RECHECK_S):
+            self._checked_at = now
+            state = self.migrations.find_one({"_id": CHORE_MIGRATION}, {"done": 1}) or {}
+            self._legacy_statuses = not state.get("done")
+        if not self._legacy_statuses:
+            return list(statuses)
+        return [form for status in statuses for form in status_spellings(status)]
+
+    def _status_filter(self, fields):
+        if "status" in fields:
+            fields = {**fields, "status": {"$in": self._statuses(fields["status"])}}
+        return fields
+
+    def get(self, chore_id, family_id):
+        chore = self.col.find_one(family_scope({"_id": object_id(chore_id)}, family_id))
+        return _fixed_chores([chore])[0] if chore else None
+
+    def by_ids(self, chore_ids, family_id, projection=None, session=None):
+        """The chores among ``chore_ids`` (one query), in the order given."""
+        ids = list(dict.fromkeys(object_id(i) for i in chore_ids))
+        docs = self.col.find(family_scope({"_id": {"$in": ids}}, family_id), projection, session=session)
+        found = {c["_id"]: c for c in (docs if projection else _fixed_chores(docs))}
+        return [found[i] for i in ids if i in found]
+
+    def active(self, family_id, **fields):
+        """Chores that aren't archived, filtered by ``fields`` (kid_username, parent_email, status, ...)."""
+        return _fixed_chores(self.col.find(
+            family_scope({"is_active": {"$ne": False}, **self._status_filter(fields)}, family_id)
+        ))
+
+    def for_kids(self, kid_usernames, family_id, session=None):
+        """Every chore of the given kids (without _id), one query for all of them."""
+        return _fixed_chores(self._reader(session).find(
+            family_scope({"kid_username": {"$in": list(kid_usernames)}}, family_id), {"_id": 0}, session=session
+        ))
+
+    def for_goal(self, goal_id, family_id):
+        """A goal's chores that still need doing (not archived or awaiting approval)."""
+        return _fixed_chores(self.col.find(family_scope({
+            "assigned_goal_id": goal_id,
+            "status": {"$nin": self._statuses("archived", "pending_approval")},
+        }, family_id)))
+
+    def count_assigned(self, kid_username, family_id, session=None):
+        return self.col.count_documents(family_scope({
+            "kid_username": kid_username,
+            "status": {"$in": self._statuses("assigned")},
+            "is_active": {"$ne": False},
+        }, family_id), session=session)
+
+    def add(self, chore):
+        self.col.insert_one(chore)
+        bump_version(chore.get("family_id"))
+        return chore
+
+    def update(self, chore_id, parent_email, family_id, fields):
+        """True if the parent's chore was found."""
+        found = self.col.update_one(
+            family_scope({"_id": object_id(chore_id), "parent_email": parent_email}, family_id),
+            {"$set": fields},
+        ).matched_count > 0
+        if found:
+            bump_version(family_id)
+        return found
+
+    def delete(self, chore_id, parent_email, family_id):
+        deleted = self.col.delete_one(
+            family_scope({"_id": object_id(chore_id), "parent_email": parent_email}, family_id)
+        ).deleted_count > 0
+        if deleted:
+            bump_version(family_id)
+        return deleted
+
+    def set_many(self, chore_ids, family_id, fields, status=None, unset=None, session=None):
+        """
+        $set ``fields`` on every chore in ``chore_ids`` (only those currently
+        in ``status`` when given) in one update_many. Returns how many changed.
+        """
+        q = {"_id": {"$in": [object_id(i) for i in chore_ids]}}
+        if status:
+            q["status"] = {"$in": self._statuses(status)}
+        update = {"$set": fields}
+        if unset:
+            update["$unset"] = dict.fromkeys(unset, "")
+        modified = self.col.update_many(family_scope(q, family_id), update, session=session).modified_count
+        if modified:
+            bump_version(family_id)
+        return modified
+
+    def statement(self, parent_email, family_id, kid=None, start=None, end=None, batch_size=500):
+        q = _statement_query(parent_email, family_id, kid, "created_at", start, end)
+        return self.col.find(q, batch_size=batch_size).sort("created_at", 1)
+
+# ────────────── Notifications ───────────────────────
+class Notifications(_Repository):
+    """Reads and state changes; new notifications go through aidiy.notifications.notify()."""
+
+    def __init__(self):
+        super().__init__("notifications")
+
+    def recent(self, recipient_email, family_id, limit=20, session=None):
+        q = unexpired(family_scope({"recipient_email": recipient_email}, family_id))
+        return list(
+            self._reader(session)
+            .find(q, session=session)
+            .sort("created_at", -1)
+            .limit(limit)
+        )
+
+    def unread_count(self, recipient_email, family_id, session=None):
+        return self._reader(session).count_documents(family_scope({
+            "recipient_email": recipient_email,
+            "read": {"$ne": True},
+        }, family_id), session=session)
+
+    def submission(self, submission_id, family_id):
+        """A pending progress submission (they are acted on through their notification)."""
+        return self.col.find_one(
+            family_scope({"_id": object_id(submission_id), "type": "progress_submission"}, family_id)
+        )
+
+    def set_goal_status(self, goal_id, family_id, status):
+        result = self.col.update_many(family_scope({"goal_id": goal_id}, family_id), {"$set": {"status": status}})
+        if result.modified_count:
+            bump_version(family_id)
+        return result
+
+    def delete(self, notification_id, family_id, session=None):
+        result = self.col.delete_one(family_scope({"_id": object_id(notification_id)}, family_id), session=session)
+        bump_version(family_id)
+        return result
+
+    def mark_read(self, recipient_email, family_id, notification_id=None):
+        """Mark one or all of a recipient's notifications read; returns how many changed."""
+        q = {"recipient_email": recipient_email}
+        if notification_id is not None:
+            q["_id"] = object_id(notification_id)
+        changed = mark_read(family_scope(q, family_id))
+        if changed:
+            bump_version(family_id)
+        return changed
+
+    def exists(self, notification_id, recipient_email, family_id):
+        q = family_scope({"_id": object_id(notification_id), "recipient_email": recipient_email}, family_id)
+        return self.col.count_documents(q, limit=1) > 0
+
+# ────────────── Chat sessions ───────────────────────
+class ChatSessions(_Repository):
+    def __init__(self):
+        super().__init__("chat_sessions")
+
+    def create(self, doc):
+        return self.col.insert_one(doc).inserted_id
+
+    def recent(self, user_email, family_id, limit=20, session=None):
+        """The newest sessions without their messages, for the list view."""
+        return list(self._reader(session).find(
+            family_scope({"user_email": user_email}, family_id), {"messages": 0}, session=session,
+        ).sort("updated_at", -1).limit(limit))
+
+    def get(self, chat_id, family_id, user_email=None):
+        q = {"_id": object_id(chat_id)}
+        if user_email:
+            q["user_email"] = user_email
+        return self.col.find_one(family_scope(q, family_id))
+
+    def rename(self, chat_id, user_email, family_id, title):
+        """True if the user's session was found."""
+        return self.col.update_one(
+            family_scope({"_id": object_id(chat_id), "user_email": user_email}, family_id),
+            {"$set": {"title": title, "updated_at": datetime.utcnow()}},
+        ).matched_count > 0
+
+    def append(self, chat_id, family_id, messages, title=None):
+        update = {"$push": {"messages": {"$each": messages}}, "$set": {"updated_at": datetime.utcnow()}}
+        if title:
+            update["$set"]["title"] = title
+        return self.col.update_one(family_scope({"_id": object_id(chat_id)}, family_id), update)
+
+    def delete(self, chat_id, user_email, family_id):
+        return self.col.delete_one(
+            family_scope({"_id": object_id(chat_id), "user_email": user_email}, family_id)
+        ).deleted_count > 0
+
+class Repositories:
+    """The aggregate repositories the routes use; one per process."""
+
+    def __init__(self):
+        self.users = Users()
+        self.children = Children()
+        self.goals = Goals()
+        self.chores = Chores()
+        self.notifications = Notifications()
+        self.chat_sessions = ChatSessions()
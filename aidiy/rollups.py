@@ -0,0 +1,212 @@
+# backend/aidiy/rollups.py
+"""
+Daily savings rollups for the progress charts.
+
+One document per (scope, key, UTC day) in ``savings_daily``, where scope is
+"kid" (key = username) or "family" (key = parent e-mail). The submit,
+approve and decline paths $inc the buckets as they happen; ``flask
+backfill-rollups`` rebuilds them from the ledger (approval and decline
+rows) and the pending submissions.
+Reading a range is one indexed query returning one document per day.
+"""
+import os
+from datetime import datetime, timedelta
+
+import click
+
+from aidiy.extensions import get_db
+from aidiy.log import get_logger
+
+log = get_logger("rollups")
+
+COLLECTION = "savings_daily"
+METRICS = (
+    "earned", "approved", "declined",
+    "chores_submitted", "chores_approved", "chores_declined",
+)
+MAX_RANGE_DAYS = int(os.getenv("ROLLUP_MAX_RANGE_DAYS", 3 * 366))
+
+def day_bucket(when):
+    return datetime(when.year, when.month, when.day)
+
+def _bucket_id(scope, key, day):
+    return f"{scope}|{key}|{day:%Y-%m-%d}"
+
+def _updates(parent_email, kid_username, day, inc):
+    """(filter, update) pairs for the kid bucket and the family bucket."""
+    for scope, key in (("kid", kid_username), ("family", parent_email)):
+        if not key:
+            continue
+        yield (
+            {"_id": _bucket_id(scope, key, day)},
+            {
+                "$inc": inc,
+                "$setOnInsert": {
+                    "scope": scope, "key": key, "day": day,
+                    "parent_email": parent_email,
+                    "kid_username": kid_username if scope == "kid" else None,
+                },
+            },
+        )
+
+def record(parent_email, kid_username, when=None, **amounts):
+    """
+    Add ``amounts`` (keys from METRICS) to today's kid and family buckets.
+    Never raises: a missed rollup is repaired by the next backfill, a failed
+    approval is not.
+    """
+    from pymongo import UpdateOne
+
+    inc = {k: v for k, v in amounts.items() if k in METRICS and v}
+    if not inc:
+        return
+    day = day_bucket(when or datetime.utcnow())
+    try:
+        get_db()[COLLECTION].bulk_write(
+            [UpdateOne(f, u, upsert=True) for f, u in _updates(parent_email, kid_username, day, inc)],
+            ordered=False,
+        )
+    except Exception as e:
+        log.warning("Savings rollup update failed: %s", e, extra={"kid_username": kid_username})
+
+def savings_series(scope, key, start, end):
+    """
+    Daily buckets for ``start``..``end`` (inclusive days), zero-filled, plus
+    totals. Raises ValueError for an empty or oversized range.
+    """
+    start, end = day_bucket(start), day_bucket(end)
+    days = (end - start).days + 1
+    if days < 1:
+        raise ValueError("'from' must not be after 'to'")
+    if days > MAX_RANGE_DAYS:
+        raise ValueError(f"range is limited to {MAX_RANGE_DAYS} days")
+
+    found = {
+        doc["day"]: doc
+        for doc in get_db()[COLLECTION].find(
+            {"scope": scope, "key": key, "day": {"$gte": start, "$lte": end}},
+            {"_id": 0, "day": 1, **{m: 1 for m in METRICS}},
+        )
+    }
+    series, totals = [], dict.fromkeys(METRICS, 0)
+    for i in range(days):
+        day = start + timedelta(days=i)
+        doc = found.get(day, {})
+        point = {"date": day.strftime("%Y-%m-%d"), **{m: doc.get(m, 0) for m in METRICS}}
+        for m in METRICS:
+            totals[m] += point[m]
+        series.append(point)
+    return series, totals
+
+# ────────────── Backfill ────────────────────────────
+def rebuild_rollups(db, batch_size=500):
+    """
+    Recompute every bucket from the ledger (approvals and declines) and
+    still-pending submissions, then swap the result in. Decided submissions
+    are counted as earned on their decision day - the submit time isn't
+    kept once a submission is decided.
+
+    Declines from before the ledger recorded them only survive as the
+    kids' ``progress_declined`` notifications (hot or archived), which
+    expire. Before the first decline row, each day keeps whichever decline
+    totals are larger: the rebuilt ones or the existing bucket's. History
+    whose notifications are gone is kept rather than zeroed.
+    """
+    from pymongo import ASCENDING, ReplaceOne
+
+    from aidiy.notifications import ARCHIVE_COLLECTION
+
+    buckets, goals = {}, {}
+
+    def goal(goal_id):
+        if goal_id not in goals:
+            goals[goal_id] = db["goals"].find_one(
+                {"_id": _object_id(goal_id)}, {"kid_username": 1, "parent_email": 1}
+            ) or {}
+        return goals[goal_id]
+
+    def add(parent_email, kid_username, when, **inc):
+        if not isinstance(when, datetime):
+            return
+        for f, u in _updates(parent_email, kid_username, day_bucket(when), inc):
+            doc = buckets.setdefault(f["_id"], {"_id": f["_id"], **u["$setOnInsert"], **dict.fromkeys(METRICS, 0)})
+            for k, v in inc.items():
+                doc[k] += v or 0
+
+    first_decline = None
+    for e in db["ledger"].find({}, {"type": 1, "parent_email": 1, "kid_username": 1, "date": 1, "amount": 1,
+                                    "chore_ids": 1}, batch_size=batch_size):
+        n = len(e.get("chore_ids") or [])
+        amount = e.get("amount", 0) or 0
+        if e.get("type") == "decline":
+            add(e.get("parent_email"), e.get("kid_username"), e.get("date"),
+                earned=amount, declined=amount, chores_submitted=n, chores_declined=n)
+            if isinstance(e.get("date"), datetime) and (first_decline is None or e["date"] < first_decline):
+                first_decline = e["date"]
+        else:
+            add(e.get("parent_email"), e.get("kid_username"), e.get("date"),
+                earned=amount, approved=amount, chores_submitted=n, chores_approved=n)
+
+    for s in db["notifications"].find({"type": "progress_submission"}, batch_size=batch_size):
+        add(s.get("recipient_email"), goal(s.get("goal_id")).get("kid_username"), s.get("created_at"),
+            earned=s.get("earned_amount", 0), chores_submitted=len(s.get("completed_chore_ids") or []))
+
+    # declines from before the ledger recorded them
+    chores = db["chores"]
+    legacy = {"type": "progress_declined"}
+    if first_decline is not None:
+        legacy["created_at"] = {"$lt": first_decline}
+    for source in (db["notifications"], db[ARCHIVE_COLLECTION]):
+        for d in source.find(legacy, batch_size=batch_size):
+            ids = [i for i in (_object_id(c) for c in d.get("reassigned_chore_ids") or []) if i]
+            amount = d.get("declined_amount")
+            if amount is None:
+                amount = sum(c.get("reward", 0) or 0 for c in chores.find({"_id": {"$in": ids}}, {"reward": 1}))
+            kid = (d.get("recipient_email") or "").split("@")[0]
+            add(goal(d.get("goal_id")).get("parent_email"), kid, d.get("created_at"),
+                earned=amount, declined=amount, chores_submitted=len(ids), chores_declined=len(ids))
+
+    # ...and those whose notifications have expired since: keep what the buckets counted
+    kept = {"$or": [{"declined": {"$gt": 0}}, {"chores_declined": {"$gt": 0}}]}
+    if first_decline is not None:
+        kept["day"] = {"$lt": day_bucket(first_decline)}
+    for old in db[COLLECTION].find(kept, batch_size=batch_size):
+        doc = buckets.setdefault(old["_id"], {
+            "_id": old["_id"], **{k: old.get(k) for k in ("scope", "key", "day", "parent_email", "kid_username")},
+            **dict.fromkeys(METRICS, 0),
+        })
+        for metric, counted_in in (("declined", "earned"), ("chores_declined", "chores_submitted")):
+            missing = (old.get(metric) or 0) - doc[metric]
+            if missing > 0:
+                doc[metric] += missing
+                doc[counted_in] += missing
+
+    tmp = db[f"{COLLECTION}_rebuild"]
+    tmp.drop()
+    tmp.create_index([("scope", ASCENDING), ("key", ASCENDING), ("day", ASCENDING)])
+    docs = list(buckets.values())
+    for i in range(0, len(docs), batch_size):
+        tmp.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs[i:i + batch_size]])
+    if docs:
+        tmp.rename(COLLECTION, dropTarget=True)
+    else:
+        db[COLLECTION].delete_many({})
+    return len(docs)
+
+def _object_id(value):
+    from bson import ObjectId
+    from bson.errors import InvalidId
+
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+@click.command("backfill-rollups")
+@click.option("--batch-size", default=500, show_default=True)
+def backfill_rollups_command(batch_size):
+    """Rebuild the savings_daily rollups from existing history."""
+    count = rebuild_rollups(get_db(), batch_size=batch_size)
+    click.echo(f"Rebuilt {count} daily savings buckets")
+
+COMMANDS = [backfill_rollups_command]
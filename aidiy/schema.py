@@ -0,0 +1,73 @@
+# backend/aidiy/schema.py
+"""
+Document shapes for goals and chores.
+
+``schema_version`` records that a document already has the normalised
+shape below, so read paths only run the fixups for documents the
+``migrate-schema`` command hasn't reached yet. Write paths store the
+normalised shape directly.
+"""
+from datetime import datetime
+
+GOAL_SCHEMA_VERSION = 1
+CHORE_SCHEMA_VERSION = 1
+
+# canonical chore statuses, in lifecycle order
+CHORE_STATUSES = ("pending", "assigned", "in_progress", "pending_approval", "completed", "archived")
+
+_DUE_DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%Y-%m-%d", "%m/%d/%Y", "%d %B %Y", "%B %d %Y")
+
+def chore_status(value):
+    """'Assigned' / 'In Progress' / 'pending-approval' → 'assigned' / 'in_progress' / 'pending_approval'"""
+    if not value:
+        return "assigned"
+    return "_".join(str(value).strip().lower().replace("-", " ").split())
+
+def status_spellings(status):
+    """
+    ``status`` plus the spellings documents had before ``migrate-schema``
+    ('Assigned', 'Pending Approval', 'in-progress', ...), for queries that
+    must still match them.
+    """
+    words = status.split("_")
+    forms = (words, [w.capitalize() for w in words], [words[0].capitalize(), *words[1:]])
+    return sorted({sep.join(form) for sep in ("_", " ", "-") for form in forms})
+
+def parse_due_date(value):
+    """Best-effort parse of the free-form dueDate string; None when unrecognised."""
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in _DUE_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+def goal_progress(saved, amount):
+    return min((saved / amount * 100) if amount > 0 else 0, 100)
+
+def goal_fixups(goal):
+    """Fields to $set so ``goal`` has both saved/currentAmount and progress."""
+    saved = goal.get("saved", goal.get("currentAmount", 0)) or 0
+    return {
+        "saved": saved,
+        "currentAmount": saved,
+        "progress": goal["progress"] if "progress" in goal else goal_progress(saved, goal.get("amount", 0) or 0),
+        "schema_version": GOAL_SCHEMA_VERSION,
+    }
+
+def chore_fixups(chore):
+    """Fields to $set so ``chore`` has a canonical status and a parsed due_at."""
+    return {
+        "status": chore_status(chore.get("status")),
+        "due_at": parse_due_date(chore.get("dueDate")),
+        "schema_version": CHORE_SCHEMA_VERSION,
+    }
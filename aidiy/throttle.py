@@ -0,0 +1,222 @@
+# backend/aidiy/throttle.py
+"""
+Credential-stuffing throttle for the password, kid-code and OTP endpoints.
+
+Failed attempts are counted in sliding windows of THROTTLE_WINDOW_S under
+three keys: the client IP, the identifier tried (e-mail / kid username)
+and a global budget for the endpoint. An IP or identifier that reaches
+its limit is locked out for THROTTLE_LOCKOUT_S, twice as long on each
+further lockout (capped at THROTTLE_MAX_LOCKOUT_S). Lockout levels are
+remembered for THROTTLE_REMEMBER_S. The global budget does not escalate:
+the endpoint just refuses attempts while the fleet is over it, which
+caps the bcrypt work a burst can cause.
+
+State is shared across workers through the ``login_throttle``
+collection. Each key is one small document whose _id is a hash of the
+key, so no e-mails or IPs are stored, and expires_at puts it on the TTL
+index. ``attempt()`` runs before the route touches the database or
+bcrypt and costs a single _id lookup. A worker that has seen a lockout
+keeps it in process memory, so every later attempt against it is
+rejected with a dict lookup and no I/O. If the collection is unreachable
+the throttle fails open and logs it.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+
+from aidiy.extensions import get_db
+from aidiy.log import get_logger
+
+log = get_logger("auth")
+
+COLLECTION = "login_throttle"
+WINDOW_S = int(os.getenv("THROTTLE_WINDOW_S", 300))
+LOCKOUT_S = int(os.getenv("THROTTLE_LOCKOUT_S", 60))
+MAX_LOCKOUT_S = int(os.getenv("THROTTLE_MAX_LOCKOUT_S", 3600))
+REMEMBER_S = int(os.getenv("THROTTLE_REMEMBER_S", 24 * 3600))
+LOCAL_SIZE = int(os.getenv("THROTTLE_LOCAL_SIZE", 10000))
+# how long a worker keeps refusing locally once the global budget is spent
+GLOBAL_RECHECK_S = 1.0
+
+_registry = {}
+
+# ────────────── Throttle ────────────────────────────
+class Throttled(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+def _window_count(doc, now, window_s):
+    """Sliding-window estimate: this window plus the overlapping share of the last one."""
+    buckets = doc.get("n") or {}
+    win = int(now // window_s)
+    elapsed = (now % window_s) / window_s
+    return buckets.get(str(win), 0) + buckets.get(str(win - 1), 0) * (1 - elapsed)
+
+class Attempt:
+    """One throttled attempt; report the outcome with failed() or succeeded()."""
+
+    def __init__(self, throttle, keys, seen):
+        self.throttle = throttle
+        self.keys = keys
+        self.seen = seen
+
+    def failed(self):
+        self.throttle._record_failure(self.keys)
+
+    def succeeded(self):
+        # a correct password clears the identifier's failures, not the IP's
+        self.throttle._clear([key for scope, key, _ in self.keys if scope == "identifier" and key in self.seen])
+
+class Throttle:
+    def __init__(self, name, per_ip=20, per_identifier=5, global_budget=500,
+                 window_s=WINDOW_S, lockout_s=LOCKOUT_S, max_lockout_s=MAX_LOCKOUT_S):
+        self.name = name
+        self.limits = {"ip": per_ip, "identifier": per_identifier, "global": global_budget}
+        self.window_s = window_s
+        self.lockout_s = lockout_s
+        self.max_lockout_s = max_lockout_s
+
+        self._lock = threading.Lock()
+        self._local = OrderedDict()  # key → epoch seconds it is refused until
+        self._stats = defaultdict(int)
+        _registry[name] = self
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _key(self, scope, value):
+        digest = hashlib.sha256(str(value).strip().lower().encode()).hexdigest()[:20]
+        return f"{self.name}:{scope}:{digest}"
+
+    def _keys(self, ip, identifier):
+        keys = [("global", f"{self.name}:global", self.limits["global"])]
+        if ip:
+            keys.append(("ip", self._key("ip", ip), self.limits["ip"]))
+        if identifier:
+            keys.append(("identifier", self._key("identifier", identifier), self.limits["identifier"]))
+        return keys
+
+    def _refused_until(self, key, now):
+        with self._lock:
+            until = self._local.get(key)
+            if until is not None and until <= now:
+                del self._local[key]
+                return None
+            return until
+
+    def _remember(self, key, until):
+        with self._lock:
+            if until > self._local.get(key, 0):
+                self._local[key] = until
+            self._local.move_to_end(key)
+            while len(self._local) > LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def _reject(self, scope, until, now, where):
+        self._count(f"rejected_{scope}_{where}")
+        raise Throttled(f"{scope}_locked" if scope != "global" else "global_budget", max(int(until - now + 0.999), 1))
+
+    def attempt(self, ip, identifier):
+        """
+        Call before any database or bcrypt work. Raises Throttled, or
+        returns the Attempt to report the outcome on.
+        """
+        now = time.time()
+        keys = self._keys(ip, identifier)
+        self._count("attempts")
+        for scope, key, _ in keys:
+            until = self._refused_until(key, now)
+            if until:
+                self._reject(scope, until, now, "local")
+
+        try:
+            docs = {d["_id"]: d for d in get_db()[COLLECTION].find({"_id": {"$in": [k for _, k, _ in keys]}})}
+        except Exception as e:
+            self._count("store_errors")
+            log.warning("Throttle state unavailable, allowing attempt: %s", e, extra={"throttle": self.name})
+            return Attempt(self, keys, set())
+
+        for scope, key, limit in keys:
+            doc = docs.get(key)
+            if doc is None:
+                continue
+            until = doc.get("until") or 0
+            if until > now:
+                self._remember(key, until)
+                self._reject(scope, until, now, "shared")
+            if scope == "global" and _window_count(doc, now, self.window_s) >= limit:
+                self._remember(key, now + GLOBAL_RECHECK_S)
+                self._reject(scope, now + GLOBAL_RECHECK_S, now, "shared")
+        return Attempt(self, keys, set(docs))
+
+    def _record_failure(self, keys):
+        from pymongo import ReturnDocument
+
+        now = time.time()
+        win = int(now // self.window_s)
+        expires_at = datetime.utcnow() + timedelta(seconds=2 * self.window_s)
+        col = get_db()[COLLECTION]
+        self._count("failures")
+        try:
+            for scope, key, limit in keys:
+                doc = col.find_one_and_update(
+                    {"_id": key},
+                    {
+                        "$inc": {f"n.{win}": 1},
+                        "$unset": {f"n.{win - 2}": ""},
+                        "$max": {"expires_at": expires_at},
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                if scope != "global" and _window_count(doc, now, self.window_s) >= limit:
+                    self._lock_out(col, scope, doc, now)
+        except Exception as e:
+            self._count("store_errors")
+            log.warning("Could not record failed attempt: %s", e, extra={"throttle": self.name})
+
+    def _lock_out(self, col, scope, doc, now):
+        level = (doc.get("level") or 0) + 1
+        until = now + min(self.lockout_s * 2 ** (level - 1), self.max_lockout_s)
+        # matching on the old level lets exactly one worker escalate
+        locked = col.update_one(
+            {"_id": doc["_id"], "level": doc.get("level")},
+            {
+                "$set": {"until": until, "level": level, "n": {}},
+                "$max": {"expires_at": datetime.utcfromtimestamp(until) + timedelta(seconds=REMEMBER_S)},
+            },
+        ).modified_count
+        self._remember(doc["_id"], until)
+        if locked:
+            self._count("lockouts")
+            log.warning(
+                "Too many failed attempts, locked out",
+                extra={"throttle": self.name, "scope": scope, "level": level, "seconds": round(until - now)},
+            )
+
+    def _clear(self, keys):
+        if not keys:
+            return
+        try:
+            get_db()[COLLECTION].delete_many({"_id": {"$in": keys}, "until": {"$not": {"$gt": time.time()}}})
+        except Exception as e:
+            self._count("store_errors")
+            log.warning("Could not clear throttle state: %s", e, extra={"throttle": self.name})
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "limits": dict(self.limits),
+                "window_s": self.window_s,
+                "locally_refused": len(self._local),
+            }
+
+def throttle_stats():
+    return {name: t.stats() for name, t in _registry.items()}
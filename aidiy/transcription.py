@@ -0,0 +1,182 @@
+# backend/aidiy/transcription.py
+"""
+Speech-to-text helpers around the Whisper API.
+
+* Results are cached by SHA-256 of the uploaded bytes (per-process LRU plus
+  the TTL-indexed ``transcripts`` collection), so a re-submitted clip is
+  answered without calling OpenAI.
+* Long 16-bit PCM WAV recordings are cut at the quietest point near each
+  chunk boundary, the chunks are transcribed in parallel on a bounded pool
+  and the texts are joined back in order. Everything else (short clips,
+  webm/mp4/ogg from browsers) keeps the single-call path.
+"""
+import hashlib
+import os
+import threading
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from aidiy.cache import TTLCache
+from aidiy.extensions import get_db
+from aidiy.log import get_logger
+
+log = get_logger("ai.stt")
+
+COLLECTION = "transcripts"
+
+CHUNK_THRESHOLD_S = float(os.getenv("STT_CHUNK_THRESHOLD_S", 60))
+MAX_CHUNK_S = float(os.getenv("STT_MAX_CHUNK_S", 45))
+SILENCE_SEARCH_S = 5.0    # look this far back from a boundary for a pause
+SILENCE_WINDOW_S = 0.02   # RMS window when looking for it
+CACHE_TTL_S = int(os.getenv("STT_CACHE_TTL_S", 7 * 24 * 3600))
+
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STT_CONCURRENCY", 3)), thread_name_prefix="stt"
+)
+_local = TTLCache("transcripts", maxsize=256, ttl=CACHE_TTL_S)
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "cache_hits": 0, "single_calls": 0, "chunked": 0, "chunks": 0}
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+def transcription_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+# ────────────── Cache ───────────────────────────────
+def audio_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def cached_transcript(digest):
+    text = _local.get(digest)
+    if text is not None:
+        return text
+    try:
+        doc = get_db()[COLLECTION].find_one({"_id": digest}, {"text": 1})
+    except Exception as e:
+        log.warning("Transcript cache lookup failed: %s", e)
+        return None
+    if doc:
+        _local.set(digest, doc["text"])
+        return doc["text"]
+    return None
+
+def store_transcript(digest, text, chunks):
+    _local.set(digest, text)
+    now = datetime.now(timezone.utc)
+    try:
+        get_db()[COLLECTION].update_one(
+            {"_id": digest},
+            {"$set": {"text": text, "chunks": chunks, "created_at": now,
+                      "expires_at": now + timedelta(seconds=CACHE_TTL_S)}},
+            upsert=True,
+        )
+    except Exception as e:
+        log.warning("Transcript cache store failed: %s", e)
+
+# ────────────── WAV chunking ────────────────────────
+def _read_wav(data):
+    """→ (params, frames) for 16-bit PCM WAV, else None."""
+    try:
+        with wave.open(BytesIO(data)) as w:
+            params = w.getparams()
+            if params.sampwidth != 2 or params.comptype != "NONE":
+                return None
+            return params, w.readframes(params.nframes)
+    except (wave.Error, EOFError):
+        return None
+
+def _quietest_frame(frames, params, start, end):
+    """Frame index of the lowest-energy window in [start, end)."""
+    bytes_per_frame = params.sampwidth * params.nchannels
+    window = max(1, int(params.framerate * SILENCE_WINDOW_S))
+    best, best_energy = end, None
+    for pos in range(start, end - window + 1, window):
+        samples = array("h", frames[pos * bytes_per_frame:(pos + window) * bytes_per_frame])
+        energy = sum(s * s for s in samples[::4])  # every 4th sample is plenty
+        if best_energy is None or energy < best_energy:
+            best, best_energy = pos + window // 2, energy
+    return best
+
+def split_wav(data):
+    """
+    Split a long WAV into <= MAX_CHUNK_S pieces cut at pauses. Returns a list
+    of WAV byte strings, or None when the clip should go up in one piece.
+    """
+    parsed = _read_wav(data)
+    if parsed is None:
+        return None
+    params, frames = parsed
+    rate = params.framerate
+    total = params.nframes
+    if total / rate <= CHUNK_THRESHOLD_S:
+        return None
+
+    bytes_per_frame = params.sampwidth * params.nchannels
+    max_chunk = int(MAX_CHUNK_S * rate)
+    search = int(SILENCE_SEARCH_S * rate)
+
+    cuts, start = [], 0
+    while total - start > max_chunk:
+        boundary = start + max_chunk
+        cut = _quietest_frame(frames, params, max(start + 1, boundary - search), boundary)
+        cuts.append((start, cut))
+        start = cut
+    cuts.append((start, total))
+
+    chunks = []
+    for a, b in cuts:
+        out = BytesIO()
+        with wave.open(out, "wb") as w:
+            w.setnchannels(params.nchannels)
+            w.setsampwidth(params.sampwidth)
+            w.setframerate(rate)
+            w.writeframes(frames[a * bytes_per_frame:b * bytes_per_frame])
+        chunks.append(out.getvalue())
+    return chunks
+
+# ────────────── Entry point ─────────────────────────
+def transcribe(data, extension, transcribe_fn, guard=nullcontext):
+    """
+    ``transcribe_fn(file_obj) -> str`` performs one Whisper call. ``guard()``
+    is entered around the upstream work only (cache hits skip it).
+    Returns (text, info) where info says how the result was produced.
+    """
+    _count("requests")
+    digest = audio_hash(data)
+    text = cached_transcript(digest)
+    if text is not None:
+        _count("cache_hits")
+        return text, {"cached": True, "chunks": 0}
+
+    with guard():
+        return _transcribe_uncached(data, extension, transcribe_fn, digest)
+
+def _transcribe_uncached(data, extension, transcribe_fn, digest):
+    chunks = split_wav(data) if extension.lower() in ("wav", "wave") else None
+    if not chunks:
+        buf = BytesIO(data)
+        buf.name = f"audio.{extension}"
+        text = transcribe_fn(buf)
+        _count("single_calls")
+        store_transcript(digest, text, 1)
+        return text, {"cached": False, "chunks": 1}
+
+    def run(i, chunk):
+        buf = BytesIO(chunk)
+        buf.name = f"chunk{i}.wav"
+        return transcribe_fn(buf)
+
+    futures = [_pool.submit(run, i, c) for i, c in enumerate(chunks)]
+    # .result() in submission order keeps the text in order
+    text = " ".join(t.strip() for t in (f.result() for f in futures) if t and t.strip())
+    _count("chunked")
+    _count("chunks", len(chunks))
+    store_transcript(digest, text, len(chunks))
+    return text, {"cached": False, "chunks": len(chunks)}
@@ -1,34 +1,62 @@
 # backend/app.py
-import os, random, string
+import os, random, string, copy, time, uuid
+import csv, heapq, io
 from datetime import datetime, timedelta, timezone
 
-from flask import Flask, request, jsonify
+from flask import (
+    Blueprint, Flask, current_app, g, request, jsonify, make_response, send_file, stream_with_context,
+)
 from flask_cors import CORS
-from pymongo import MongoClient, errors
-from flask_mail import Mail, Message
 from dotenv import load_dotenv
-import bcrypt, jwt
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import base64
-import tempfile
-
-# OpenAI import with error handling
-try:
-    from openai import OpenAI
-except ImportError:
-    print("[OpenAI] OpenAI package not installed, AI features will be disabled")
-    OpenAI = None
-
-# ────────────── ENV / Flask / CORS ──────────────────
+import jwt
+import hashlib
+from bson.objectid import ObjectId
+
+from aidiy.admission import AdmissionController, AdmissionRejected
+from aidiy.ai_cache import ResponseCache, cache_key as ai_cache_key
+from aidiy.ai_gateway import CircuitOpen, gateway as ai_gateway
+from aidiy.cache import cache_stats
+from aidiy.checks import COMMANDS as CHECK_COMMANDS
+from aidiy.family import family_version, flush_versions, new_family_id
+from aidiy.images import ImageTooLarge, InvalidImage, image_stats, prepare_image
+from aidiy.invalidation import bus as invalidation_bus
+from aidiy.transcription import transcribe as transcribe_audio, transcription_stats
+from aidiy.json_provider import BSONJSONProvider, COMMANDS as JSON_COMMANDS
+from aidiy.log import configure as configure_logging, get_logger, log_stats
+from aidiy.profiler import (
+    PROFILE_ROUTES, Sampler, list_profiles, profile_path, route_profiled, save_profile,
+)
+from aidiy.schema import (
+    CHORE_SCHEMA_VERSION, GOAL_SCHEMA_VERSION, chore_status, goal_progress, parse_due_date,
+)
+from aidiy.migrations import COMMANDS as MIGRATION_COMMANDS, ledger_entry
+from aidiy.payloads import (
+    ASSIGN_TO_GOAL, COMMANDS as PAYLOAD_COMMANDS, CREATE_CHORE, CREATE_GOAL, SUBMIT_PROGRESS, UPDATE_PROFILE,
+    InvalidPayload,
+)
+from aidiy.notifications import (
+    COMMANDS as NOTIFICATION_COMMANDS, GOAL_APPROVAL_REQUEST, GOAL_COMPLETED_KID, GOAL_COMPLETED_PARENT,
+    PROGRESS_APPROVED, PROGRESS_DECLINED, PROGRESS_SUBMISSION, commit_with_notifications,
+    notification_stats, notify,
+)
+from aidiy.reads import (
+    COMMANDS as READ_COMMANDS, decode_token as decode_causal_token, encode_token as encode_causal_token,
+    known_floor, latest as latest_floor, read_routing_stats, read_session, record_write,
+    routing_enabled as read_routing_enabled, session_floor,
+)
+from aidiy.repositories import Repositories
+from aidiy.rollups import COMMANDS as ROLLUP_COMMANDS, record as record_savings, savings_series
+from aidiy.throttle import Throttle, Throttled, throttle_stats
+from aidiy.extensions import (
+    LazyCollection, ai_available, get_mail, get_query_pool, pool_stats,
+)
+
+# ────────────── ENV ─────────────────────────────────
 load_dotenv()
 
 # Development mode flag - default to False in production
 DEV_MODE = os.getenv("DEV_MODE", "False") == "True"
 
-app = Flask(__name__)
-app.secret_key = os.getenv("FLASK_SECRET_KEY", "CHANGE_ME")
-
 # CORS configuration for production only
 allowed_origins = [
     "https://aidiy-deployment-three.vercel.app",
@@ -38,46 +66,24 @@ allowed_origins = [
     "https://www.aidiy.ca"
 ]
 
-CORS(
-    app,
-    resources={r"/*": {"origins": allowed_origins}},
-    supports_credentials=True,
-    allow_headers=["Content-Type", "Authorization"],
-)
+# All routes hang off this blueprint; create_app() wires it to an app
+api = Blueprint("api", __name__)
 
-# ────────────── Flask-Mail ──────────────────────────
-app.config.update(
-    MAIL_SERVER=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
-    MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
-    MAIL_USE_TLS=os.getenv("MAIL_USE_TLS", "True") == "True",
-    MAIL_USE_SSL=os.getenv("MAIL_USE_SSL", "False") == "True",
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_DEFAULT_SENDER=os.getenv("MAIL_USERNAME"),
-)
-mail = Mail(app)
+log = get_logger("api")
+ai_log = get_logger("ai")
+auth_log = get_logger("auth")
+mail_log = get_logger("mail")
+http_log = get_logger("http")
 
 # ────────────── MongoDB ─────────────────────────────
-mongo_client = MongoClient(os.getenv("MONGO_URI"))
-db = mongo_client["aidiy_app"]
-users_col = db["users"]
-pending_col = db["pending_users"]
-otps_col = db["otps"]
-children_col = db["children"]
-goals_col = db["goals"]
-notifications_col = db["notifications"]
-chat_sessions_col = db["chat_sessions"]
-chores_col = db["chores"]  # Moved to top level for consistency
-
-# Enforce indexing for faster queries
-chat_sessions_col.create_index("user_email")
-chat_sessions_col.create_index("created_at")
-
-# enforce kid-username uniqueness
-try:
-    children_col.create_index("username", unique=True)
-except errors.OperationFailure:
-    pass
+# Family-owned data goes through the aggregate repositories in
+# aidiy/repositories.py (they own query shapes, family scoping, the child
+# caches and batching); the collections below are auth / bookkeeping only.
+# Everything resolves (connect + create indexes) on first use, see
+# aidiy/extensions.py; STORAGE_ENGINE=memory runs it all in-process.
+repos = Repositories()
+pending_col = LazyCollection("pending_users")
+otps_col = LazyCollection("otps")
 
 # ────────────── Security helpers ────────────────────
 JWT_SECRET = os.getenv("JWT_SECRET", "CHANGE_ME_TOO")
@@ -91,8 +97,16 @@ def generate_jwt_token(payload: dict) -> str:
     )
 
 verify_jwt_token = lambda t: jwt.decode(t, JWT_SECRET, algorithms=["HS256"]) if t else None
-hash_password = lambda p: bcrypt.hashpw(p.encode(), bcrypt.gensalt()).decode()
-check_password = lambda p, h: bcrypt.checkpw(p.encode(), h.encode())
+
+# bcrypt is imported on demand - only the auth routes pay for it
+def hash_password(p):
+    import bcrypt
+    return bcrypt.hashpw(p.encode(), bcrypt.gensalt()).decode()
+
+def check_password(p, h):
+    import bcrypt
+    return bcrypt.checkpw(p.encode(), h.encode())
+
 random_otp = lambda: "".join(random.choices(string.digits, k=6))
 
 OTP_EXP_MIN = 5
@@ -105,13 +119,17 @@ def send_otp_email(email, code):
             f"Your OTP code is {code}. It expires in {OTP_EXP_MIN} minutes.\n\n"
             "If you did not request this, please ignore."
         )
-        mail.send(Message("Your AIDIY OTP Code", recipients=[email], body=body))
-        print(f"[MAIL] OTP sent successfully to {email}")
+        from flask_mail import Message
+        get_mail(current_app._get_current_object()).send(
+            Message("Your AIDIY OTP Code", recipients=[email], body=body)
+        )
+        mail_log.info("OTP sent", extra={"email": email})
         return True
     except Exception as e:
-        print(f"[MAIL] Could not send OTP → {email}: {e}")
-        # Print OTP to console in dev environment
-        print(f"[DEV] OTP for {email}: {code}")
+        mail_log.warning("Could not send OTP: %s", e, extra={"email": email})
+        # Surface the OTP in dev so sign-up works without SMTP
+        if os.getenv("DEV_MODE", "False") == "True":
+            mail_log.warning("DEV OTP for %s: %s", email, code)
         return False
 
 def create_or_replace_otp(email, purpose):
@@ -135,7 +153,7 @@ def create_or_replace_otp(email, purpose):
     return code
 
 # ────────────── Routes ──────────────────────────────
-@app.route("/")
+@api.route("/")
 def index():
     return jsonify(
         message="AIDIY API Server",
@@ -144,25 +162,26 @@ def index():
         api_docs="Visit /api/health for health check"
     )
 
-@app.route("/api/health")
+@api.route("/api/health")
 def health():
     return jsonify(
         status="OK", 
         time=datetime.now(timezone.utc).isoformat(),
-        ai_available=OpenAI is not None
+        # false while the OpenAI circuit breaker is open
+        ai_available=ai_available() and ai_gateway.available()
     )
 
 # ---------- 1  Registration ---------- #
 REQUIRED_FIELDS = ("firstName", "lastName", "email", "password")  # slimmed down
 
-@app.route("/api/auth/register", methods=["POST"])
+@api.route("/api/auth/register", methods=["POST"])
 def register():
     d = request.get_json() or {}
     if not all(d.get(f) for f in REQUIRED_FIELDS):
         return jsonify(error="Missing required fields"), 400
 
     email = d["email"]
-    if users_col.find_one({"email": email}):
+    if repos.users.get(email):
         return jsonify(error="Email already verified"), 409
 
     pending_col.update_one(
@@ -193,7 +212,7 @@ def register():
     )
 
 # ---------- 2  Send / Resend OTP ---------- #
-@app.route("/api/auth/send-otp", methods=["POST"])
+@api.route("/api/auth/send-otp", methods=["POST"])
 def send_otp():
     email = (request.get_json() or {}).get("email")
     if not email:
@@ -201,7 +220,7 @@ def send_otp():
 
     purpose = (
         "reset"
-        if users_col.find_one({"email": email})
+        if repos.users.get(email)
         else "verify"
         if pending_col.find_one({"email": email})
         else None
@@ -212,43 +231,46 @@ def send_otp():
     create_or_replace_otp(email, purpose)
     return jsonify(success=True, message=f"OTP sent for {purpose}"), 200
 
-@app.route("/api/auth/resend-otp", methods=["POST"])
+@api.route("/api/auth/resend-otp", methods=["POST"])
 def resend_otp():
     return send_otp()
 
 # ---------- 3  Verify OTP (handles sign-up + password-reset) ---------- #
-@app.route("/api/auth/verify-otp", methods=["POST"])
+@api.route("/api/auth/verify-otp", methods=["POST"])
 def verify_otp():
     d = request.get_json() or {}
     email, otp_input = d.get("email"), d.get("otp")
+    if not email:
+        return jsonify(error="Email required"), 400
+    try:
+        attempt = otp_throttle.attempt(request.remote_addr, email)
+    except Throttled as e:
+        return too_many_attempts(e)
 
     # Find the OTP doc (any purpose) -----------------------------------
     rec = otps_col.find_one({"email": email})
     if not rec:
+        attempt.failed()
         return jsonify(error="No OTP found"), 404
     
     # Ensure rec["expires_at"] is timezone-aware
     expires_at = rec["expires_at"]
     if expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
-
-    expires_at = rec["expires_at"]
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    if datetime.now(timezone.utc) > expires_at:
-        otps_col.delete_one({"_id": rec["_id"]})
-        return jsonify(error="OTP expired"), 400
-    
     if datetime.now(timezone.utc) > expires_at:
+        attempt.failed()
         otps_col.delete_one({"_id": rec["_id"]})
         return jsonify(error="OTP expired"), 400
     
     if rec["attempts"] >= MAX_OTP_ATTEMPTS:
+        attempt.failed()
         return jsonify(error="Too many attempts"), 403
     
     if otp_input != rec["otp"]:
+        attempt.failed()
         otps_col.update_one({"_id": rec["_id"]}, {"$inc": {"attempts": 1}})
         return jsonify(error="Incorrect OTP"), 400
+    attempt.succeeded()
 
     # ---------- purpose-specific logic ----------
     if rec["purpose"] == "verify":
@@ -257,7 +279,8 @@ def verify_otp():
         if not pending:
             return jsonify(error="Pending registration missing"), 400
         pending["isVerified"] = True
-        users_col.insert_one(pending)
+        pending["family_id"] = new_family_id()
+        repos.users.add(pending)
         pending_col.delete_one({"email": email})
         # Remove OTP – it has served its purpose
         otps_col.delete_one({"_id": rec["_id"]})
@@ -276,7 +299,7 @@ def verify_otp():
 
 
 # ---------- 4  Reset password ---------- #
-@app.route("/api/auth/reset-password", methods=["POST"])
+@api.route("/api/auth/reset-password", methods=["POST"])
 def reset_password():
     d = request.get_json() or {}
 
@@ -295,57 +318,80 @@ def reset_password():
     if not doc:
         return jsonify(error="OTP not validated"), 403
 
-    users_col.update_one(
-        {"email": email},
-        {"$set": {"password": hash_password(new_pwd)}}
-    )
+    repos.users.update(email, {"password": hash_password(new_pwd)})
     # delete the OTP after successful reset so it can't be reused
     otps_col.delete_one({"_id": doc["_id"]})
 
     return jsonify(success=True, message="Password reset successfully"), 200
 
+# ---------- Credential throttling ---------- #
+# Checked before the user lookup / bcrypt / OTP read, see aidiy/throttle.py.
+# request.remote_addr is the client once PROXY_HOPS is set (create_app).
+THROTTLE_LIMITS = dict(
+    per_ip=int(os.getenv("AUTH_FAILS_PER_IP", 20)),
+    per_identifier=int(os.getenv("AUTH_FAILS_PER_ACCOUNT", 5)),
+    global_budget=int(os.getenv("AUTH_FAILS_GLOBAL", 500)),
+)
+login_throttle = Throttle("login", **THROTTLE_LIMITS)
+kid_login_throttle = Throttle("kid_login", **THROTTLE_LIMITS)
+otp_throttle = Throttle("otp", **THROTTLE_LIMITS)
+
+def too_many_attempts(e):
+    resp = jsonify(error="Too many attempts, please try again later", reason=e.reason)
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
 # ---------- 5  Parent login ---------- #
-@app.route("/api/auth/login", methods=["POST"])
+@api.route("/api/auth/login", methods=["POST"])
 def login():
     d = request.get_json() or {}
     email, pwd = d.get("email"), d.get("password")
     if not email or not pwd:
         return jsonify(error="Email and password required"), 400
+    try:
+        attempt = login_throttle.attempt(request.remote_addr, email)
+    except Throttled as e:
+        return too_many_attempts(e)
 
-    user = users_col.find_one({"email": email})
+    user = repos.users.get(email)
     if not user or not check_password(pwd, user["password"]):
+        attempt.failed()
         return jsonify(error="Invalid credentials"), 401
+    attempt.succeeded()
 
     # Check if user profile is complete
     isProfileComplete = user.get("isProfileComplete", False)
     
-    tok = generate_jwt_token({"email": email, "name": user["name"]})
+    tok = generate_jwt_token({"email": email, "name": user["name"], "family_id": repos.users.ensure_family_id(user)})
     return jsonify(
         success=True,
         user={"email": email, "name": user["name"], "isProfileComplete": isProfileComplete},
         appToken=tok,
     )
 
-@app.route("/api/auth/logout", methods=["POST"])
+@api.route("/api/auth/logout", methods=["POST"])
 def logout_route():
     return jsonify(success=True)
 
 # ---------- 6  Google sign-in ---------- #
 CLIENT_ID = "670147633419-rebvnb3b4h848pipit4hv2q1s3u09ln2.apps.googleusercontent.com"
 
-@app.route("/auth/google", methods=["POST"])
+@api.route("/auth/google", methods=["POST"])
 def google_login():
     tok = (request.get_json() or {}).get("token")
     if not tok:
         return jsonify(success=False, error="No token provided"), 400
+    from google.oauth2 import id_token
+    from google.auth.transport import requests as google_requests
     try:
         info = id_token.verify_oauth2_token(tok, google_requests.Request(), CLIENT_ID)
     except Exception as e:
-        print(f"[Google Auth Error] {type(e).__name__}: {str(e)}")
+        auth_log.warning("Google token verification failed: %s: %s", type(e).__name__, e)
         return jsonify(success=False, error=f"Token verification failed: {str(e)}"), 400
 
     email = info["email"]
-    user = users_col.find_one({"email": email})
+    user = repos.users.get(email)
 
     if not user:
         user = {
@@ -359,19 +405,20 @@ def google_login():
             "password": None,
             "isProfileComplete": False,
             "hasCompletedAssessment": False,
+            "family_id": new_family_id(),
         }
-        users_col.insert_one(user)
+        repos.users.add(user)
     else:
 
 
       # Skip OTP verification in dev mode
       if not user.get("isVerified") and not DEV_MODE:
-         users_col.update_one({"email": email}, {"$set": {"isVerified": True}})
+         repos.users.update(email, {"isVerified": True})
          user["isVerified"] = True
 
     # Check if user profile is complete
     isProfileComplete = user.get("isProfileComplete", False)
-    token = generate_jwt_token({"email": email, "name": user["name"]})
+    token = generate_jwt_token({"email": email, "name": user["name"], "family_id": repos.users.ensure_family_id(user)})
 
     return jsonify(
         success=True,
@@ -383,7 +430,7 @@ def google_login():
         appToken=token
     ), 200
 
-#@app.route("/auth/google/verify-otp", methods=["POST"])
+#@api.route("/auth/google/verify-otp", methods=["POST"])
 #def google_verify_otp():
 #    d = request.get_json() or {}
 #    email, otp_input = d.get("email"), d.get("otp")
@@ -414,23 +461,30 @@ def google_login():
 #    )
 
 # ---------- 7  Kid login ---------- #
-@app.route("/api/auth/kid-login", methods=["POST"])
+@api.route("/api/auth/kid-login", methods=["POST"])
 def kid_login():
     d = request.get_json() or {}
     username = d.get("username", "").strip()
     code = d.get("code", "")
     if not username or len(code) != 4 or not code.isdigit():
         return jsonify(error="Username and 4-digit code required"), 400
+    try:
+        attempt = kid_login_throttle.attempt(request.remote_addr, username)
+    except Throttled as e:
+        return too_many_attempts(e)
 
-    child = children_col.find_one({"username": username, "loginCode": code})
-    if not child:
+    child = repos.children.by_username(username)
+    if not child or child.get("loginCode") != code:
+        attempt.failed()
         return jsonify(error="Invalid kid credentials"), 401
+    attempt.succeeded()
 
     tok = generate_jwt_token(
         {
             "email": f"{username}@kids.aidiy",
             "name": child.get("nickName") or child["firstName"],
             "username": username,
+            "family_id": child.get("family_id"),
         }
     )
     return jsonify(
@@ -457,22 +511,260 @@ def auth_required(fn):
             return jsonify(error="Token expired"), 401
         except Exception:
             return jsonify(error="Invalid token"), 401
+        if not request.user.get("family_id"):
+            # tokens from before family ids (or from a kid not yet migrated)
+            request.user["family_id"] = family_id_for(request.user)
         return fn(*a, **kw)
 
     inner.__name__ = fn.__name__
     return inner
 
-@app.route("/api/users/profile")
+# ---------- Request bodies ---------- #
+def json_body(schema):
+    """
+    Use below @auth_required: decodes and validates the JSON body against
+    ``schema`` (aidiy/payloads.py) into ``request.payload``, or answers 400
+    before the route runs.
+    """
+    def wrap(fn):
+        def inner(*a, **kw):
+            try:
+                request.payload = schema.decode(request.get_data(cache=True))
+            except InvalidPayload as e:
+                return jsonify(error="Invalid request body", errors=e.errors), 400
+            return fn(*a, **kw)
+
+        inner.__name__ = fn.__name__
+        return inner
+    return wrap
+
+# ---------- Family scoping ---------- #
+# Every family-owned document carries the family_id that is also in the
+# token (aidiy/family.py); routes pass request.user["family_id"] to the
+# repositories so each query targets one family instead of every family's rows.
+def family_id_for(user):
+    email = user.get("email", "")
+    if "@kids.aidiy" in email:
+        return (repos.children.by_username(email.split("@")[0]) or {}).get("family_id")
+    return repos.users.ensure_family_id(repos.users.get(email, projection={"family_id": 1}))
+
+# ---------- Conditional GET (ETag) ---------- #
+# Every family (a parent plus their kids) has a change counter, bumped by
+# the write paths themselves (aidiy/family.py); read routes derive a strong
+# ETag from it and answer If-None-Match with 304 before touching the data.
+# The UTC date is part of the tag because notifications expire at midnight.
+@api.after_app_request
+def apply_version_bumps(resp):
+    flush_versions()
+    return resp
+
+@api.teardown_app_request
+def apply_version_bumps_on_error(exc):
+    # a route that failed half-way may still have written
+    if exc is not None:
+        flush_versions()
+
+def conditional_get(fn):
+    """Use below @auth_required on read-only routes."""
+    def inner(*a, **kw):
+        family_id = request.user.get("family_id")
+        if not family_id:
+            return fn(*a, **kw)
+
+        # read on the primary; its operation time also becomes the floor for
+        # the route's secondary reads, so the body is at least this version
+        with read_session(request_read_floor()) as session:
+            version = family_version(family_id, session=session)
+            raise_read_floor(session_floor(session))
+        raw = (f"{request.endpoint}|{request.user['email']}|{family_id}|{request.query_string.decode()}"
+               f"|{version}|{datetime.utcnow().date()}")
+        etag = hashlib.sha1(raw.encode()).hexdigest()
+
+        if etag in request.if_none_match:
+            resp = make_response("", 304)
+        else:
+            resp = make_response(fn(*a, **kw))
+            if resp.status_code != 200:
+                return resp
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    inner.__name__ = fn.__name__
+    return inner
+
+# ---------- Read routing ---------- #
+# Tolerant reads may be served by a secondary (aidiy/reads.py). To keep
+# read-after-write intact, each successful write request records a causal
+# floor for the family and returns it as X-Causal-Token; reads then start
+# their session at the newest of the two.
+def causal_key():
+    return request.user.get("family_id") or request.user.get("email")
+
+def request_read_floor():
+    if not read_routing_enabled():
+        return None
+    if "read_floor" not in g:
+        g.read_floor = latest_floor(
+            known_floor(causal_key()),
+            decode_causal_token(request.headers.get("X-Causal-Token"), JWT_SECRET),
+        )
+    return g.read_floor
+
+def raise_read_floor(floor):
+    if floor is not None:
+        g.read_floor = latest_floor(request_read_floor(), floor)
+
+def tolerant_loader(fn, *args):
+    """``fn(*args, session=...)`` in its own causal session, for run_sections' pool threads."""
+    floor = request_read_floor()
+
+    def run():
+        with read_session(floor) as session:
+            return fn(*args, session=session)
+
+    return run
+
+@api.after_app_request
+def record_write_floor(resp):
+    if (
+        read_routing_enabled()
+        and request.method in ("POST", "PUT", "PATCH", "DELETE")
+        and resp.status_code < 400
+        and getattr(request, "user", None)
+    ):
+        floor = record_write(causal_key())
+        if floor is not None:
+            resp.headers["X-Causal-Token"] = encode_causal_token(floor, JWT_SECRET)
+    return resp
+
+# ---------- Request logging ---------- #
+# Every request gets an id (the caller's X-Request-ID if it sent a sane one)
+# that is stamped on each log record and echoed back in the response.
+def _incoming_request_id():
+    rid = request.headers.get("X-Request-ID", "")
+    if rid and len(rid) <= 64 and rid.replace("-", "").isalnum():
+        return rid
+    return uuid.uuid4().hex
+
+@api.before_app_request
+def start_request_log():
+    g.request_id = _incoming_request_id()
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def finish_request_log(resp):
+    started = g.get("request_started")
+    if started is not None:
+        http_log.info(
+            "%s %s %s", request.method, request.path, resp.status_code,
+            extra={
+                "status": resp.status_code,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            },
+        )
+        resp.headers["X-Request-ID"] = g.request_id
+    return resp
+
+# Ops-only endpoints: disabled (404) unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def admin_required(fn):
+    def inner(*a, **kw):
+        if not ADMIN_TOKEN:
+            return jsonify(error="Not found"), 404
+        if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return jsonify(error="Forbidden"), 403
+        return fn(*a, **kw)
+
+    inner.__name__ = fn.__name__
+    return inner
+
+@api.route("/api/metrics")
+@admin_required
+def metrics():
+    return jsonify(
+        success=True,
+        pools=pool_stats(),
+        caches=cache_stats(),
+        invalidation=invalidation_bus.stats(),
+        ai_admission=ai_admission.stats(),
+        ai_gateway=ai_gateway.stats(),
+        ai_chat_cache=ai_chat_cache.stats(),
+        ai_images=image_stats(),
+        speech_to_text=transcription_stats(),
+        logging=log_stats(),
+        notifications=notification_stats(),
+        read_routing=read_routing_stats(),
+        auth_throttle=throttle_stats(),
+    )
+
+# ---------- Request profiling ---------- #
+# Opt-in: endpoints named in PROFILE_ROUTES, or any request carrying
+# X-Profile: 1 together with a valid X-Admin-Token. create_app only installs
+# these hooks when one of the two can apply, so normal traffic pays nothing.
+def profiling_enabled():
+    return bool(PROFILE_ROUTES or ADMIN_TOKEN)
+
+def start_request_profile():
+    wanted = route_profiled(request.endpoint) or (
+        ADMIN_TOKEN
+        and request.headers.get("X-Profile") == "1"
+        and request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+    )
+    if wanted:
+        g.profiler = Sampler().start()
+
+def finish_request_profile(resp):
+    sampler = g.pop("profiler", None)
+    if sampler is None:
+        return resp
+    sampler.stop()
+    try:
+        name = save_profile(sampler, request.endpoint, g.get("request_id", "-"))
+    except OSError as e:
+        log.warning("Could not save profile: %s", e)
+        return resp
+    log.info(
+        "Request profiled",
+        extra={"profile": name, "samples": sampler.samples, "elapsed_ms": round(sampler.elapsed_ms, 1)},
+    )
+    resp.headers["X-Profile-Id"] = name
+    return resp
+
+def discard_request_profile(exc=None):
+    # after_request is skipped on unhandled errors; don't leave a sampler running
+    sampler = g.pop("profiler", None)
+    if sampler is not None:
+        sampler.stop()
+
+@api.route("/api/profiles")
+@admin_required
+def get_profiles():
+    return jsonify(success=True, profiles=list_profiles())
+
+@api.route("/api/profiles/<name>")
+@admin_required
+def download_profile(name):
+    path = profile_path(name)
+    if not path:
+        return jsonify(error="Profile not found"), 404
+    return send_file(path, mimetype="text/plain", as_attachment=True, download_name=name)
+
+@api.route("/api/users/profile")
 @auth_required
 def profile():
-    user = users_col.find_one({"email": request.user["email"]}, {"_id": 0, "password": 0})
+    return jsonify(success=True, user=load_profile(request.user["email"], request.user["family_id"]))
+
+def load_profile(email, family_id=None):
+    user = repos.users.get(email, family_id, {"_id": 0, "password": 0})
 
     # If this is a kid user, add their savings information
     if user and "@kids.aidiy" in user.get("email", ""):
         kid_username = user["email"].split("@")[0]
         
         # Get child's goals to calculate total savings
-        child_goals = list(goals_col.find({"kid_username": kid_username}))
+        child_goals = repos.goals.for_kid(kid_username, family_id, {"saved": 1, "status": 1})
         total_savings = sum([g.get("saved", 0) for g in child_goals])
         total_goals = len(child_goals)
         active_goals = len([g for g in child_goals if g.get("status") == "approved"])
@@ -486,22 +778,20 @@ def profile():
             "completed_goals": completed_goals
         }
 
-    return jsonify(success=True, user=user)
+    return user
 
 # ---------- Update user profile ---------- #
-@app.route("/api/users/profile", methods=["PUT"])
+@api.route("/api/users/profile", methods=["PUT"])
 @auth_required
+@json_body(UPDATE_PROFILE)
 def update_profile():
-    d = request.get_json() or {}
-    
-    # Allowed fields to update
-    allowed_fields = ["firstName", "lastName", "phoneNumber", "birthDate", "parentRole", "spouse", "parents", "choreCategories"]
-    update_data = {k: v for k, v in d.items() if k in allowed_fields and v is not None}
+    # only the fields UPDATE_PROFILE knows; null / absent ones are left alone
+    update_data = {k: v for k, v in request.payload.items() if v is not None}
     
     # Special handling for parents array
     if "parents" in update_data:
         # When updating parents, merge with existing data
-        user = users_col.find_one({"email": request.user["email"]})
+        user = repos.users.get(request.user["email"], request.user["family_id"])
         existing_parents = user.get("parents", [])
         new_parents = update_data["parents"]
         
@@ -518,7 +808,7 @@ def update_profile():
     if update_data:
         # If firstName and lastName exist, update name field
         if "firstName" in update_data or "lastName" in update_data:
-            user = users_col.find_one({"email": request.user["email"]})
+            user = repos.users.get(request.user["email"], request.user["family_id"])
             firstName = update_data.get("firstName", user.get("firstName", ""))
             lastName = update_data.get("lastName", user.get("lastName", ""))
             update_data["name"] = f"{firstName} {lastName}"
@@ -526,25 +816,21 @@ def update_profile():
         # Mark profile as complete
         update_data["isProfileComplete"] = True
         
-        users_col.update_one(
-            {"email": request.user["email"]},
-            {"$set": update_data}
-        )
+        repos.users.update(request.user["email"], update_data, request.user["family_id"])
         
         return jsonify(success=True, message="Profile updated successfully")
     
     return jsonify(error="No valid fields to update"), 400
 
 # ---------- Children management ---------- #
-@app.route("/api/users/children")
+@api.route("/api/users/children")
 @auth_required
+@conditional_get
 def children_get():
-    kids = list(
-        children_col.find({"parent_email": request.user["email"]}, {"_id": 0})
-    )
+    kids = repos.children.for_parent(request.user["email"], request.user["family_id"])
     return jsonify(success=True, children=kids)
 
-@app.route("/api/users/children", methods=["POST"])
+@api.route("/api/users/children", methods=["POST"])
 @auth_required
 def children_add():
     d = request.get_json() or {}
@@ -552,11 +838,12 @@ def children_add():
     if not all(d.get(k) for k in required):
         return jsonify(error="Missing fields"), 400
 
-    if children_col.find_one({"username": d["username"]}):
+    if repos.children.username_taken(d["username"]):
         return jsonify(error="Username already taken"), 409
 
     child = {
         "parent_email": request.user["email"],
+        "family_id": request.user["family_id"],
         "id": d["loginCode"],
         "username": d["username"],
         "firstName": d["firstName"],
@@ -571,11 +858,11 @@ def children_add():
         "created_at": datetime.now(timezone.utc),
     }
 
-    children_col.insert_one(child)
+    repos.children.add(child)
     child.pop("_id", None)
     return jsonify(success=True, child=child), 201
 
-@app.route("/api/users/children/<username>", methods=["PUT"])
+@api.route("/api/users/children/<username>", methods=["PUT"])
 @auth_required
 def update_child(username):
     d = request.get_json() or {}
@@ -587,87 +874,112 @@ def update_child(username):
         return jsonify(error="No valid fields to update"), 400
 
     # Make sure the child belongs to the logged-in parent
-    child = children_col.find_one({"username": username, "parent_email": request.user["email"]})
+    family_id = request.user["family_id"]
+    child = repos.children.get(username, family_id, parent_email=request.user["email"])
     if not child:
         return jsonify(error="Child not found"), 404
 
     # Prevent username conflict if it's being changed
     if "username" in update_data and update_data["username"] != username:
-        if children_col.find_one({"username": update_data["username"]}):
+        if repos.children.username_taken(update_data["username"]):
             return jsonify(error="Username already taken"), 409
 
-    children_col.update_one(
-        {"username": username, "parent_email": request.user["email"]},
-        {"$set": update_data}
-    )
+    repos.children.update(username, request.user["email"], family_id, update_data)
 
-    updated = children_col.find_one({"username": update_data.get("username", username)})
+    updated = repos.children.get(update_data.get("username", username), family_id)
     updated.pop("_id", None)
     return jsonify(success=True, child=updated)
 
 # ---------- AI Chat and Speech endpoints ---------- #
-from openai import OpenAI
+# OpenAI calls can hold a thread for a long time; cap how many of them a
+# worker runs at once so login and chore CRUD always have threads left.
+ai_admission = AdmissionController(
+    "ai",
+    max_in_flight=int(os.getenv("AI_MAX_IN_FLIGHT", 4)),
+    max_per_user=int(os.getenv("AI_MAX_PER_USER", 1)),
+    queue_size=int(os.getenv("AI_QUEUE_SIZE", 4)),
+    queue_timeout_s=float(os.getenv("AI_QUEUE_TIMEOUT_S", 2)),
+    retry_after_s=int(os.getenv("AI_RETRY_AFTER_S", 5)),
+)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def ai_busy(e):
+    resp = jsonify(error="AI assistant is busy, please try again shortly", reason=e.reason)
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
 
-@app.route("/api/chat/sessions", methods=["POST"])
+def ai_admission_required(fn):
+    """Use below @auth_required on routes that call OpenAI."""
+    def inner(*a, **kw):
+        try:
+            ai_admission.acquire(request.user["email"])
+        except AdmissionRejected as e:
+            return ai_busy(e)
+        try:
+            return fn(*a, **kw)
+        finally:
+            ai_admission.release(request.user["email"])
+
+    inner.__name__ = fn.__name__
+    return inner
+
+# per-call deadlines (seconds, retries included) for the OpenAI gateway
+AI_CHAT_DEADLINE_S = float(os.getenv("AI_CHAT_DEADLINE_S", 30))
+AI_TRANSCRIBE_DEADLINE_S = float(os.getenv("AI_TRANSCRIBE_DEADLINE_S", 60))
+AI_RECOMMEND_DEADLINE_S = float(os.getenv("AI_RECOMMEND_DEADLINE_S", 30))
+
+AI_CHAT_SYSTEM_PROMPT = "You are a helpful financial coach..."
+AI_CHAT_TEXT_MODEL = "gpt-3.5-turbo"
+AI_CHAT_VISION_MODEL = "gpt-4o"
+
+# Opt-in exact-match cache for text-only chat prompts ("what is interest")
+AI_CHAT_CACHE_ENABLED = os.getenv("AI_CHAT_CACHE", "False") == "True"
+ai_chat_cache = ResponseCache(
+    "ai_chat_responses",
+    maxsize=int(os.getenv("AI_CHAT_CACHE_SIZE", 512)),
+    ttl=int(os.getenv("AI_CHAT_CACHE_TTL_S", 24 * 3600)),
+)
+
+def ai_unavailable(e):
+    resp = jsonify(error="AI assistant is temporarily unavailable, please try again shortly")
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+@api.route("/api/chat/sessions", methods=["POST"])
 @auth_required
 def create_chat_session():
     user_email = request.user["email"]
     # We create an *empty* shell here; it will get its first message a moment later
-    result = chat_sessions_col.insert_one({
+    session_id = repos.chat_sessions.create({
         "user_email":  user_email,
+        "family_id":   request.user["family_id"],
         "title":       "New Chat",
         "messages":    [],                 # empty until first real message
         "created_at":  datetime.utcnow(),
         "updated_at":  datetime.utcnow()
     })
-    return jsonify(success=True, session_id=str(result.inserted_id))
-    return jsonify(
-        success=True,
-        session_id=str(result.inserted_id),
-        title=title
-    )
+    return jsonify(success=True, session_id=str(session_id))
 
-@app.route("/api/chat/sessions", methods=["GET"])
+@api.route("/api/chat/sessions", methods=["GET"])
 @auth_required
 def get_chat_sessions():
-    sessions = list(chat_sessions_col.find(
-        {"user_email": request.user["email"]},
-        {"messages": 0}  # Exclude messages for list view
-    ).sort("updated_at", -1).limit(20))
-    
-    for session in sessions:
-        session["_id"] = str(session["_id"])
-        session["created_at"] = session["created_at"].isoformat()
-        session["updated_at"] = session["updated_at"].isoformat()
-    
+    with read_session(request_read_floor()) as session:
+        sessions = repos.chat_sessions.recent(request.user["email"], request.user["family_id"], session=session)
     return jsonify(success=True, sessions=sessions)
 
-@app.route("/api/chat/sessions/<session_id>", methods=["GET"])
+@api.route("/api/chat/sessions/<session_id>", methods=["GET"])
 @auth_required
 def get_chat_session(session_id):
     try:
-        session = chat_sessions_col.find_one(
-            {"_id": ObjectId(session_id), "user_email": request.user["email"]}
-        )
+        session = repos.chat_sessions.get(session_id, request.user["family_id"], request.user["email"])
         if not session:
             return jsonify(error="Session not found"), 404
-            
-        session["_id"] = str(session["_id"])
-        session["created_at"] = session["created_at"].isoformat()
-        session["updated_at"] = session["updated_at"].isoformat()
-        
-        # Convert message timestamps
-        for msg in session["messages"]:
-            msg["timestamp"] = msg["timestamp"].isoformat()
-        
         return jsonify(success=True, session=session)
-    except Exception as e:
+    except Exception:
         return jsonify(error="Invalid session ID"), 400
 
-@app.route("/api/chat/sessions/<session_id>", methods=["PUT"])
+@api.route("/api/chat/sessions/<session_id>", methods=["PUT"])
 @auth_required
 def update_chat_session(session_id):
     try:
@@ -675,35 +987,24 @@ def update_chat_session(session_id):
         if not title:
             return jsonify(error="Title required"), 400
             
-        result = chat_sessions_col.update_one(
-            {"_id": ObjectId(session_id), "user_email": request.user["email"]},
-            {"$set": {"title": title, "updated_at": datetime.utcnow()}}
-        )
-        
-        if result.matched_count == 0:
+        if not repos.chat_sessions.rename(session_id, request.user["email"], request.user["family_id"], title):
             return jsonify(error="Session not found"), 404
             
         return jsonify(success=True)
-    except Exception as e:
+    except Exception:
         return jsonify(error="Invalid session ID"), 400
 
-@app.route("/api/chat/sessions/<session_id>", methods=["DELETE"])
+@api.route("/api/chat/sessions/<session_id>", methods=["DELETE"])
 @auth_required
 def delete_chat_session(session_id):
     try:
-        result = chat_sessions_col.delete_one(
-            {"_id": ObjectId(session_id), "user_email": request.user["email"]}
-        )
-        if result.deleted_count == 0:
+        if not repos.chat_sessions.delete(session_id, request.user["email"], request.user["family_id"]):
             return jsonify(error="Session not found"), 404
         return jsonify(success=True)
-    except Exception as e:
+    except Exception:
         return jsonify(error="Invalid session ID"), 400
 
-from datetime import datetime
-from bson.objectid import ObjectId
-
-@app.route("/api/ai/chat", methods=["POST"])
+@api.route("/api/ai/chat", methods=["POST"])
 @auth_required
 def ai_chat():
     try:
@@ -715,25 +1016,65 @@ def ai_chat():
         if not message and not image_base64:
             return jsonify(error="Message or image required"), 400
 
+        # Downscale / re-encode the photo once; the compact copy is also
+        # what gets stored in the session
+        image = None
+        if image_base64:
+            try:
+                image = prepare_image(image_base64)
+            except ImageTooLarge as e:
+                return jsonify(error=str(e)), 413
+            except InvalidImage as e:
+                return jsonify(error=str(e)), 400
+            image_base64 = image.b64
+            ai_log.info(
+                "Chat image prepared",
+                extra={
+                    "original_bytes": image.original_bytes,
+                    "final_bytes": image.final_bytes,
+                    "size": f"{image.width}x{image.height}",
+                    "detail": image.detail,
+                    "elapsed_ms": round(image.elapsed_ms, 1),
+                },
+            )
+
         # Prepare messages for OpenAI call
+        model = AI_CHAT_VISION_MODEL if image_base64 else AI_CHAT_TEXT_MODEL
         messages = [
-            {"role": "system", "content": "You are a helpful financial coach..."},
+            {"role": "system", "content": AI_CHAT_SYSTEM_PROMPT},
             {"role": "user", "content": message}
         ]
         if image_base64:
             messages[-1]["content"] = [
                 {"type": "text", "text": message},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
+                {"type": "image_url", "image_url": {"url": image.data_url, "detail": image.detail}}
             ]
 
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o" if image_base64 else "gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7
-        )
-        ai_response = response.choices[0].message.content
+        # Text-only prompts without prior history are answered from the cache
+        cache_key = None
+        if AI_CHAT_CACHE_ENABLED and not image_base64 and len(messages) == 2:
+            cache_key = ai_cache_key(model, AI_CHAT_SYSTEM_PROMPT, message)
+        ai_response = ai_chat_cache.get(cache_key) if cache_key else None
+
+        if ai_response is None:
+            # Only upstream calls count against the AI admission limits
+            try:
+                with ai_admission.slot(request.user["email"]):
+                    # Call OpenAI API (no side effects upstream, but don't pay
+                    # twice for a reply that may already have been generated)
+                    response = ai_gateway.chat(
+                        deadline_s=AI_CHAT_DEADLINE_S,
+                        idempotent=False,
+                        model=model,
+                        messages=messages,
+                        max_tokens=500,
+                        temperature=0.7
+                    )
+            except AdmissionRejected as e:
+                return ai_busy(e)
+            ai_response = response.choices[0].message.content
+            if cache_key and ai_response:
+                ai_chat_cache.put(cache_key, ai_response, model)
 
         # Prepare the user and assistant message entries
         user_msg = {
@@ -754,34 +1095,33 @@ def ai_chat():
             title_snippet = (message[:30] + "...") if message else "New Chat"
             new_session = {
                 "user_email": request.user["email"],
+                "family_id": request.user["family_id"],
                 "title": f"Chat: {title_snippet}",
                 "messages": [user_msg, assistant_msg],
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
-            result = chat_sessions_col.insert_one(new_session)
-            session_id = str(result.inserted_id)
+            session_id = str(repos.chat_sessions.create(new_session))
         else:
             # Existing session: append messages
-            session_obj = chat_sessions_col.find_one({"_id": ObjectId(session_id)})
+            session_obj = repos.chat_sessions.get(session_id, request.user["family_id"])
             is_first_message = (session_obj and len(session_obj.get("messages", [])) == 0)
-            update_data = {
-                "$push": {"messages": {"$each": [user_msg, assistant_msg]}},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
+            title = None
             if is_first_message:
                 # Update title on first message
                 title_snippet = (message[:30] + "...") if message else "New Chat"
-                update_data["$set"]["title"] = f"Chat: {title_snippet}"
-            chat_sessions_col.update_one({"_id": ObjectId(session_id)}, update_data)
+                title = f"Chat: {title_snippet}"
+            repos.chat_sessions.append(session_id, request.user["family_id"], [user_msg, assistant_msg], title)
 
         return jsonify(success=True, response=ai_response, session_id=session_id)
-    except Exception as e:
-        print(f"[AI Chat Error] {e}")
+    except CircuitOpen as e:
+        return ai_unavailable(e)
+    except Exception:
+        ai_log.exception("AI chat failed")
         return jsonify(error="Failed to process AI request"), 500
 
 
-@app.route("/api/ai/speech-to-text", methods=["POST"])
+@api.route("/api/ai/speech-to-text", methods=["POST"])
 @auth_required
 def speech_to_text():
     try:
@@ -794,51 +1134,44 @@ def speech_to_text():
         # Determine file extension from filename
         filename = audio_file.filename
         extension = filename.split('.')[-1] if '.' in filename else 'webm'
-        
-        # Save audio to temporary file with correct extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{extension}') as tmp_file:
-            audio_file.save(tmp_file.name)
-            tmp_file_path = tmp_file.name
-        
-        try:
+        audio_data = audio_file.read()
+
+        def whisper(file_obj):
             # Use OpenAI Whisper API for speech-to-text
-            with open(tmp_file_path, 'rb') as audio_file:
-                # Read the file content
-                audio_data = audio_file.read()
-            
-            # Create a new file-like object with the correct name
-            from io import BytesIO
-            audio_buffer = BytesIO(audio_data)
-            audio_buffer.name = f"audio.{extension}"
-            
-            transcript = client.audio.transcriptions.create(
+            return ai_gateway.transcribe(
+                deadline_s=AI_TRANSCRIBE_DEADLINE_S,
                 model="whisper-1",
-                file=audio_buffer,
+                file=file_obj,
                 language="en"
+            ).text
+
+        # Re-submitted clips come straight from the transcript cache;
+        # only real Whisper work takes an AI admission slot
+        try:
+            text, info = transcribe_audio(
+                audio_data, extension, whisper,
+                guard=lambda: ai_admission.slot(request.user["email"]),
             )
+        except AdmissionRejected as e:
+            return ai_busy(e)
+
+        ai_log.info("Speech transcribed", extra={**info, "chars": len(text)})
+        return jsonify(success=True, text=text)
             
-            text = transcript.text
-            print(f"[Speech-to-Text Success] Transcribed: {text[:50]}...")
-            
-            return jsonify(success=True, text=text)
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(tmp_file_path)
-            
+    except CircuitOpen as e:
+        return ai_unavailable(e)
     except Exception as e:
-        print(f"[Speech-to-Text Error] {e}")
-        import traceback
-        traceback.print_exc()
+        ai_log.exception("Speech-to-text failed")
         return jsonify(error=f"Failed to process audio: {str(e)}"), 500
 
 # ---------- Recommend chores to parent ---------- #
-@app.route("/api/chores/recommendations", methods=["GET"])
+@api.route("/api/chores/recommendations", methods=["GET"])
 @auth_required
+@ai_admission_required
 def generate_chore_recommendations():
     try:
         # 1. Get the current user based on JWT-protected request
-        user = users_col.find_one({"email": request.user["email"]})
+        user = repos.users.get(request.user["email"], request.user["family_id"])
         categories = user.get("choreCategories", [])
 
         # 2. If user has no saved categories, return an empty list
@@ -852,7 +1185,9 @@ def generate_chore_recommendations():
             f"Do NOT include code blocks, markdown, or any explanation."
         )
 
-        response = client.chat.completions.create(
+        response = ai_gateway.chat(
+            deadline_s=AI_RECOMMEND_DEADLINE_S,
+            idempotent=True,
             model="gpt-4o",
             messages=[
                 {
@@ -870,15 +1205,17 @@ def generate_chore_recommendations():
         )
 
         raw_output = response.choices[0].message.content
-        print("[AI RAW RESPONSE]", raw_output)
+        ai_log.debug("Chore recommendations raw output", extra={"raw": raw_output})
         # Try to parse it into JSON
         import json
         chores = json.loads(raw_output)
 
         return jsonify(success=True, recommendations=chores)
 
-    except Exception as e:
-        print(f"[AI Chore Recommendation Error] {e}")
+    except CircuitOpen as e:
+        return ai_unavailable(e)
+    except Exception:
+        ai_log.exception("AI chore recommendations failed")
         return jsonify(error="Could not generate recommendations"), 500
 
 
@@ -898,60 +1235,80 @@ def get_user_username_from_token():
         return None
 
 
-@app.route("/api/goals", methods=["GET"])
+@api.route("/api/goals", methods=["GET"])
 @auth_required
+@conditional_get
 def get_goals():
     """Get goals with consistent field names"""
     email = request.user.get("email", "")
     kid_username = email.split("@")[0]
 
-    child = children_col.find_one({"username": kid_username})
+    child = repos.children.by_username(kid_username)
     if not child:
         return jsonify({"success": False, "error": "Child not found"}), 404
 
     try:
-        raw_goals = goals_col.find({"kid_username": kid_username})
-        goals = []
-        for g in raw_goals:
-            g["_id"] = str(g["_id"])
-            
-            # Ensure consistent field names
-            if "currentAmount" in g and "saved" not in g:
-                g["saved"] = g["currentAmount"]
-            elif "saved" in g and "currentAmount" not in g:
-                g["currentAmount"] = g["saved"]
-            elif "saved" not in g and "currentAmount" not in g:
-                g["saved"] = 0
-                g["currentAmount"] = 0
-                
-            # Ensure progress field exists
-            if "progress" not in g:
-                amount = g.get("amount", 0)
-                saved = g.get("saved", 0)
-                g["progress"] = min((saved / amount * 100) if amount > 0 else 0, 100)
-            
-            goals.append(g)
-
-        return jsonify({"success": True, "goals": goals}), 200
-
+        return jsonify({"success": True, "goals": load_kid_goals(kid_username, request.user["family_id"])}), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def load_kid_goals(kid_username, family_id=None):
+    return repos.goals.for_kid(kid_username, family_id)
+
+
+@api.route("/api/goals/<goal_id>/history", methods=["GET"])
+@auth_required
+def get_goal_history(goal_id):
+    """
+    Paged savings history for a goal, newest first.
+    ?limit=20 (max 100) and ?before=<next_cursor from the previous page>
+    """
+    family_id = request.user["family_id"]
+    try:
+        goal = repos.goals.get(goal_id, family_id, {"kid_username": 1, "parent_email": 1})
+    except Exception:
+        return jsonify(error="Invalid goal ID"), 400
+    if not goal:
+        return jsonify(error="Goal not found"), 404
+
+    email = request.user["email"]
+    if email != goal.get("parent_email") and email != f"{goal.get('kid_username')}@kids.aidiy":
+        return jsonify(error="Unauthorized"), 403
+
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+    except ValueError:
+        return jsonify(error="Invalid limit"), 400
+
+    before = request.args.get("before")
+    if before:
+        # cursor is "<iso date>|<ledger id>" so equal dates page correctly
+        try:
+            date_str, last_id = before.split("|")
+            before = datetime.fromisoformat(date_str), ObjectId(last_id)
+        except Exception:
+            return jsonify(error="Invalid cursor"), 400
+
+    entries = repos.goals.history(goal_id, family_id, before, limit)
+    next_cursor = None
+    if len(entries) == limit:
+        last = entries[-1]
+        next_cursor = f"{last['date'].isoformat()}|{last['_id']}"
+
+    return jsonify(success=True, history=entries, next_cursor=next_cursor), 200
 
 # ---------- Mark assessment complete ---------- #
-@app.route("/api/users/complete-assessment", methods=["POST"])
+@api.route("/api/users/complete-assessment", methods=["POST"])
 @auth_required
 def complete_assessment():
-    users_col.update_one(
-        {"email": request.user["email"]},
-        {"$set": {"hasCompletedAssessment": True}}
-    )
+    repos.users.update(request.user["email"], {"hasCompletedAssessment": True}, request.user["family_id"])
     return jsonify(success=True, message="Assessment marked as complete")
 
-@app.route("/api/goals", methods=["POST"])
+@api.route("/api/goals", methods=["POST"])
 @auth_required
+@json_body(CREATE_GOAL)
 def create_goal():
-    d = request.get_json() or {}
+    d = request.payload
     
     # Check if this is a kid creating a goal
     if "@kids.aidiy" in request.user["email"]:
@@ -959,55 +1316,53 @@ def create_goal():
         kid_username = request.user["email"].split("@")[0]
         
         # Find the kid's parent
-        child = children_col.find_one({"username": kid_username})
+        child = repos.children.by_username(kid_username)
         if not child:
             return jsonify(error="Child not found"), 404
         
         goal = {
-            "title": d.get("title"),
-            "category": d.get("category"),
-            "amount": float(d.get("amount", 0)),
-            "duration": int(d.get("duration", 10)),
-            "description": d.get("description", ""),
+            "title": d["title"],
+            "category": d["category"],
+            "amount": d["amount"],
+            "duration": d["duration"],
+            "description": d["description"],
             "kid_username": kid_username,
             "kid_name": child.get("nickName") or child["firstName"],
             "kid_avatar": child.get("avatar", "👧"),
             "parent_email": child["parent_email"],
+            "family_id": child.get("family_id"),
             "status": "pending_approval",
+            "saved": 0,
+            "currentAmount": 0,
+            "progress": 0,
+            "schema_version": GOAL_SCHEMA_VERSION,
             "created_at": datetime.utcnow(),
             "approved_at": None,
             "approved_by": None
         }
         
-        result = goals_col.insert_one(goal)
-        goal["_id"] = str(result.inserted_id)
-        
-        # Create notification for parent
-        notification = {
-            "recipient_email": child["parent_email"],
-            "type": "goal_approval_request",
-            "title": f"{goal['kid_name']} wants to save ${goal['amount']:.2f}",
-            "message": f"for {goal['title']}",
-            "goal_id": str(result.inserted_id),
-            "kid_username": kid_username,
-            "kid_avatar": goal['kid_avatar'],
-            "status": "pending",
-            "read": False,
-            "created_at": datetime.utcnow()
-        }
-        notifications_col.insert_one(notification)
+        goal["_id"] = ObjectId()
+
+        def write(session):
+            repos.goals.add(goal, session=session)
+            notify(
+                GOAL_APPROVAL_REQUEST, child["parent_email"], goal["family_id"],
+                kid_name=goal["kid_name"], amount=goal["amount"], goal_title=goal["title"],
+                goal_id=str(goal["_id"]), kid_username=kid_username, kid_avatar=goal["kid_avatar"],
+            )
+
+        commit_with_notifications(write)
         
         return jsonify(success=True, goal=goal), 201
     
     return jsonify(error="Only kids can create goals"), 403
 
-@app.route("/api/goals/<goal_id>/approve", methods=["POST"])
+@api.route("/api/goals/<goal_id>/approve", methods=["POST"])
 @auth_required
 def approve_goal(goal_id):
-    from bson import ObjectId
-    
     try:
-        goal = goals_col.find_one({"_id": ObjectId(goal_id)})
+        family_id = request.user["family_id"]
+        goal = repos.goals.get(goal_id, family_id)
         if not goal:
             return jsonify(error="Goal not found"), 404
         
@@ -1016,35 +1371,26 @@ def approve_goal(goal_id):
             return jsonify(error="Unauthorized"), 403
         
         # Update goal status
-        goals_col.update_one(
-            {"_id": ObjectId(goal_id)},
-            {
-                "$set": {
-                    "status": "approved",
-                    "approved_at": datetime.utcnow(),
-                    "approved_by": request.user["email"]
-                }
-            }
-        )
+        repos.goals.update(goal_id, family_id, {
+            "status": "approved",
+            "approved_at": datetime.utcnow(),
+            "approved_by": request.user["email"]
+        })
         
         # Update notification status instead of marking as read
-        notifications_col.update_many(
-            {"goal_id": goal_id},
-            {"$set": {"status": "approved"}}
-        )
+        repos.notifications.set_goal_status(goal_id, family_id, "approved")
         
         return jsonify(success=True, message="Goal approved")
         
     except Exception as e:
         return jsonify(error=str(e)), 400
 
-@app.route("/api/goals/<goal_id>/decline", methods=["POST"])
+@api.route("/api/goals/<goal_id>/decline", methods=["POST"])
 @auth_required
 def decline_goal(goal_id):
-    from bson import ObjectId
-    
     try:
-        goal = goals_col.find_one({"_id": ObjectId(goal_id)})
+        family_id = request.user["family_id"]
+        goal = repos.goals.get(goal_id, family_id)
         if not goal:
             return jsonify(error="Goal not found"), 404
         
@@ -1053,22 +1399,14 @@ def decline_goal(goal_id):
             return jsonify(error="Unauthorized"), 403
         
         # Update goal status
-        goals_col.update_one(
-            {"_id": ObjectId(goal_id)},
-            {
-                "$set": {
-                    "status": "declined",
-                    "declined_at": datetime.utcnow(),
-                    "declined_by": request.user["email"]
-                }
-            }
-        )
+        repos.goals.update(goal_id, family_id, {
+            "status": "declined",
+            "declined_at": datetime.utcnow(),
+            "declined_by": request.user["email"]
+        })
         
         # Update notification status instead of marking as read
-        notifications_col.update_many(
-            {"goal_id": goal_id},
-            {"$set": {"status": "declined"}}
-        )
+        repos.notifications.set_goal_status(goal_id, family_id, "declined")
         
         return jsonify(success=True, message="Goal declined")
         
@@ -1076,77 +1414,100 @@ def decline_goal(goal_id):
         return jsonify(error=str(e)), 400
     
 # ---------- Parent Goals API ---------- #
-@app.route("/api/parent/goals", methods=["GET"])
+@api.route("/api/parent/goals", methods=["GET"])
 @auth_required
+@conditional_get
 def get_parent_goals():
     """Get all goals for parent's children"""
     try:
         # Get all goals where parent_email matches the logged-in parent
-        raw_goals = goals_col.find({"parent_email": request.user["email"]})
-        goals = []
-        for g in raw_goals:
-            g["_id"] = str(g["_id"])
-            # Convert datetime to ISO format if exists
-            if "created_at" in g and hasattr(g["created_at"], "isoformat"):
-                g["created_at"] = g["created_at"].isoformat()
-            if "approved_at" in g and hasattr(g["approved_at"], "isoformat"):
-                g["approved_at"] = g["approved_at"].isoformat()
-            goals.append(g)
-        
+        with read_session(request_read_floor()) as session:
+            goals = load_parent_goals(request.user["email"], request.user["family_id"], session)
         return jsonify(success=True, goals=goals), 200
     except Exception as e:
-        print(f"[Parent Goals Error] {e}")
+        log.exception("Parent goals failed")
         return jsonify(error=str(e)), 500
 
-@app.route("/api/parent/children-progress", methods=["GET"])
+def load_parent_goals(parent_email, family_id=None, session=None):
+    return repos.goals.for_parent(parent_email, family_id, session)
+
+@api.route("/api/parent/children-progress", methods=["GET"])
 @auth_required
 def get_children_progress():
     """Get progress data for all parent's children"""
     try:
         # Get all children for this parent
-        children = list(children_col.find({"parent_email": request.user["email"]}, {"_id": 0}))
+        family_id = request.user["family_id"]
+        children = repos.children.for_parent(request.user["email"], family_id)
         
-        # Get goals and chores data for each child
-        for child in children:
-            username = child["username"]
-            
-            # Get child's goals
-            child_goals = list(goals_col.find({"kid_username": username}))
-            for goal in child_goals:
-                goal["_id"] = str(goal["_id"])
-            
-            # Get completed/pending counts
-            completed_goals = len([g for g in child_goals if g.get("status") == "completed"])
-            active_goals = len([g for g in child_goals if g.get("status") == "approved"])
-            
-            child["goals"] = child_goals
-            child["completed_goals"] = completed_goals
-            child["active_goals"] = active_goals
-            child["total_saved"] = sum([g.get("saved", 0) for g in child_goals])
+        # Get goals and chores data for each child (one causal session for all)
+        with read_session(request_read_floor()) as session:
+            for child in children:
+                username = child["username"]
+
+                # Get child's goals
+                child_goals = repos.goals.for_kid(username, family_id, session=session)
+
+                # Get completed/pending counts
+                completed_goals = len([g for g in child_goals if g.get("status") == "completed"])
+                active_goals = len([g for g in child_goals if g.get("status") == "approved"])
+
+                child["goals"] = child_goals
+                child["completed_goals"] = completed_goals
+                child["active_goals"] = active_goals
+                child["total_saved"] = sum([g.get("saved", 0) for g in child_goals])
         
         return jsonify(success=True, children=children), 200
     except Exception as e:
-        print(f"[Children Progress Error] {e}")
+        log.exception("Children progress failed")
         return jsonify(error=str(e)), 500
 
-# ---------- Chores API ---------- #
-chores_col.create_index([("parent_email", 1)])
+# ---------- Savings analytics ---------- #
+@api.route("/api/analytics/savings", methods=["GET"])
+@auth_required
+def get_savings_analytics():
+    """
+    Daily earned / approved / declined totals from the savings_daily rollups.
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: the last 30 days); parents get
+    the whole family unless ?kid=<username> is given, kids get their own.
+    """
+    email = request.user["email"]
+    if "@kids.aidiy" in email:
+        scope, key = "kid", email.split("@")[0]
+    elif request.args.get("kid"):
+        child = repos.children.by_username(request.args["kid"])
+        if not child or child.get("parent_email") != email:
+            return jsonify(error="Child not found"), 404
+        scope, key = "kid", child["username"]
+    else:
+        scope, key = "family", email
+
+    try:
+        end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+        start = (
+            datetime.fromisoformat(request.args["from"]) if request.args.get("from")
+            else end - timedelta(days=29)
+        )
+        series, totals = savings_series(scope, key, start, end)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
 
-@app.route("/api/chores", methods=["GET"])
+    return jsonify(success=True, scope=scope, key=key, series=series, totals=totals), 200
+
+# ---------- Chores API ---------- #
+@api.route("/api/chores", methods=["GET"])
 @auth_required
+@conditional_get
 def get_chores():
     """
     Return chores based on user type, excluding archived chores
     """
     try:
-        # Base query to exclude archived chores
-        base_query = {"is_active": {"$ne": False}}
-        
         # Check if this is a kid user
         if "@kids.aidiy" in request.user["email"]:
             # Extract kid username from email
             kid_username = request.user["email"].split("@")[0]
-            q = {**base_query, "kid_username": kid_username}
+            q = {"kid_username": kid_username}
             
             # Optional: filter by goal
             goal_id = request.args.get("goalId")
@@ -1154,7 +1515,7 @@ def get_chores():
                 q["assigned_goal_id"] = goal_id
         else:
             # Parent user - get all their active chores
-            q = {**base_query, "parent_email": request.user["email"]}
+            q = {"parent_email": request.user["email"]}
             
             # Optional filters for parents
             kid = request.args.get("kid")
@@ -1162,57 +1523,55 @@ def get_chores():
             if kid:
                 q["kid_username"] = kid
             if status:
-                q["status"] = status
-
-        chores = []
-        for c in chores_col.find(q):
-            c["id"] = str(c.pop("_id"))
-            # Convert datetime to ISO format
-            if "created_at" in c and hasattr(c["created_at"], "isoformat"):
-                c["created_at"] = c["created_at"].isoformat()
-            if "updated_at" in c and hasattr(c["updated_at"], "isoformat"):
-                c["updated_at"] = c["updated_at"].isoformat()
-            chores.append(c)
+                q["status"] = chore_status(status)
 
-        return jsonify(success=True, chores=chores), 200
+        return jsonify(success=True, chores=load_chores(request.user["family_id"], **q)), 200
     except Exception as e:
-        print("[Chores GET error]", e)
+        log.exception("Chores GET failed")
         return jsonify(error=str(e)), 500
 
-@app.route("/api/chores", methods=["POST"])
+def load_chores(family_id=None, **filters):
+    """Active (not archived) chores matching ``filters``."""
+    chores = []
+    for c in repos.chores.active(family_id, **filters):
+        c["id"] = c.pop("_id")
+        chores.append(c)
+    return chores
+
+@api.route("/api/chores", methods=["POST"])
 @auth_required
+@json_body(CREATE_CHORE)
 def create_chore():
     """
     Parent creates a chore. Body must include at least
     title, description, category, difficulty, reward, dueDate.
     """
-    d = request.get_json() or {}
-    required = ("title", "description", "category", "difficulty", "reward", "dueDate")
-    if not all(d.get(k) for k in required):
-        return jsonify(error="Missing required fields"), 400
+    d = request.payload
 
     # optional assignment at creation time
-    kid_username = d.get("assignedTo")  # can be None / '' for unassigned
+    kid_username = d["assignedTo"]  # can be None / '' for unassigned
 
     chore = {
         "parent_email": request.user["email"],
+        "family_id": request.user["family_id"],
         "kid_username": kid_username,        # None if not yet assigned
         "title": d["title"],
         "description": d["description"],
         "category": d["category"],
         "difficulty": d["difficulty"],
-        "reward": float(d["reward"]),
-        "status": "Assigned" if kid_username else "Pending",
+        "reward": d["reward"],
+        "status": "assigned" if kid_username else "pending",
         "dueDate": d["dueDate"],
+        "due_at": parse_due_date(d["dueDate"]),
+        "schema_version": CHORE_SCHEMA_VERSION,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
-    result = chores_col.insert_one(chore)
-    chore["id"] = str(result.inserted_id)
-    chore.pop("_id", None)
+    repos.chores.add(chore)
+    chore["id"] = chore.pop("_id")
     return jsonify(success=True, chore=chore), 201
 
-@app.route("/api/chores/<chore_id>", methods=["PUT"])
+@api.route("/api/chores/<chore_id>", methods=["PUT"])
 @auth_required
 def update_chore(chore_id):
     d = request.get_json() or {}
@@ -1225,38 +1584,36 @@ def update_chore(chore_id):
     if not update_data:
         return jsonify(error="No valid fields to update"), 400
 
+    if "status" in update_data:
+        update_data["status"] = chore_status(update_data["status"])
+    if "dueDate" in update_data:
+        update_data["due_at"] = parse_due_date(update_data["dueDate"])
     update_data["updated_at"] = datetime.utcnow()
 
-    res = chores_col.update_one(
-        {"_id": ObjectId(chore_id), "parent_email": request.user["email"]},
-        {"$set": update_data}
-    )
-    if res.matched_count == 0:
+    family_id = request.user["family_id"]
+    if not repos.chores.update(chore_id, request.user["email"], family_id, update_data):
         return jsonify(error="Chore not found"), 404
 
-    updated = chores_col.find_one({"_id": ObjectId(chore_id)})
+    updated = repos.chores.get(chore_id, family_id)
     updated["id"] = chore_id
     updated.pop("_id", None)
     return jsonify(success=True, chore=updated)
 
-@app.route("/api/chores/<chore_id>", methods=["DELETE"])
+@api.route("/api/chores/<chore_id>", methods=["DELETE"])
 @auth_required
 def delete_chore(chore_id):
-    res = chores_col.delete_one(
-        {"_id": ObjectId(chore_id), "parent_email": request.user["email"]}
-    )
-    if res.deleted_count == 0:
+    if not repos.chores.delete(chore_id, request.user["email"], request.user["family_id"]):
         return jsonify(error="Chore not found"), 404
     return '', 204
 
 
-@app.route("/api/chores/recommendations", methods=["GET"])
+@api.route("/api/chores/recommendations", methods=["GET"])
 @auth_required
 def get_chore_recommendations():
     """Get AI recommended chores based on children's ages and goals"""
     try:
         # Get children for context
-        children = list(children_col.find({"parent_email": request.user["email"]}, {"_id": 0}))
+        children = repos.children.for_parent(request.user["email"], request.user["family_id"])
         
         # Mock AI recommendations - can be enhanced with real AI later
         recommendations = [
@@ -1296,55 +1653,54 @@ def get_chore_recommendations():
         
         return jsonify(success=True, recommendations=recommendations), 200
     except Exception as e:
-        print(f"[Chore Recommendations Error] {e}")
+        log.exception("Chore recommendations failed")
         return jsonify(error=str(e)), 500
 
-@app.route("/api/parent/children-chores", methods=["GET"])
+@api.route("/api/parent/children-chores", methods=["GET"])
 @auth_required
 def get_children_chores():
     try:
-        children = list(children_col.find(
-            {"parent_email": request.user["email"]}, {"_id": 0}
-        ))
-
-        for child in children:
-            username = child["username"]
-
-            # ⬇️  NEW — pull real chores for this kid
-            child_chores = list(
-                chores_col.find({"kid_username": username}, {"_id": 0})
-            )
-
-            child["assigned_chores"]  = child_chores
-            child["chores_completed"] = len([c for c in child_chores
-                                             if c["status"] == "completed"])
-            child["chores_pending"]   = len([c for c in child_chores
-                                             if c["status"] in ("pending",
-                                                                "in_progress")])
-            child["total_earned"]     = sum(c["reward"] for c in child_chores
-                                            if c["status"] == "completed")
-
+        family_id = request.user["family_id"]
+        with read_session(request_read_floor()) as session:
+            children = load_children_chores(repos.children.for_parent(request.user["email"], family_id), family_id, session)
         return jsonify(success=True, children=children), 200
     except Exception as e:
-        print("[Children Chores Error]", e)
+        log.exception("Children chores failed")
         return jsonify(error=str(e)), 500
 
-@app.route("/api/goals/submit-progress", methods=["POST"])
+def load_children_chores(children, family_id=None, session=None):
+    """Decorate each child dict with its chores and chore stats (one query for all kids)."""
+    by_kid = {child["username"]: [] for child in children}
+    for c in repos.chores.for_kids(by_kid, family_id, session):
+        by_kid[c["kid_username"]].append(c)
+
+    for child in children:
+        child_chores = by_kid[child["username"]]
+
+        child["assigned_chores"]  = child_chores
+        child["chores_completed"] = len([c for c in child_chores
+                                         if c["status"] == "completed"])
+        child["chores_pending"]   = len([c for c in child_chores
+                                         if c["status"] in ("pending",
+                                                            "in_progress")])
+        child["total_earned"]     = sum(c["reward"] for c in child_chores
+                                        if c["status"] == "completed")
+    return children
+
+@api.route("/api/goals/submit-progress", methods=["POST"])
 @auth_required
+@json_body(SUBMIT_PROGRESS)
 def submit_progress():
     """Handle child's progress submission for completed chores"""
     try:
-        data = request.get_json()
-        goal_id = data.get("goalId")
-        completed_chore_ids = data.get("completedChoreIds", [])
-        total_earned = data.get("totalEarned", 0)
-        submission_date = data.get("submissionDate")
-
-        if not goal_id or not completed_chore_ids:
-            return jsonify(error="Missing required data"), 400
+        data = request.payload
+        goal_id = data["goalId"]
+        completed_chore_ids = data["completedChoreIds"]
+        total_earned = data["totalEarned"]
 
         # Get current goal
-        current_goal = goals_col.find_one({"_id": ObjectId(goal_id)})
+        family_id = request.user["family_id"]
+        current_goal = repos.goals.get(goal_id, family_id)
         if not current_goal:
             return jsonify(error="Goal not found"), 404
         
@@ -1352,50 +1708,43 @@ def submit_progress():
         kid_username = request.user["email"].split("@")[0]
         
         # Find the kid's details
-        child = children_col.find_one({"username": kid_username})
+        child = repos.children.by_username(kid_username)
         if not child:
             return jsonify(error="Child not found"), 404
         
         # Get chore details from IDs - IMPORTANT: Only get the submitted chores
-        completed_chores = []
-        for chore_id in completed_chore_ids:
-            chore = chores_col.find_one({"_id": ObjectId(chore_id)})
-            if chore:
-                completed_chores.append({
-                    "id": str(chore["_id"]),
-                    "title": chore.get("title", ""),
-                    "reward": chore.get("reward", 0)
-                })
-
-        # Create notification for parents with ONLY the submitted chores
-        notification = {
-            "type": "progress_submission",
-            "title": f"{child.get('nickName', child.get('firstName'))} completed chores!",
-            "message": f"Your child completed {len(completed_chores)} chore(s) and earned ${total_earned:.2f}",
-            "kid_name": child.get('nickName', child.get('firstName')),
-            "kid_avatar": child.get('avatar', '👧'),
-            "goal_id": goal_id,
-            "earned_amount": total_earned,
-            "completed_chore_ids": completed_chore_ids,  # Only the submitted chore IDs
-            "completed_chores": completed_chores,  # Only the submitted chore details
-            "status": "pending",
-            "read": False,
-            "created_at": datetime.utcnow(),
-            "recipient_email": child["parent_email"]
-        }
+        completed_chores = [
+            {
+                "id": str(chore["_id"]),
+                "title": chore.get("title", ""),
+                "reward": chore.get("reward", 0)
+            }
+            for chore in repos.chores.by_ids(completed_chore_ids, family_id, {"title": 1, "reward": 1})
+        ]
 
-        # Add to notifications collection
-        notifications_col.insert_one(notification)
-
-        # Mark ONLY the submitted chores as "pending_approval"
-        for chore_id in completed_chore_ids:
-            chores_col.update_one(
-                {"_id": ObjectId(chore_id)},
-                {"$set": {
-                    "status": "pending_approval",
-                    "submitted_at": datetime.utcnow()
-                }}
+        def write(session):
+            # Notify parents with ONLY the submitted chores
+            notify(
+                PROGRESS_SUBMISSION, child["parent_email"], family_id,
+                kid_name=child.get('nickName', child.get('firstName')),
+                kid_avatar=child.get('avatar', '👧'),
+                goal_id=goal_id,
+                earned_amount=total_earned,
+                chore_count=len(completed_chores),
+                completed_chore_ids=completed_chore_ids,
+                completed_chores=completed_chores,
             )
+            # Mark ONLY the submitted chores as "pending_approval"
+            repos.chores.set_many(completed_chore_ids, family_id, {
+                "status": "pending_approval",
+                "submitted_at": datetime.utcnow()
+            }, session=session)
+
+        commit_with_notifications(write)
+        record_savings(
+            child["parent_email"], kid_username,
+            earned=total_earned, chores_submitted=len(completed_chore_ids),
+        )
 
         return jsonify(
             success=True, 
@@ -1403,19 +1752,18 @@ def submit_progress():
         ), 200
 
     except Exception as e:
-        print(f"[Submit Progress Error] {e}")
+        log.exception("Submit progress failed")
         return jsonify(error=str(e)), 500
 
 
-@app.route("/api/progress/<submission_id>/approve", methods=["POST"])
+@api.route("/api/progress/<submission_id>/approve", methods=["POST"])
 @auth_required
 def approve_progress_submission(submission_id):
     """Approve child's progress submission and update savings"""
     try:
         # Find the progress submission notification
-        submission = notifications_col.find_one(
-            {"_id": ObjectId(submission_id), "type": "progress_submission"}
-        )
+        family_id = request.user["family_id"]
+        submission = repos.notifications.submission(submission_id, family_id)
         if not submission:
             return jsonify(error="Submission not found"), 404
 
@@ -1424,7 +1772,7 @@ def approve_progress_submission(submission_id):
             return jsonify(error="Unauthorized"), 403
 
         # Get the associated goal
-        goal = goals_col.find_one({"_id": ObjectId(submission["goal_id"])})
+        goal = repos.goals.get(submission["goal_id"], family_id)
         if not goal:
             return jsonify(error="Goal not found"), 404
         
@@ -1434,115 +1782,80 @@ def approve_progress_submission(submission_id):
         
         # Calculate progress percentage
         goal_amount = goal.get("amount", 0)
-        new_progress = min((new_saved / goal_amount * 100) if goal_amount > 0 else 0, 100)
+        new_progress = goal_progress(new_saved, goal_amount)
         
         # Check if goal is being completed
         goal_completed = new_saved >= goal_amount and current_saved < goal_amount
         
-        # Update the goal
+        # Update the goal (current totals only - the movement goes to the ledger)
         update_data = {
-            "$set": {
-                "saved": new_saved,
-                "currentAmount": new_saved,
-                "progress": new_progress
-            },
-            "$push": {
-                "progress_history": {
-                    "date": datetime.utcnow(),
-                    "amount": submission["earned_amount"],
-                    "approved_by": request.user["email"],
-                    "chore_ids": submission["completed_chore_ids"]  # Only the submitted chores
-                }
-            }
+            "saved": new_saved,
+            "currentAmount": new_saved,
+            "progress": new_progress,
+            "schema_version": GOAL_SCHEMA_VERSION,
         }
         
         # Mark goal as completed if target is reached
         if new_saved >= goal_amount:
-            update_data["$set"]["status"] = "completed"
-            update_data["$set"]["completed_at"] = datetime.utcnow()
+            update_data["status"] = "completed"
+            update_data["completed_at"] = datetime.utcnow()
         
-        goals_col.update_one(
-            {"_id": ObjectId(submission["goal_id"])},
-            update_data
-        )
-        
-        # Archive ONLY the submitted chores
         submitted_chore_ids = submission.get("completed_chore_ids", [])
-        archived_count = 0
-        for chore_id in submitted_chore_ids:
-            result = chores_col.update_one(
-                {"_id": ObjectId(chore_id), "status": "pending_approval"},  # Only if pending
-                {
-                    "$set": {
-                        "status": "archived",
-                        "archived_at": datetime.utcnow(),
-                        "approved_by": request.user["email"],
-                        "is_active": False
-                    }
-                }
+
+        def write(session):
+            repos.goals.update(submission["goal_id"], family_id, update_data, session=session)
+
+            # Record the savings movement in the append-only ledger
+            repos.goals.record({
+                **ledger_entry(goal, {
+                    "date": datetime.utcnow(),
+                    "amount": submission["earned_amount"],
+                    "approved_by": request.user["email"],
+                    "chore_ids": submitted_chore_ids  # Only the submitted chores
+                }),
+                "submission_id": submission_id,
+                "balance_after": new_saved,
+            }, session=session)
+
+            # Archive ONLY the submitted chores (only if still pending)
+            archived_count = repos.chores.set_many(submitted_chore_ids, family_id, {
+                "status": "archived",
+                "archived_at": datetime.utcnow(),
+                "approved_by": request.user["email"],
+                "is_active": False
+            }, status="pending_approval", session=session)
+
+            # Check if there are more chores available for this kid
+            remaining_chores = repos.chores.count_assigned(goal['kid_username'], family_id, session=session)
+
+            # Delete the submission (it's been processed)
+            repos.notifications.delete(submission_id, family_id, session=session)
+
+            kid_email = f"{goal['kid_username']}@kids.aidiy"
+            notify(
+                PROGRESS_APPROVED, kid_email, goal.get("family_id"),
+                goal_id=submission["goal_id"],
+                earned_amount=submission["earned_amount"],
+                archived_chores_count=archived_count,
+                can_select_new_chores=remaining_chores > 0,
             )
-            if result.modified_count > 0:
-                archived_count += 1
-        
-        # Check if there are more chores available for this kid
-        remaining_chores = chores_col.count_documents({
-            "kid_username": goal['kid_username'],
-            "status": "Assigned",
-            "is_active": {"$ne": False}
-        })
-        
-        # Delete the notification (it's been processed)
-        notifications_col.delete_one({"_id": ObjectId(submission_id)})
-        
-        # Create a success notification for the child with more info
-        child_notification = {
-            "type": "progress_approved",
-            "title": "Progress Approved! 🎉",
-            "message": f"Your parents approved your progress! ${submission['earned_amount']:.2f} has been added to your savings.",
-            "goal_id": submission["goal_id"],
-            "earned_amount": submission["earned_amount"],
-            "archived_chores_count": archived_count,
-            "can_select_new_chores": remaining_chores > 0,
-            "status": "success",
-            "read": False,
-            "created_at": datetime.utcnow(),
-            "recipient_email": f"{goal['kid_username']}@kids.aidiy"
-        }
-        notifications_col.insert_one(child_notification)
-        
-        # If goal is completed, create notifications for both parent and child
-        if goal_completed:
-            # Notification for parent
-            parent_completion_notification = {
-                "type": "goal_completed",
-                "title": f"{goal['kid_name']} completed their goal! 🎉",
-                "message": f"Your child has successfully saved ${goal_amount:.2f} for {goal['title']}",
-                "goal_id": str(goal["_id"]),
-                "kid_name": goal['kid_name'],
-                "kid_avatar": goal['kid_avatar'],
-                "goal_title": goal['title'],
-                "goal_amount": goal_amount,
-                "status": "success",
-                "read": False,
-                "created_at": datetime.utcnow(),
-                "recipient_email": request.user["email"]
-            }
-            notifications_col.insert_one(parent_completion_notification)
-            
-            # Additional notification for child about goal completion
-            child_completion_notification = {
-                "type": "goal_completed",
-                "title": "🎊 GOAL ACHIEVED! 🎊",
-                "message": f"Congratulations! You've saved ${goal_amount:.2f} for {goal['title']}!",
-                "goal_id": str(goal["_id"]),
-                "goal_title": goal['title'],
-                "goal_amount": goal_amount,
-                "status": "success",
-                "read": False,
-                "created_at": datetime.utcnow(),
-                "recipient_email": f"{goal['kid_username']}@kids.aidiy"
-            }
-            notifications_col.insert_one(child_completion_notification)
+            # If goal is completed, tell both parent and child
+            if goal_completed:
+                completed = dict(
+                    goal_id=str(goal["_id"]), goal_title=goal['title'], goal_amount=goal_amount,
+                )
+                notify(
+                    GOAL_COMPLETED_PARENT, request.user["email"], goal.get("family_id"),
+                    kid_name=goal['kid_name'], kid_avatar=goal['kid_avatar'], **completed,
+                )
+                notify(GOAL_COMPLETED_KID, kid_email, goal.get("family_id"), **completed)
+
+        commit_with_notifications(write)
+        record_savings(
+            goal.get("parent_email"), goal.get("kid_username"),
+            approved=submission["earned_amount"],
+            chores_approved=len(submitted_chore_ids),
+        )
         
         return jsonify(
             success=True, 
@@ -1553,19 +1866,18 @@ def approve_progress_submission(submission_id):
         ), 200
         
     except Exception as e:
-        print(f"[Approve Progress Error] {e}")
+        log.exception("Approve progress failed")
         return jsonify(error=str(e)), 500
 
 
-@app.route("/api/progress/<submission_id>/decline", methods=["POST"])
+@api.route("/api/progress/<submission_id>/decline", methods=["POST"])
 @auth_required
 def decline_progress_submission(submission_id):
     """Decline child's progress submission and reassign ONLY the submitted chores"""
     try:
         # Find the progress submission notification
-        submission = notifications_col.find_one(
-            {"_id": ObjectId(submission_id), "type": "progress_submission"}
-        )
+        family_id = request.user["family_id"]
+        submission = repos.notifications.submission(submission_id, family_id)
         if not submission:
             return jsonify(error="Submission not found"), 404
 
@@ -1576,58 +1888,57 @@ def decline_progress_submission(submission_id):
         # Get the specific chore IDs that were submitted
         submitted_chore_ids = submission.get("completed_chore_ids", [])
         
-        # Reassign ONLY the submitted chores back to "Assigned" status
-        reassigned_count = 0
-        for chore_id in submitted_chore_ids:
-            result = chores_col.update_one(
-                {"_id": ObjectId(chore_id), "status": "pending_approval"},
-                {
-                    "$set": {
-                        "status": "Assigned",
-                        "updated_at": datetime.utcnow(),
-                        "declined_at": datetime.utcnow(),
-                        "declined_by": request.user["email"]
-                    },
-                    "$unset": {
-                        "submitted_at": ""
-                    }
-                }
-            )
-            if result.modified_count > 0:
-                reassigned_count += 1
-        
         # Get the goal to find kid's username AND goal title
-        goal = goals_col.find_one({"_id": ObjectId(submission["goal_id"])})
-        
+        goal = repos.goals.get(submission["goal_id"], family_id)
+
+        def write(session):
+            # Reassign ONLY the submitted chores back to "assigned" status
+            reassigned_count = repos.chores.set_many(submitted_chore_ids, family_id, {
+                "status": "assigned",
+                "updated_at": datetime.utcnow(),
+                "declined_at": datetime.utcnow(),
+                "declined_by": request.user["email"]
+            }, status="pending_approval", unset=("submitted_at",), session=session)
+
+            if goal:
+                # Get details of reassigned chores for the notification
+                reassigned_chores = [
+                    {"id": str(chore["_id"]), "title": chore.get("title", "")}
+                    for chore in repos.chores.by_ids(submitted_chore_ids, family_id, {"title": 1, "status": 1}, session)
+                    if chore.get("status") == "assigned"
+                ]
+                # Tell the child which chores to redo
+                notify(
+                    PROGRESS_DECLINED, f"{goal['kid_username']}@kids.aidiy", goal.get("family_id"),
+                    chore_count=len(reassigned_chores),
+                    goal_id=submission["goal_id"],
+                    goal_title=goal.get("title", ""),
+                    reassigned_chore_ids=submitted_chore_ids,
+                    reassigned_chores=reassigned_chores,
+                    declined_amount=submission.get("earned_amount", 0),
+                )
+                # the notification expires; the ledger row is what backfill-rollups reads
+                repos.goals.record({
+                    **ledger_entry(goal, {
+                        "date": datetime.utcnow(),
+                        "amount": submission.get("earned_amount", 0),
+                        "chore_ids": submitted_chore_ids,
+                    }, entry_type="decline"),
+                    "submission_id": submission_id,
+                    "declined_by": request.user["email"],
+                }, session=session)
+
+            # Delete the progress submission notification
+            repos.notifications.delete(submission_id, family_id, session=session)
+            return reassigned_count
+
+        reassigned_count = commit_with_notifications(write)
         if goal:
-            # Get details of reassigned chores for the notification
-            reassigned_chores = []
-            for chore_id in submitted_chore_ids:
-                chore = chores_col.find_one({"_id": ObjectId(chore_id)})
-                if chore and chore.get("status") == "Assigned":
-                    reassigned_chores.append({
-                        "id": str(chore["_id"]),
-                        "title": chore.get("title", "")
-                    })
-            
-            # Create a notification for the child with specific chore details
-            child_notification = {
-                "type": "progress_declined",
-                "title": "Try Again! 💪",
-                "message": f"Your parents want you to redo {len(reassigned_chores)} chore(s). They're ready for another try!",
-                "goal_id": submission["goal_id"],
-                "goal_title": goal.get("title", ""),  # ← ADD THIS LINE
-                "reassigned_chore_ids": submitted_chore_ids,
-                "reassigned_chores": reassigned_chores,
-                "status": "declined",
-                "read": False,
-                "created_at": datetime.utcnow(),
-                "recipient_email": f"{goal['kid_username']}@kids.aidiy"
-            }
-            notifications_col.insert_one(child_notification)
-        
-        # Delete the progress submission notification
-        notifications_col.delete_one({"_id": ObjectId(submission_id)})
+            record_savings(
+                request.user["email"], goal.get("kid_username"),
+                declined=submission.get("earned_amount", 0),
+                chores_declined=len(submitted_chore_ids),
+            )
         
         return jsonify(
             success=True, 
@@ -1637,95 +1948,71 @@ def decline_progress_submission(submission_id):
         ), 200
         
     except Exception as e:
-        print(f"[Decline Progress Error] {e}")
+        log.exception("Decline progress failed")
         return jsonify(error=str(e)), 500
 
 # ---------- Notifications ---------- #
-@app.route("/api/notifications")
+@api.route("/api/notifications")
 @auth_required
+@conditional_get
 def get_notifications():
     """
     Return the 20 most-recent notifications for the logged-in user
     (parent), plus a count of how many are unread.
     """
-    user_email = request.user["email"]
     try:
-        cursor = (
-            notifications_col
-            .find({"recipient_email": user_email})
-            .sort("created_at", DESCENDING)
-            .limit(20)
-        )
-        notifications = []
-        for doc in cursor:
-            doc["_id"] = str(doc["_id"])
-            # created_at → ISO 8601 string
-            if isinstance(doc.get("created_at"), datetime):
-                doc["created_at"] = doc["created_at"].isoformat()
-            else:
-                doc["created_at"] = str(doc.get("created_at"))
-            
-            # Fix: Use consistent field names
-            # Set read status (default to False if not present)
-            doc.setdefault("read", False)
-            # Set type
-            doc.setdefault("type", "notification")
-            
-            notifications.append(doc)
-        
-        # Fix: Count unread notifications consistently
-        unread_count = notifications_col.count_documents({
-            "recipient_email": user_email,
-            "read": {"$ne": True}  # Count notifications where read is not True
-        })
-        
-        return jsonify(
-            success=True,
-            notifications=notifications,
-            unread_count=unread_count
-        ), 200
-    except Exception as e:
-        print("[Notifications Error]", e)
+        with read_session(request_read_floor()) as session:
+            payload = load_notifications(request.user["email"], request.user["family_id"], session)
+        return jsonify(success=True, **payload), 200
+    except Exception:
+        log.exception("Notifications failed")
         return jsonify(
             success=False,
             error="Failed to fetch notifications, please try again later."
         ), 500
 
-@app.route("/api/notifications/mark-read", methods=["POST"])
+def load_notifications(user_email, family_id=None, session=None):
+    notifications = []
+    for doc in repos.notifications.recent(user_email, family_id, session=session):
+        # Fix: Use consistent field names
+        # Set read status (default to False if not present)
+        doc.setdefault("read", False)
+        # Set type
+        doc.setdefault("type", "notification")
+        
+        notifications.append(doc)
+    
+    # Fix: Count unread notifications consistently
+    unread_count = repos.notifications.unread_count(user_email, family_id, session=session)
+    return {"notifications": notifications, "unread_count": unread_count}
+
+@api.route("/api/notifications/mark-read", methods=["POST"])
 @auth_required
 def mark_notifications_read():
     """Mark all notifications as read for the current user"""
     try:
-        result = notifications_col.update_many(
-            {"recipient_email": request.user["email"]},
-            {"$set": {"read": True}}
-        )
+        modified = repos.notifications.mark_read(request.user["email"], request.user["family_id"])
         return jsonify(
             success=True,
-            message=f"Marked {result.modified_count} notifications as read"
+            message=f"Marked {modified} notifications as read"
         ), 200
-    except Exception as e:
-        print("[Mark Read Error]", e)
+    except Exception:
+        log.exception("Mark read failed")
         return jsonify(
             success=False,
             error="Failed to mark notifications as read"
         ), 500
 
-@app.route("/api/notifications/<notification_id>/mark-read", methods=["POST"])
+@api.route("/api/notifications/<notification_id>/mark-read", methods=["POST"])
 @auth_required
 def mark_single_notification_read(notification_id):
     """Mark a single notification as read"""
     try:
-        from bson import ObjectId
-        result = notifications_col.update_one(
-            {
-                "_id": ObjectId(notification_id),
-                "recipient_email": request.user["email"]
-            },
-            {"$set": {"read": True}}
-        )
-        
-        if result.matched_count == 0:
+        email, family_id = request.user["email"], request.user["family_id"]
+        if (
+            not repos.notifications.mark_read(email, family_id, notification_id)
+            and not repos.notifications.exists(notification_id, email, family_id)
+        ):
             return jsonify(
                 success=False,
                 error="Notification not found"
@@ -1735,78 +2022,64 @@ def mark_single_notification_read(notification_id):
             success=True,
             message="Notification marked as read"
         ), 200
-    except Exception as e:
-        print("[Mark Single Read Error]", e)
+    except Exception:
+        log.exception("Mark single read failed")
         return jsonify(
             success=False,
             error="Failed to mark notification as read"
         ), 500
     
-@app.route("/api/notifications/unread-count")
+@api.route("/api/notifications/unread-count")
 @auth_required
+@conditional_get
 def get_unread_count():
     user_email = request.user["email"]
     try:
-        count = notifications_col.count_documents({
-            "recipient_email": user_email,
-            "read": {"$ne": True}
-        })
+        count = repos.notifications.unread_count(user_email, request.user["family_id"])
         return jsonify(success=True, count=count), 200
-    except Exception as e:
-        print("[Unread Count Error]", e)
+    except Exception:
+        log.exception("Unread count failed")
         return jsonify(success=False, error="Could not get unread count"), 500
 
-@app.route("/api/chores/assign-to-goal", methods=["POST"])
+@api.route("/api/chores/assign-to-goal", methods=["POST"])
 @auth_required
+@json_body(ASSIGN_TO_GOAL)
 def assign_chores_to_goal():
     """
     Assign selected chores to a specific goal for a kid.
     """
     try:
-        data = request.get_json()
-        goal_id = data.get("goalId")
-        chore_ids = data.get("choreIds", [])
-        
-        if not goal_id or not chore_ids:
-            return jsonify(error="Missing goalId or choreIds"), 400
+        data = request.payload
+        goal_id = data["goalId"]
+        chore_ids = data["choreIds"]
         
         # Verify the goal belongs to this kid
-        goal = goals_col.find_one({"_id": ObjectId(goal_id)})
+        family_id = request.user["family_id"]
+        goal = repos.goals.get(goal_id, family_id)
         if not goal:
             return jsonify(error="Goal not found"), 404
             
-        # Update each chore to be assigned to this goal
-        for chore_id in chore_ids:
-            chores_col.update_one(
-                {"_id": ObjectId(chore_id)},
-                {
-                    "$set": {
-                        "assigned_goal_id": goal_id,
-                        "status": "Assigned",
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
+        # Assign the chores to this goal (one update for all of them)
+        repos.chores.set_many(chore_ids, family_id, {
+            "assigned_goal_id": goal_id,
+            "status": "assigned",
+            "updated_at": datetime.utcnow()
+        })
         
         # Update the goal to track assigned chores
-        goals_col.update_one(
-            {"_id": ObjectId(goal_id)},
-            {
-                "$set": {
-                    "assigned_chore_ids": chore_ids,
-                    "has_launched_mission": True,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        repos.goals.update(goal_id, family_id, {
+            "assigned_chore_ids": chore_ids,
+            "has_launched_mission": True,
+            "updated_at": datetime.utcnow()
+        })
         
         return jsonify(success=True, message="Chores assigned to goal"), 200
         
     except Exception as e:
-        print(f"[Assign Chores Error] {e}")
+        log.exception("Assign chores failed")
         return jsonify(error=str(e)), 500
 
-@app.route("/api/goals/<goal_id>/chores", methods=["GET"])
+@api.route("/api/goals/<goal_id>/chores", methods=["GET"])
 @auth_required
 def get_goal_chores(goal_id):
     """
@@ -1814,26 +2087,292 @@ def get_goal_chores(goal_id):
     """
     try:
         # Find chores assigned to this goal that are NOT archived or pending approval
-        chores = list(chores_col.find({
-            "assigned_goal_id": goal_id,
-            "status": {"$nin": ["archived", "pending_approval"]}  # Exclude these statuses
-        }))
+        chores = repos.chores.for_goal(goal_id, request.user["family_id"])
         
         for chore in chores:
-            chore["id"] = str(chore.pop("_id"))
+            chore["id"] = chore.pop("_id")
             # Include the status field
-            chore["status"] = chore.get("status", "Assigned")
-            if "created_at" in chore and hasattr(chore["created_at"], "isoformat"):
-                chore["created_at"] = chore["created_at"].isoformat()
-            if "updated_at" in chore and hasattr(chore["updated_at"], "isoformat"):
-                chore["updated_at"] = chore["updated_at"].isoformat()
-                
+            chore.setdefault("status", "assigned")
+
         return jsonify(success=True, chores=chores), 200
         
     except Exception as e:
-        print(f"[Get Goal Chores Error] {e}")
+        log.exception("Get goal chores failed")
         return jsonify(error=str(e)), 500
 
+# ---------- Statement export ---------- #
+# A parent's chores, goals and approvals as one chronological statement.
+# Each collection is read through its own date-sorted cursor and the three
+# are merged lazily, so memory stays at one cursor batch per source no
+# matter how much history a family has.
+EXPORT_COLUMNS = (
+    "date", "kind", "kid_username", "goal_id", "goal_title", "chore_id",
+    "title", "status", "amount", "balance_after", "approved_by",
+)
+EXPORT_KINDS = ("goals", "chores", "approvals")
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", 500))
+EXPORT_FLUSH_ROWS = 200
+
+def _export_date(value, end=False):
+    """?from= / ?to= as a naive UTC datetime; ``to`` covers its whole day."""
+    day = datetime.fromisoformat(value)
+    if end and len(value) <= 10:
+        day += timedelta(days=1)
+    return day.replace(tzinfo=None) if day.tzinfo is None else day.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _row_date(row):
+    # legacy documents may lack a datetime; Mongo sorts those first, so do we
+    return row["date"] if isinstance(row["date"], datetime) else datetime.min
+
+def export_rows(parent_email, start=None, end=None, kid=None, kinds=EXPORT_KINDS, family_id=None):
+    """Yield statement rows (dicts keyed by EXPORT_COLUMNS) in date order."""
+    scope = dict(parent_email=parent_email, family_id=family_id, kid=kid, batch_size=EXPORT_BATCH)
+
+    # goal titles for the approval rows; one small projection per family
+    titles = repos.goals.titles(**scope)
+
+    def goals():
+        for goal in repos.goals.statement(start=start, end=end, **scope):
+            yield {
+                "date": goal.get("created_at"), "kind": "goal", "kid_username": goal.get("kid_username"),
+                "goal_id": str(goal["_id"]), "goal_title": goal.get("title"), "title": goal.get("title"),
+                "status": goal.get("status"), "amount": goal.get("amount"), "balance_after": goal.get("saved"),
+            }
+
+    def chores():
+        for c in repos.chores.statement(start=start, end=end, **scope):
+            goal_id = c.get("assigned_goal_id")
+            yield {
+                "date": c.get("created_at"), "kind": "chore", "kid_username": c.get("kid_username"),
+                "goal_id": goal_id, "goal_title": titles.get(goal_id), "chore_id": str(c["_id"]),
+                "title": c.get("title"), "status": c.get("status"), "amount": c.get("reward"),
+                "approved_by": c.get("approved_by"),
+            }
+
+    def approvals():
+        for e in repos.goals.ledger_statement(start=start, end=end, **scope):
+            yield {
+                "date": e.get("date"), "kind": "approval", "kid_username": e.get("kid_username"),
+                "goal_id": e.get("goal_id"), "goal_title": titles.get(e.get("goal_id")),
+                "amount": e.get("amount"), "balance_after": e.get("balance_after"),
+                "approved_by": e.get("approved_by"),
+            }
+
+    sources = {"goals": goals, "chores": chores, "approvals": approvals}
+    return heapq.merge(*(sources[k]() for k in kinds), key=_row_date)
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+def stream_csv(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(row.get(col)) for col in EXPORT_COLUMNS])
+        if n % EXPORT_FLUSH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def stream_ndjson(rows):
+    dumps = current_app.json.dumps
+    chunk = []
+    for row in rows:
+        chunk.append(dumps({col: row.get(col) for col in EXPORT_COLUMNS}))
+        if len(chunk) == EXPORT_FLUSH_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+@api.route("/api/parent/export", methods=["GET"])
+@auth_required
+def export_statement():
+    """
+    Stream the family statement.
+    ?format=csv|ndjson  ?from=YYYY-MM-DD  ?to=YYYY-MM-DD (inclusive)
+    ?kid=<username>  ?include=goals,chores,approvals
+    """
+    email = request.user["email"]
+    if "@kids.aidiy" in email:
+        return jsonify(error="Only parents can export statements"), 403
+
+    fmt = request.args.get("format", "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify(error="format must be csv or ndjson"), 400
+    try:
+        start = _export_date(request.args["from"]) if request.args.get("from") else None
+        end = _export_date(request.args["to"], end=True) if request.args.get("to") else None
+    except ValueError:
+        return jsonify(error="from/to must be ISO dates (YYYY-MM-DD)"), 400
+    kinds = [k.strip() for k in request.args.get("include", ",".join(EXPORT_KINDS)).split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in EXPORT_KINDS]
+    if unknown or not kinds:
+        return jsonify(error=f"include must be a subset of {', '.join(EXPORT_KINDS)}"), 400
+
+    rows = export_rows(email, start, end, request.args.get("kid"), kinds, request.user["family_id"])
+
+    def generate():
+        try:
+            yield from (stream_csv(rows) if fmt == "csv" else stream_ndjson(rows))
+        except Exception:
+            # headers are gone already; the truncated body is all we can signal
+            log.exception("Statement export failed mid-stream")
+
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    resp = current_app.response_class(
+        stream_with_context(generate()),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+    )
+    resp.headers["Content-Disposition"] = f'attachment; filename="aidiy-statement-{stamp}.{fmt}"'
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the whole stream
+    return resp
+
+# ---------- Dashboards ---------- #
+# One round trip for a whole screen: the sections below are the same
+# payloads as the individual list endpoints, loaded concurrently on the
+# query pool. ?sections=goals,notifications limits what gets loaded.
+PARENT_DASHBOARD_SECTIONS = ("profile", "children", "goals", "children_chores", "notifications")
+KID_DASHBOARD_SECTIONS = ("goals", "chores", "notifications")
+DASHBOARD_TIMEOUT_S = int(os.getenv("DASHBOARD_TIMEOUT_S", 15))
+
+def requested_sections(available):
+    raw = request.args.get("sections")
+    if not raw:
+        return list(available), []
+    wanted = [s.strip() for s in raw.split(",") if s.strip()]
+    return wanted, [s for s in wanted if s not in available]
+
+def run_sections(loaders):
+    """Run {section: callable} concurrently; returns (results, errors)."""
+    pool = get_query_pool()
+    futures = {name: pool.submit(fn) for name, fn in loaders.items()}
+    results, errors = {}, {}
+    for name, fut in futures.items():
+        try:
+            results[name] = fut.result(timeout=DASHBOARD_TIMEOUT_S)
+        except Exception as e:
+            log.warning("Dashboard section %s failed: %s", name, e)
+            errors[name] = str(e) or type(e).__name__
+    return results, errors
+
+def dashboard_response(results, errors):
+    if errors and not results:
+        return jsonify(error="Failed to load dashboard", errors=errors), 500
+    if errors:
+        return jsonify(success=True, **results, errors=errors), 200
+    return jsonify(success=True, **results), 200
+
+@api.route("/api/dashboard/parent", methods=["GET"])
+@auth_required
+@conditional_get
+def parent_dashboard():
+    email = request.user["email"]
+    if "@kids.aidiy" in email:
+        return jsonify(error="Parents only"), 403
+
+    sections, unknown = requested_sections(PARENT_DASHBOARD_SECTIONS)
+    if unknown:
+        return jsonify(error=f"Unknown sections: {', '.join(unknown)}"), 400
+
+    # the loaders run on the query pool, outside the request: pass the family along
+    family_id = request.user["family_id"]
+    # shared lookup: both children sections start from the same (cached) list
+    children = repos.children.for_parent(email, family_id) if {"children", "children_chores"} & set(sections) else []
+    loaders = {
+        "profile": lambda: load_profile(email, family_id),
+        "children": lambda: children,
+        "goals": tolerant_loader(load_parent_goals, email, family_id),
+        "children_chores": tolerant_loader(load_children_chores, copy.deepcopy(children), family_id),
+        "notifications": tolerant_loader(load_notifications, email, family_id),
+    }
+    return dashboard_response(*run_sections({s: loaders[s] for s in sections}))
+
+@api.route("/api/dashboard/kid", methods=["GET"])
+@auth_required
+@conditional_get
+def kid_dashboard():
+    email = request.user["email"]
+    if "@kids.aidiy" not in email:
+        return jsonify(error="Kids only"), 403
+
+    sections, unknown = requested_sections(KID_DASHBOARD_SECTIONS)
+    if unknown:
+        return jsonify(error=f"Unknown sections: {', '.join(unknown)}"), 400
+
+    kid_username = email.split("@")[0]
+    if not repos.children.by_username(kid_username):
+        return jsonify(error="Child not found"), 404
+
+    family_id = request.user["family_id"]
+    loaders = {
+        "goals": lambda: load_kid_goals(kid_username, family_id),
+        "chores": lambda: load_chores(family_id, kid_username=kid_username),
+        "notifications": tolerant_loader(load_notifications, email, family_id),
+    }
+    return dashboard_response(*run_sections({s: loaders[s] for s in sections}))
+
+# ────────────── App factory ────────────────────────
+def create_app(config=None):
+    """
+    Build the Flask app. Cheap by design: Mongo, Mail and OpenAI are only
+    set up when a request first needs them (see aidiy/extensions.py).
+    """
+    configure_logging()
+    app = Flask(__name__)
+    app.secret_key = os.getenv("FLASK_SECRET_KEY", "CHANGE_ME")
+    # jsonify() understands ObjectId / datetime / Decimal directly
+    app.json = BSONJSONProvider(app)
+
+    CORS(
+        app,
+        resources={r"/*": {"origins": allowed_origins}},
+        supports_credentials=True,
+        allow_headers=["Content-Type", "Authorization", "If-None-Match", "X-Request-ID", "X-Causal-Token"],
+        expose_headers=["ETag", "Retry-After", "X-Request-ID", "X-Profile-Id", "X-Causal-Token"],
+    )
+
+    # Flask-Mail settings (the extension itself is created on first send)
+    app.config.update(
+        MAIL_SERVER=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
+        MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
+        MAIL_USE_TLS=os.getenv("MAIL_USE_TLS", "True") == "True",
+        MAIL_USE_SSL=os.getenv("MAIL_USE_SSL", "False") == "True",
+        MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
+        MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
+        MAIL_DEFAULT_SENDER=os.getenv("MAIL_USERNAME"),
+    )
+    # hard cap on request bodies (chat photos, voice clips)
+    app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", 32)) * 1024 * 1024
+    if config:
+        app.config.update(config)
+    # behind Railway / Vercel: trust this many X-Forwarded-For hops, so
+    # request.remote_addr (what the login throttle keys on) is the client
+    proxy_hops = int(os.getenv("PROXY_HOPS", 0))
+    if proxy_hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
+    app.register_blueprint(api)
+    if profiling_enabled():
+        app.before_request(start_request_profile)
+        app.after_request(finish_request_profile)
+        app.teardown_request(discard_request_profile)
+    for command in (
+        MIGRATION_COMMANDS + ROLLUP_COMMANDS + NOTIFICATION_COMMANDS + READ_COMMANDS + PAYLOAD_COMMANDS
+        + JSON_COMMANDS + CHECK_COMMANDS
+    ):
+        app.cli.add_command(command)
+    return app
+
+# gunicorn (app:app) and Vercel (api/index.py) both import this instance
+app = create_app()
+
 # ────────────── Run ────────────────────────────────
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5500))
@@ -15,11 +15,28 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    // Lets reads that a replica may serve still see our own latest write
+    const causalToken = sessionStorage.getItem('causal_token');
+    if (causalToken) {
+      config.headers['X-Causal-Token'] = causalToken;
+    }
     return config;
   },
   (error) => Promise.reject(error)
 );
 
+// Remember the causal token the backend returns after each write
+api.interceptors.response.use(
+  (response) => {
+    const causalToken = response.headers['x-causal-token'];
+    if (causalToken) {
+      sessionStorage.setItem('causal_token', causalToken);
+    }
+    return response;
+  },
+  (error) => Promise.reject(error)
+);
+
 // Export the base URL for direct fetch calls
 export { API_BASE_URL };
 export default api;
@@ -45,7 +45,7 @@ const ChoreQuest = () => {
         if (data.success && data.chores) {
           // Filter out completed chores and only show assigned ones that aren't already assigned to a goal
           const assignedChores = data.chores.filter(
-            chore => (chore.status === 'Assigned' || chore.status === 'pending') && !chore.assigned_goal_id
+            chore => (chore.status === 'assigned' || chore.status === 'pending') && !chore.assigned_goal_id
           );
           
           // Convert each assigned chore to match the required format
@@ -1196,7 +1196,7 @@ const ProgressTrackingTab = ({ childrenProgress = [], childrenChores = [] }) =>
       'archived': 'bg-gray-100 text-gray-700 border-gray-200',
       'pending_approval': 'bg-yellow-100 text-yellow-700 border-yellow-200',
       'in_progress': 'bg-blue-100 text-blue-700 border-blue-200',
-      'Assigned': 'bg-purple-100 text-purple-700 border-purple-200',
+      'assigned': 'bg-purple-100 text-purple-700 border-purple-200',
       'approved': 'bg-green-100 text-green-700 border-green-200',
       'pending': 'bg-orange-100 text-orange-700 border-orange-200',
       'declined': 'bg-red-100 text-red-700 border-red-200'
@@ -1797,17 +1797,17 @@ const ChoreManagementTab = ({
                       <div
                         className={tw(
                           `w-12 h-12 rounded-2xl flex items-center justify-center ${
-                            chore.status === "Completed"
+                            chore.status === "completed"
                               ? "bg-green-100 text-green-600"
-                              : chore.status === "Assigned"
+                              : chore.status === "assigned"
                               ? "bg-blue-100 text-blue-600"
                               : "bg-yellow-100 text-yellow-600"
                           }`
                         )}
                       >
-                        {chore.status === "Completed"
+                        {chore.status === "completed"
                           ? "✅"
-                          : chore.status === "Assigned"
+                          : chore.status === "assigned"
                           ? "📋"
                           : "⏳"}
                       </div>
@@ -1841,9 +1841,9 @@ const ChoreManagementTab = ({
                           <span
                             className={tw(
                               `px-3 py-1 rounded-full text-xs font-medium ${
-                                chore.status === "Completed"
+                                chore.status === "completed"
                                   ? "bg-green-100 text-green-700"
-                                  : chore.status === "Assigned"
+                                  : chore.status === "assigned"
                                   ? "bg-blue-100 text-blue-700"
                                   : "bg-yellow-100 text-yellow-700"
                               }`
@@ -0,0 +1,18 @@
+# gunicorn.conf.py - picked up automatically by `gunicorn app:app` (Procfile / railway.json)
+import os
+
+# Threaded workers: a slow OpenAI call holds one thread, not the whole
+# worker. The AI routes are additionally capped per worker (AI_MAX_IN_FLIGHT)
+# so they can never take every thread.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+def post_fork(server, worker):
+    # Each worker builds its own MongoClient after the fork; open the pool
+    # and ping now so the first real request doesn't pay for the handshake.
+    # The log listener thread doesn't survive the fork either.
+    from aidiy.extensions import warm_up
+    from aidiy.log import configure
+
+    configure()
+    warm_up()